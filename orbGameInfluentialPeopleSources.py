@@ -1,9 +1,22 @@
-import requests
+import argparse
 from bs4 import BeautifulSoup
 import json
-import time
 from urllib.parse import quote_plus
 
+from scripts.image_pipeline.cascade import Step, run_cascade
+from scripts.image_pipeline.checkpoint import CheckpointJournal
+from scripts.image_pipeline.http_session import BROWSER_USER_AGENT, create_session
+from scripts.image_pipeline.rate_limiter import RateLimitedSession, get_shared_limiter
+
+# One pooled keep-alive session for every search page request, paced per host
+session = RateLimitedSession(
+    create_session(user_agent=BROWSER_USER_AGENT, accept="text/html,*/*"),
+    get_shared_limiter(),
+)
+
+# Sources with results that satisfy a figure/content type; lower-priority queries are skipped
+SOURCES_PER_TYPE = 2
+
 # Historical figures from the original list
 historical_figures = [
     "Archimedes", "Imhotep", "Hero of Alexandria", "Al-Jazari", "Johannes Gutenberg", "Li Shizhen",
@@ -203,11 +216,38 @@ search_strategies = {
     }
 }
 
-def get_image_links_enhanced(figure_name, content_type="portraits"):
+def extract_image_links(source, html):
+    """
+    Extract image URLs from a source's search results page
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    links = []
+    if "wikimedia" in source["url"].lower():
+        # Wikimedia specific extraction
+        for img in soup.find_all('img', src=True):
+            if 'http' in img['src'] and ('thumb' in img['src'] or 'commons' in img['src']):
+                links.append(img['src'])
+    elif "loc.gov" in source["url"]:
+        # Library of Congress specific extraction
+        for img in soup.find_all('img', src=True):
+            if 'http' in img['src'] and 'loc.gov' in img['src']:
+                links.append(img['src'])
+    else:
+        # Generic image extraction
+        for img in soup.find_all('img', src=True):
+            if 'http' in img['src']:
+                links.append(img['src'])
+    return links
+
+def get_image_links_enhanced(figure_name, content_type="portraits", sources_wanted=SOURCES_PER_TYPE):
     """
     Enhanced image search function with content type targeting
+    
+    Sources are queried in priority order (primary sources for the content
+    type first, up to 3 search terms each). A source stops after its first
+    term with results, and the whole search stops once `sources_wanted`
+    sources have returned images; the remaining queries are never sent.
     """
-    image_links = {}
     strategy = search_strategies.get(content_type, search_strategies["portraits"])
     
     # Get relevant sources for this content type
@@ -221,82 +261,63 @@ def get_image_links_enhanced(figure_name, content_type="portraits"):
         if source not in relevant_sources:
             relevant_sources.append(source)
     
-    for source in relevant_sources:
-        try:
-            # Create search terms combining figure name with content type terms
-            search_terms = []
-            for term in strategy["searchTerms"]:
-                search_terms.append(f"{figure_name} {term}")
-            
-            # Try each search term
-            for search_term in search_terms[:3]:  # Limit to first 3 terms
-                formatted_url = source["url"].format(quote_plus(search_term))
-                
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                
-                response = requests.get(formatted_url, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Extract image links based on source type
-                    links = []
-                    if "wikimedia" in source["url"].lower():
-                        # Wikimedia specific extraction
-                        for img in soup.find_all('img', src=True):
-                            if 'http' in img['src'] and ('thumb' in img['src'] or 'commons' in img['src']):
-                                links.append(img['src'])
-                    elif "loc.gov" in source["url"]:
-                        # Library of Congress specific extraction
-                        for img in soup.find_all('img', src=True):
-                            if 'http' in img['src'] and 'loc.gov' in img['src']:
-                                links.append(img['src'])
-                    else:
-                        # Generic image extraction
-                        for img in soup.find_all('img', src=True):
-                            if 'http' in img['src']:
-                                links.append(img['src'])
-                    
-                    if links:
-                        image_links[source["name"]] = {
-                            "urls": links[:5],  # Limit to first 5 images
-                            "licensing": source["licensing"],
-                            "reliability": source["reliability"],
-                            "searchTerm": search_term
-                        }
-                        break  # Found images for this source, move to next
-                
-                time.sleep(1)  # Be respectful to servers
-                
-        except Exception as e:
-            print(f"Error searching {source['name']} for {figure_name}: {str(e)}")
-            continue
+    # Create search terms combining figure name with content type terms
+    search_terms = [f"{figure_name} {term}" for term in strategy["searchTerms"]][:3]  # Limit to first 3 terms
+    
+    def fetch(source, search_term):
+        formatted_url = source["url"].format(quote_plus(search_term))
+        response = session.get(formatted_url, timeout=10)
+        if response.status_code != 200:
+            return []
+        links = extract_image_links(source, response.text)
+        # One candidate per successful source query
+        return [(source, search_term, links)] if links else []
+    
+    steps = (
+        Step(source["name"], search_term, lambda source=source, search_term=search_term: fetch(source, search_term))
+        for source in relevant_sources
+        for search_term in search_terms
+    )
+    cascade = run_cascade(steps, want=sources_wanted, one_hit_per_group=True)
+    
+    reported = set()
+    for step, e in cascade.errors:
+        if step.group not in reported:
+            reported.add(step.group)
+            print(f"Error searching {step.group} for {figure_name}: {str(e)}")
+    
+    image_links = {}
+    for _, (source, search_term, links) in cascade.results:
+        image_links[source["name"]] = {
+            "urls": links[:5],  # Limit to first 5 images
+            "licensing": source["licensing"],
+            "reliability": source["reliability"],
+            "searchTerm": search_term
+        }
     
     return image_links
 
-def generate_figure_image_data():
+def generate_figure_image_data(journal):
     """
     Generate comprehensive image data for all historical figures
+    
+    Every figure/image-type result is appended to the checkpoint journal as
+    soon as it is fetched; pairs already in the journal are not fetched again.
     """
     figure_image_data = {}
     
     for figure in historical_figures:
         print(f"Fetching images for {figure}...")
         
-        figure_data = {
-            "portraits": get_image_links_enhanced(figure, "portraits"),
-            "achievements": get_image_links_enhanced(figure, "achievements"),
-            "inventions": get_image_links_enhanced(figure, "inventions"),
-            "artifacts": get_image_links_enhanced(figure, "artifacts")
-        }
+        figure_data = {}
+        for image_type in ["portraits", "achievements", "inventions", "artifacts"]:
+            if journal.done(figure, image_type):
+                figure_data[image_type] = journal.get(figure, image_type)
+                continue
+            figure_data[image_type] = get_image_links_enhanced(figure, image_type)
+            journal.record(figure, image_type, data=figure_data[image_type])
         
         figure_image_data[figure] = figure_data
-        
-        # Save progress periodically
-        if len(figure_image_data) % 10 == 0:
-            with open('figure_image_progress.json', 'w') as f:
-                json.dump(figure_image_data, f, indent=2)
     
     return figure_image_data
 
@@ -309,9 +330,17 @@ def save_image_data_to_json(data, filename='orbGameFiguresImageData.json'):
     print(f"Image data saved to {filename}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search images for the historical figures")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip figure/type pairs already recorded in figure_image_progress.jsonl")
+    args = parser.parse_args()
+    
     # Generate comprehensive image data
     print("Starting enhanced image search for historical figures...")
-    figure_image_data = generate_figure_image_data()
+    with CheckpointJournal('figure_image_progress.jsonl', resume=args.resume) as journal:
+        if args.resume:
+            print(f"Resuming: {len(journal)} figure/type pairs already done")
+        figure_image_data = generate_figure_image_data(journal)
     
     # Save the complete dataset
     save_image_data_to_json(figure_image_data)
@@ -12,6 +12,8 @@ from typing import Dict, List, Optional
 import os
 import sys
 
+from image_pipeline.catalog import load_catalog
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -212,21 +214,7 @@ class BingImageSearchService:
 def load_figures_data() -> List[Dict]:
     """Load historical figures data from file"""
     try:
-        with open('OrbGameInfluentialPeopleSeeds', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Parse the JSON structure
-        figures = []
-        for category, epochs in data.items():
-            for epoch, people in epochs.items():
-                for person in people:
-                    figures.append({
-                        'name': person['name'],
-                        'figureName': person['name'],
-                        'category': category,
-                        'epoch': epoch,
-                        'context': person.get('context', '')
-                    })
+        figures = load_catalog().figure_list()
         
         logger.info(f"Loaded {len(figures)} historical figures from JSON data")
         return figures
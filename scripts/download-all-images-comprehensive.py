@@ -2,16 +2,32 @@
 """
 Comprehensive Image Download Script
 Downloads all images from multi_source_image_results.json with proper error handling
+
+Use --workers N to download in parallel (at most --workers-per-host requests to
+any one host). Bodies are streamed to <file>.part and renamed when complete;
+interrupted downloads resume with HTTP Range requests on the next run.
 """
 
+import argparse
 import json
 import requests
 import os
+import threading
 import time
 import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, unquote
 from pathlib import Path
 import logging
+import mimetypes
+
+from image_pipeline.downloads import EmptyDownloadError, download_to_file
+from image_pipeline.fetched import get_shared_store
+from image_pipeline.http_session import IMAGE_ACCEPT, create_session
+from image_pipeline.names import legacy_safe_names, safe_name
+from image_pipeline.probe import probe_file
+from image_pipeline.rate_limiter import RateLimitedSession
 
 # Set up logging
 logging.basicConfig(
@@ -24,30 +40,39 @@ logging.basicConfig(
 )
 
 class ComprehensiveImageDownloader:
-    def __init__(self):
+    def __init__(self, workers=1, workers_per_host=4):
         self.download_dir = Path("downloaded_images")
         self.download_dir.mkdir(exist_ok=True)
+        self.workers = workers
+        self.workers_per_host = workers_per_host
         
-        # Headers to avoid 403 errors
-        self.headers = {
-            'User-Agent': 'OrbGame-ImageDownloader/1.0 (https://orbgame.us; contact@orbgame.us) Python/3.x',
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+        # Pooled keep-alive session with a Wikimedia-compliant User-Agent,
+        # paced per host by the shared rate limiter
+        self.session = RateLimitedSession(create_session(accept=IMAGE_ACCEPT, pool_size=max(workers, 4)))
+        self.host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.workers_per_host))
+        self.lock = threading.Lock()
         
         self.stats = {
             'total_images': 0,
             'downloaded': 0,
             'failed': 0,
             'skipped': 0,
+            'bytes': 0,
             'errors': []
         }
+        self.start_time = time.time()
+    
+    def record(self, outcome, error=None, nbytes=0):
+        """Update shared statistics (called from worker threads)"""
+        with self.lock:
+            self.stats[outcome] += 1
+            self.stats['bytes'] += nbytes
+            if error:
+                self.stats['errors'].append(error)
     
-    def sanitize_filename(self, url, figure_name, image_type, index):
-        """Create a safe filename from URL and metadata"""
+    def sanitize_filename(self, url, figure_name, image_type, index, name_form=None):
+        """Create a safe filename from URL and metadata (name_form overrides safe_name)"""
+        figure_name = safe_name(figure_name) if name_form is None else name_form
         try:
             # Extract filename from URL
             parsed_url = urlparse(url)
@@ -71,6 +96,18 @@ class ComprehensiveImageDownloader:
             # Fallback filename
             return f"{figure_name}_{image_type}_{index}.jpg"
     
+    def existing_file(self, url, figure_name, image_type, index):
+        """
+        A file already downloaded for this image, under the safe_name form or
+        a name form used by earlier runs (the raw figure name, legacy forms)
+        """
+        forms = [safe_name(figure_name), figure_name] + legacy_safe_names(figure_name)
+        for form in dict.fromkeys(forms):
+            filepath = self.download_dir / self.sanitize_filename(url, figure_name, image_type, index, name_form=form)
+            if filepath.exists():
+                return filepath
+        return None
+    
     def download_image(self, url, figure_name, image_type, index):
         """Download a single image with error handling"""
         try:
@@ -78,58 +115,62 @@ class ComprehensiveImageDownloader:
             filename = self.sanitize_filename(url, figure_name, image_type, index)
             filepath = self.download_dir / filename
             
-            # Skip if already exists
-            if filepath.exists():
-                logging.info(f"⏭️  Skipped (exists): {filename}")
-                self.stats['skipped'] += 1
+            # Skip if already exists (also under names from earlier runs)
+            existing = self.existing_file(url, figure_name, image_type, index)
+            if existing:
+                logging.info(f"⏭️  Skipped (exists): {existing.name}")
+                self.record('skipped')
+                return True
+            
+            # Bytes already fetched by validation (or an earlier run) need no transfer
+            fetched = get_shared_store()
+            data = fetched.get(url)
+            if data:
+                tmp_path = filepath.with_name(filepath.name + ".tmp")
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, filepath)
+                logging.info(f"♻️  Reused fetched bytes: {filename} ({len(data)} bytes)")
+                self.record('downloaded')
                 return True
             
-            # Download image
+            # Stream to <file>.part, resuming any earlier partial download
             logging.info(f"⬇️  Downloading: {filename}")
-            response = requests.get(url, headers=self.headers, timeout=30)
+            with self.host_slots[urlparse(url).netloc]:
+                transferred = download_to_file(self.session, url, filepath)
             
-            if response.status_code == 200:
-                # Save image
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                
-                # Verify file size
-                if filepath.stat().st_size > 0:
-                    logging.info(f"✅ Downloaded: {filename} ({filepath.stat().st_size} bytes)")
-                    self.stats['downloaded'] += 1
-                    return True
-                else:
-                    logging.error(f"❌ Empty file: {filename}")
-                    filepath.unlink(missing_ok=True)
-                    self.stats['failed'] += 1
-                    self.stats['errors'].append(f"Empty file: {url}")
-                    return False
-            else:
-                logging.error(f"❌ HTTP {response.status_code}: {url}")
-                self.stats['failed'] += 1
-                self.stats['errors'].append(f"HTTP {response.status_code}: {url}")
-                return False
+            # Point the hashing and upload stages at the finished file (header only read here)
+            probe = probe_file(filepath)
+            content_type = f"image/{probe.format.lower()}" if probe else (mimetypes.guess_type(filename)[0] or "")
+            fetched.put_file(url, filepath, content_type)
+            
+            logging.info(f"✅ Downloaded: {filename} ({filepath.stat().st_size} bytes)")
+            self.record('downloaded', nbytes=transferred)
+            return True
                 
+        except EmptyDownloadError:
+            logging.error(f"❌ Empty file: {url}")
+            self.record('failed', f"Empty file: {url}")
+            return False
+        except requests.exceptions.HTTPError as e:
+            logging.error(f"❌ HTTP {e.response.status_code}: {url}")
+            self.record('failed', f"HTTP {e.response.status_code}: {url}")
+            return False
         except requests.exceptions.Timeout:
             logging.error(f"⏰ Timeout: {url}")
-            self.stats['failed'] += 1
-            self.stats['errors'].append(f"Timeout: {url}")
+            self.record('failed', f"Timeout: {url}")
             return False
         except requests.exceptions.RequestException as e:
             logging.error(f"🌐 Network error: {url} - {e}")
-            self.stats['failed'] += 1
-            self.stats['errors'].append(f"Network error: {url} - {e}")
+            self.record('failed', f"Network error: {url} - {e}")
             return False
         except Exception as e:
             logging.error(f"💥 Unexpected error: {url} - {e}")
-            self.stats['failed'] += 1
-            self.stats['errors'].append(f"Unexpected error: {url} - {e}")
+            self.record('failed', f"Unexpected error: {url} - {e}")
             return False
     
-    def process_figure(self, figure_data):
-        """Process all images for a single figure"""
+    def iter_figure_images(self, figure_data):
+        """Yield (url, figure_name, image_type, index) for every image of a figure"""
         figure_name = figure_data.get('figureName', 'Unknown')
-        logging.info(f"\n🎯 Processing figure: {figure_name}")
         
         # Get the images object
         images_obj = figure_data.get('images', {})
@@ -142,21 +183,30 @@ class ComprehensiveImageDownloader:
         
         for image_type in image_types:
             images = images_obj.get(image_type, [])
-            if not images:
-                continue
-                
-            logging.info(f"  📸 {image_type}: {len(images)} images")
-            
             for i, image in enumerate(images):
                 url = image.get('url')
-                if not url:
-                    continue
-                
-                self.stats['total_images'] += 1
-                self.download_image(url, figure_name, image_type, i)
-                
-                # Small delay to be respectful
-                time.sleep(0.1)
+                if url:
+                    yield url, figure_name, image_type, i
+    
+    def process_figure(self, figure_data):
+        """Process all images for a single figure"""
+        logging.info(f"\n🎯 Processing figure: {figure_data.get('figureName', 'Unknown')}")
+        
+        for task in self.iter_figure_images(figure_data):
+            self.stats['total_images'] += 1
+            self.download_image(*task)
+    
+    def download_parallel(self, figures):
+        """Download every image of every figure with a thread pool"""
+        tasks = [task for figure in figures for task in self.iter_figure_images(figure)]
+        self.stats['total_images'] += len(tasks)
+        logging.info(f"⚡ Downloading {len(tasks)} images with {self.workers} workers "
+                     f"({self.workers_per_host} per host)")
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for done, _ in enumerate(executor.map(lambda task: self.download_image(*task), tasks), 1):
+                if done % 50 == 0:
+                    self.print_stats()
     
     def download_all_images(self):
         """Download all images from the JSON file"""
@@ -170,14 +220,17 @@ class ComprehensiveImageDownloader:
             figures = data.get('figures', [])
             logging.info(f"📊 Found {len(figures)} figures with images")
             
-            # Process each figure
-            for i, figure in enumerate(figures, 1):
-                logging.info(f"\n📋 Progress: {i}/{len(figures)} figures")
-                self.process_figure(figure)
-                
-                # Progress update every 10 figures
-                if i % 10 == 0:
-                    self.print_stats()
+            if self.workers > 1:
+                self.download_parallel(figures)
+            else:
+                # Process each figure
+                for i, figure in enumerate(figures, 1):
+                    logging.info(f"\n📋 Progress: {i}/{len(figures)} figures")
+                    self.process_figure(figure)
+                    
+                    # Progress update every 10 figures
+                    if i % 10 == 0:
+                        self.print_stats()
             
             # Final stats
             self.print_final_stats()
@@ -194,9 +247,14 @@ class ComprehensiveImageDownloader:
         
         return True
     
+    def throughput(self):
+        """Average download throughput in MB/s since start"""
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return self.stats['bytes'] / elapsed / (1024 * 1024)
+    
     def print_stats(self):
         """Print current statistics"""
-        logging.info(f"📈 Progress: {self.stats['downloaded']}/{self.stats['total_images']} downloaded, {self.stats['failed']} failed, {self.stats['skipped']} skipped")
+        logging.info(f"📈 Progress: {self.stats['downloaded']}/{self.stats['total_images']} downloaded, {self.stats['failed']} failed, {self.stats['skipped']} skipped, {self.throughput():.2f} MB/s")
     
     def print_final_stats(self):
         """Print final statistics"""
@@ -207,6 +265,8 @@ class ComprehensiveImageDownloader:
         logging.info(f"✅ Downloaded: {self.stats['downloaded']}")
         logging.info(f"❌ Failed: {self.stats['failed']}")
         logging.info(f"⏭️  Skipped: {self.stats['skipped']}")
+        logging.info(f"📦 Transferred: {self.stats['bytes'] / (1024 * 1024):.1f} MB "
+                     f"in {time.time() - self.start_time:.1f}s ({self.throughput():.2f} MB/s)")
         logging.info(f"📁 Files in directory: {len(list(self.download_dir.glob('*')))}")
         
         if self.stats['errors']:
@@ -218,7 +278,13 @@ class ComprehensiveImageDownloader:
         logging.info(f"\n🎯 Success Rate: {success_rate:.1f}%")
 
 def main():
-    downloader = ComprehensiveImageDownloader()
+    parser = argparse.ArgumentParser(description="Download all images from multi_source_image_results.json")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel download workers (default: 1)")
+    parser.add_argument("--workers-per-host", type=int, default=4,
+                        help="Maximum concurrent downloads from one host (default: 4)")
+    args = parser.parse_args()
+    
+    downloader = ComprehensiveImageDownloader(workers=args.workers, workers_per_host=args.workers_per_host)
     success = downloader.download_all_images()
     
     if success:
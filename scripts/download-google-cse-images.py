@@ -6,13 +6,19 @@ Downloads images from the google_custom_search_results.json file to the download
 
 import json
 import os
-import requests
 from pathlib import Path
 import time
 from urllib.parse import urlparse
 
-def download_image(url, filename, folder="downloaded_images"):
-    """Download an image from URL to the specified folder."""
+from image_pipeline.http_session import get_shared_session
+from image_pipeline.names import legacy_safe_names, safe_name
+
+def download_image(url, filename, folder="downloaded_images", legacy_filenames=()):
+    """Download an image from URL to the specified folder.
+    
+    legacy_filenames are names earlier runs may have used for the same
+    image; if one of them exists the download is skipped.
+    """
     try:
         # Create folder if it doesn't exist
         Path(folder).mkdir(exist_ok=True)
@@ -20,23 +26,14 @@ def download_image(url, filename, folder="downloaded_images"):
         # Full path for the image
         filepath = os.path.join(folder, filename)
         
-        # Skip if file already exists
-        if os.path.exists(filepath):
-            print(f"⏭️  Skipping {filename} (already exists)")
-            return True
-        
-        # Set proper headers for different sites
-        headers = {
-            'User-Agent': 'OrbGame-ImageDownloader/1.0 (https://orbgame.us; contact@orbgame.us) Python/3.x',
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+        # Skip if file already exists, under its current or a legacy name
+        for existing in (filename, *legacy_filenames):
+            if os.path.exists(os.path.join(folder, existing)):
+                print(f"⏭️  Skipping {existing} (already exists)")
+                return True
         
-        # Download the image
-        response = requests.get(url, headers=headers, timeout=15)
+        # Download the image over the shared keep-alive session
+        response = get_shared_session().get(url, timeout=15)
         response.raise_for_status()
         
         # Save the image
@@ -52,10 +49,8 @@ def download_image(url, filename, folder="downloaded_images"):
 
 def sanitize_filename(name):
     """Convert a name to a safe filename."""
-    # Replace spaces and special characters
-    safe_name = name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-    safe_name = ''.join(c for c in safe_name if c.isalnum() or c in '_-')
-    return safe_name
+    # ASCII-fold accents and turn punctuation/spaces into underscores
+    return safe_name(name)
 
 def download_all_images():
     """Download all images from the Google Custom Search results."""
@@ -98,9 +93,10 @@ def download_all_images():
                     # Create filename
                     safe_name = sanitize_filename(figure_name)
                     filename = f"{safe_name}_{image_type}_0.jpg"
+                    legacy_filenames = [f"{form}_{image_type}_0.jpg" for form in legacy_safe_names(figure_name)]
                     
                     total_images += 1
-                    if download_image(image_url, filename):
+                    if download_image(image_url, filename, legacy_filenames=legacy_filenames):
                         successful_downloads += 1
                     else:
                         failed_downloads += 1
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Export Phase JSONL Files to JSON
+================================
+
+The pipeline phases hand off line-delimited records (.jsonl). This script
+streams them back into the indented JSON arrays that older tools (e.g.
+create-simple-migration.js, inventory-all-images.js) read.
+
+Usage:
+  python3 scripts/export-phase-json.py                  # all phase files present
+  python3 scripts/export-phase-json.py filtered_images.jsonl
+"""
+
+import argparse
+import os
+import sys
+
+from image_pipeline.jsonl import export_json
+
+PHASE_FILES = [
+    "search_targets.jsonl",
+    "raw_image_metadata_final.jsonl",
+    "filtered_images.jsonl",
+    "grouped_images_for_mongodb.jsonl",
+]
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Export phase .jsonl files to .json arrays")
+    parser.add_argument("files", nargs="*", help="JSONL files to export (default: all phase files present)")
+    parser.add_argument("--output", help="Output path (only with a single input file)")
+    args = parser.parse_args()
+
+    if args.output and len(args.files) != 1:
+        parser.error("--output requires exactly one input file")
+
+    files = args.files or [path for path in PHASE_FILES if os.path.exists(path)]
+    if not files:
+        print("❌ No phase .jsonl files found")
+        sys.exit(1)
+
+    for path in files:
+        if not os.path.exists(path):
+            print(f"❌ Not found: {path}")
+            continue
+        destination, count = export_json(path, args.output)
+        print(f"✅ {path} → {destination} ({count} records)")
+
+if __name__ == "__main__":
+    main()
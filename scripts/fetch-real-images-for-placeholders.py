@@ -13,6 +13,8 @@ import sys
 from typing import Dict, List, Optional
 from datetime import datetime
 
+from image_pipeline.catalog import load_catalog
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -164,19 +166,7 @@ class PlaceholderImageFetcher:
     def load_figures_data(self) -> List[Dict]:
         """Load all figures from OrbGameInfluentialPeopleSeeds"""
         try:
-            with open('OrbGameInfluentialPeopleSeeds', 'r') as f:
-                data = json.load(f)
-            
-            figures = []
-            for category, epochs in data.items():
-                for epoch, figures_list in epochs.items():
-                    for figure in figures_list:
-                        figures.append({
-                            'name': figure['name'],
-                            'category': category,
-                            'epoch': epoch,
-                            'context': figure.get('context', '')
-                        })
+            figures = load_catalog().figure_list()
             
             logger.info(f"✅ Loaded {len(figures)} figures from OrbGameInfluentialPeopleSeeds")
             return figures
@@ -2,17 +2,35 @@
 """
 Fetch Real Images for Placeholder Figures using Google Custom Search API
 Rate-limited version with better error handling
+
+Every completed figure/image-type search is journaled to
+real_images_rate_limited_progress.jsonl; --resume skips those pairs (and
+their API queries) after an interrupted run.
+
+Queries spent are persisted per UTC day in .cache/cse_quota.json, so the
+daily cap holds across runs. Searches are scheduled by expected payoff
+(missing portraits first), stop at the first query that finds images, and
+identical queries are only paid for once; run daily with --resume to work
+through the backlog.
 """
 
+import argparse
 import json
 import requests
-import time
 import logging
 import os
 import sys
 from typing import Dict, List, Optional
 from datetime import datetime
 
+from image_pipeline.catalog import load_catalog
+from image_pipeline.checkpoint import CheckpointJournal
+from image_pipeline.cse_quota import (
+    DAILY_QUOTA_REASONS, DEFAULT_LEDGER_PATH, RATE_LIMIT_REASONS, DailyQuotaLedger, QueryScheduler, error_reasons,
+)
+from image_pipeline.http_cache import with_response_cache
+from image_pipeline.rate_limiter import RateLimitedSession, get_shared_limiter
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,6 +42,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+CHECKPOINT_FILE = 'real_images_rate_limited_progress.jsonl'
+
 class RateLimitedImageFetcher:
     """Fetch real images for placeholder figures using Google Custom Search API with rate limiting"""
     
@@ -31,33 +51,24 @@ class RateLimitedImageFetcher:
         self.api_key = api_key
         self.cx = cx  # Custom Search Engine ID
         self.endpoint = 'https://www.googleapis.com/customsearch/v1'
-        self.session = requests.Session()
-        
-        # Rate limiting - much more conservative
-        self.requests_per_second = 1  # 1 request per second (very conservative)
-        self.last_request_time = 0
-        self.daily_queries = 0
+        # Requests are paced by the shared per-host token bucket; with
+        # ORB_HTTP_CACHE set, repeated queries are answered from disk
+        self.session = with_response_cache(RateLimitedSession(requests.Session()))
         self.max_daily_queries = 9500  # Leave buffer for other uses
+        # Usage per UTC day, shared by every run on this machine
+        self.quota = DailyQuotaLedger(DEFAULT_LEDGER_PATH, self.max_daily_queries)
+        self.quota_errors = 0  # 429 and quota/rate 403 answers; such searches are not journaled as done
+        self.request_errors = 0  # Failed requests; their searches are not journaled as done either
         
         if self.api_key and self.cx:
             logger.info("✅ Google Custom Search API configured")
         else:
             logger.warning("⚠️ Google Custom Search API not configured")
     
-    def rate_limit(self):
-        """Implement conservative rate limiting for Google CSE API"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < (1.0 / self.requests_per_second):
-            sleep_time = (1.0 / self.requests_per_second) - time_since_last
-            logger.info(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
-            time.sleep(sleep_time)
-        self.last_request_time = time.time()
-    
     def check_daily_limit(self):
         """Check if we've hit the daily query limit"""
-        if self.daily_queries >= self.max_daily_queries:
-            logger.warning(f"⚠️ Daily query limit reached ({self.daily_queries}/{self.max_daily_queries})")
+        if self.quota.remaining() <= 0:
+            logger.warning(f"⚠️ Daily query limit reached ({self.quota.used()}/{self.max_daily_queries})")
             return False
         return True
     
@@ -67,13 +78,12 @@ class RateLimitedImageFetcher:
             logger.warning(f"No API credentials - skipping query: {query}")
             return []
         
-        if not self.check_daily_limit():
+        # Claim the query from the persisted daily budget before sending it
+        if not self.quota.reserve():
             logger.warning(f"Skipping query due to daily limit: {query}")
             return []
         
         try:
-            self.rate_limit()
-            
             params = {
                 'key': self.api_key,
                 'cx': self.cx,
@@ -90,9 +100,27 @@ class RateLimitedImageFetcher:
             
             if response.status_code == 429:
                 logger.error(f"Rate limit hit for query '{query}': 429 Too Many Requests")
+                self.quota_errors += 1
+                self.quota.refund()
                 return []
             elif response.status_code == 403:
-                logger.error(f"Daily quota exceeded for query '{query}': 403 Forbidden")
+                try:
+                    reasons = error_reasons(response.json())
+                except ValueError:
+                    reasons = set()
+                if reasons & DAILY_QUOTA_REASONS:
+                    logger.error(f"Daily quota exceeded for query '{query}': 403 {', '.join(sorted(reasons))}")
+                    self.quota_errors += 1
+                    self.quota.exhaust()
+                elif reasons & RATE_LIMIT_REASONS:
+                    logger.error(f"Rate limit hit for query '{query}': 403 {', '.join(sorted(reasons))}")
+                    self.quota_errors += 1
+                    self.quota.refund()
+                else:
+                    # Bad key, API not enabled, ...: a failed request, not a spent quota
+                    logger.error(f"Request refused for query '{query}': 403 {', '.join(sorted(reasons)) or 'Forbidden'}")
+                    self.request_errors += 1
+                    self.quota.refund()
                 return []
             
             response.raise_for_status()
@@ -100,7 +128,9 @@ class RateLimitedImageFetcher:
             data = response.json()
             results = data.get('items', [])
             
-            self.daily_queries += 1
+            # Cached answers don't spend CSE quota
+            if getattr(response, 'from_cache', False):
+                self.quota.refund()
             
             if results:
                 urls = [img['link'] for img in results if img.get('link')]
@@ -112,9 +142,12 @@ class RateLimitedImageFetcher:
                 
         except requests.exceptions.RequestException as e:
             logger.error(f"Request error for query '{query}': {e}")
+            self.request_errors += 1
+            self.quota.refund()
             return []
         except Exception as e:
             logger.error(f"Google Custom Search API error for query '{query}': {e}")
+            self.request_errors += 1
             return []
     
     def generate_search_queries(self, figure_name: str, category: str, image_type: str) -> List[str]:
@@ -144,57 +177,10 @@ class RateLimitedImageFetcher:
         
         return queries
     
-    def fetch_images_for_figure(self, figure_name: str, category: str, epoch: str) -> Dict:
-        """Fetch images for a single figure across all image types"""
-        figure_data = {
-            'figureName': figure_name,
-            'category': category,
-            'epoch': epoch,
-            'images': {
-                'portraits': [],
-                'achievements': [],
-                'inventions': [],
-                'artifacts': []
-            },
-            'search_stats': {
-                'total_queries': 0,
-                'successful_searches': 0,
-                'failed_searches': 0
-            }
-        }
-        
-        image_types = ['portraits', 'achievements', 'inventions', 'artifacts']
-        
-        for image_type in image_types:
-            queries = self.generate_search_queries(figure_name, category, image_type)
-            figure_data['search_stats']['total_queries'] += len(queries)
-            
-            for query in queries:
-                urls = self.search_google_images(query, count=1)
-                if urls:
-                    figure_data['images'][image_type].extend(urls)
-                    figure_data['search_stats']['successful_searches'] += 1
-                else:
-                    figure_data['search_stats']['failed_searches'] += 1
-        
-        return figure_data
-    
     def load_figures_data(self) -> List[Dict]:
         """Load all figures from OrbGameInfluentialPeopleSeeds"""
         try:
-            with open('OrbGameInfluentialPeopleSeeds', 'r') as f:
-                data = json.load(f)
-            
-            figures = []
-            for category, epochs in data.items():
-                for epoch, figures_list in epochs.items():
-                    for figure in figures_list:
-                        figures.append({
-                            'name': figure['name'],
-                            'category': category,
-                            'epoch': epoch,
-                            'context': figure.get('context', '')
-                        })
+            figures = load_catalog().figure_list()
             
             logger.info(f"✅ Loaded {len(figures)} figures from OrbGameInfluentialPeopleSeeds")
             return figures
@@ -203,7 +189,7 @@ class RateLimitedImageFetcher:
             logger.error(f"Error loading figures data: {e}")
             return []
     
-    def process_all_figures(self) -> Dict:
+    def process_all_figures(self, journal: Optional[CheckpointJournal] = None) -> Dict:
         """Process all figures and fetch real images with rate limiting"""
         figures = self.load_figures_data()
         
@@ -231,49 +217,106 @@ class RateLimitedImageFetcher:
         }
         
         logger.info(f"🚀 Starting to fetch real images for {len(figures)} figures...")
-        logger.info(f"⚠️ Using conservative rate limiting: 1 request per second")
-        logger.info(f"⚠️ Daily query limit: {self.max_daily_queries}")
+        rate, burst = get_shared_limiter().rate_for('www.googleapis.com')
+        logger.info(f"⚠️ Rate limiting: {rate:g} requests per second (burst {burst})")
+        logger.info(f"⚠️ Daily query budget: {self.quota.remaining()}/{self.max_daily_queries} left today (UTC)")
         
-        for i, figure in enumerate(figures, 1):
-            logger.info(f"Processing figure {i}/{len(figures)}: {figure['name']} ({figure['category']}, {figure['epoch']})")
+        image_types = ['portraits', 'achievements', 'inventions', 'artifacts']
+        figure_key = lambda figure: (figure['category'], figure['epoch'], figure['name'])
+        
+        # Searches finished in earlier runs (or days) are reused from the journal
+        found = {}
+        for figure in figures:
+            for image_type in image_types:
+                if journal and journal.done(*figure_key(figure), image_type):
+                    found[(figure_key(figure), image_type)] = journal.get(*figure_key(figure), image_type)
+        
+        # Queue the rest by expected payoff: missing portraits first, then the emptiest figures
+        scheduler = QueryScheduler()
+        for figure in figures:
+            key = figure_key(figure)
+            covered = sum(1 for image_type in image_types if (found.get((key, image_type)) or {}).get('urls'))
+            for image_type in image_types:
+                if (key, image_type) not in found:
+                    queries = self.generate_search_queries(figure['name'], figure['category'], image_type)
+                    scheduler.add(key, image_type, queries, covered)
+        logger.info(f"📋 {scheduler.pending_pairs()} figure/type searches pending")
+        
+        in_progress = {}
+        retry_later = []
+        while len(scheduler):
+            key, image_type, rank, query = scheduler.pop()
+            pair = in_progress.setdefault((key, image_type), {
+                'urls': [], 'total_queries': 0, 'successful_searches': 0, 'failed_searches': 0
+            })
             
-            # Check daily limit before processing each figure
-            if not self.check_daily_limit():
-                logger.warning(f"⚠️ Stopping early due to daily query limit. Processed {i-1}/{len(figures)} figures.")
-                break
+            urls = scheduler.known_result(query)
+            if urls is not None:
+                logger.info(f"♻️ Reusing results of identical query: {query}")
+            else:
+                if not self.check_daily_limit():
+                    scheduler.requeue(key, image_type, rank)
+                    break
+                errors_before = self.quota_errors + self.request_errors
+                urls = self.search_google_images(query, count=1)
+                if self.quota_errors + self.request_errors != errors_before:
+                    # Throttled, out of quota or failed: the query found nothing yet, so keep
+                    # it pending for a later run instead of journaling the pair as done
+                    retry_later.append((key, image_type, rank))
+                    continue
             
-            try:
-                figure_data = self.fetch_images_for_figure(
-                    figure['name'], 
-                    figure['category'], 
-                    figure['epoch']
-                )
-                
-                results['figures'].append(figure_data)
-                results['metadata']['processed'] += 1
-                
-                # Update summary stats
-                total_images = sum(len(images) for images in figure_data['images'].values())
-                results['summary_stats']['total_images_found'] += total_images
-                results['summary_stats']['total_queries'] += figure_data['search_stats']['total_queries']
-                results['summary_stats']['successful_searches'] += figure_data['search_stats']['successful_searches']
-                results['summary_stats']['failed_searches'] += figure_data['search_stats']['failed_searches']
-                results['summary_stats']['daily_queries_used'] = self.daily_queries
-                
-                if total_images > 0:
-                    results['metadata']['successful'] += 1
-                else:
-                    results['metadata']['failed'] += 1
-                
-                logger.info(f"✅ {figure['name']}: Found {total_images} images (Daily queries: {self.daily_queries})")
-                
-                # Add a small delay between figures
-                time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"Error processing {figure['name']}: {e}")
+            pair['total_queries'] += 1
+            pair['urls'].extend(urls)
+            pair['successful_searches' if urls else 'failed_searches'] += 1
+            
+            if scheduler.complete(key, image_type, rank, query, urls):
+                found[(key, image_type)] = pair
+                if journal:
+                    journal.record(*key, image_type, data=pair)
+        
+        for key, image_type, rank in retry_later:
+            scheduler.requeue(key, image_type, rank)
+        deferred = scheduler.pending_pairs()
+        results['metadata']['deferred_searches'] = deferred
+        if deferred:
+            days = -(-deferred // max(self.max_daily_queries, 1))
+            logger.info(f"⏭️ {deferred} figure/type searches deferred to the next UTC day "
+                        f"(at least {days} more day(s) at the current budget); run again with --resume")
+        
+        # Assemble per-figure results in seed order
+        for figure in figures:
+            key = figure_key(figure)
+            pairs = {image_type: found.get((key, image_type)) for image_type in image_types}
+            if not any(pairs.values()):
+                continue
+            
+            figure_data = {
+                'figureName': figure['name'],
+                'category': figure['category'],
+                'epoch': figure['epoch'],
+                'images': {image_type: (pair or {}).get('urls', []) for image_type, pair in pairs.items()},
+                'search_stats': {
+                    stat: sum((pair or {}).get(stat, 0) for pair in pairs.values())
+                    for stat in ('total_queries', 'successful_searches', 'failed_searches')
+                }
+            }
+            results['figures'].append(figure_data)
+            results['metadata']['processed'] += 1
+            
+            # Update summary stats
+            total_images = sum(len(images) for images in figure_data['images'].values())
+            results['summary_stats']['total_images_found'] += total_images
+            results['summary_stats']['total_queries'] += figure_data['search_stats']['total_queries']
+            results['summary_stats']['successful_searches'] += figure_data['search_stats']['successful_searches']
+            results['summary_stats']['failed_searches'] += figure_data['search_stats']['failed_searches']
+            
+            if total_images > 0:
+                results['metadata']['successful'] += 1
+            else:
                 results['metadata']['failed'] += 1
         
+        results['summary_stats']['daily_queries_used'] = self.quota.used()
+        
         results['metadata']['end_time'] = datetime.now().isoformat()
         results['metadata']['processing_time'] = (
             datetime.fromisoformat(results['metadata']['end_time']) - 
@@ -313,6 +356,11 @@ def get_google_credentials() -> tuple:
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Fetch real images with Google Custom Search (rate limited)")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Skip figure/type searches already recorded in {CHECKPOINT_FILE}")
+    args = parser.parse_args()
+    
     logger.info("🚀 Starting Rate-Limited Real Image Fetch for Placeholder Figures")
     
     # Get credentials
@@ -327,8 +375,11 @@ def main():
     # Initialize fetcher
     fetcher = RateLimitedImageFetcher(api_key, cx)
     
-    # Process all figures
-    results = fetcher.process_all_figures()
+    # Process all figures, journaling each completed figure/type
+    with CheckpointJournal(CHECKPOINT_FILE, resume=args.resume) as journal:
+        if args.resume:
+            logger.info(f"♻️ Resuming: {len(journal)} figure/type searches already done")
+        results = fetcher.process_all_figures(journal)
     
     if results:
         # Save results
@@ -4,14 +4,17 @@ Google Custom Search API Implementation for Orb Game Historical Figures
 Replaces deprecated Bing Image Search with Google Custom Search API
 """
 
-import requests
 import json
-import time
 import logging
 from typing import Dict, List, Optional
 import os
 import sys
 
+from image_pipeline.catalog import load_catalog
+from image_pipeline.http_cache import with_response_cache
+from image_pipeline.http_session import create_session
+from image_pipeline.rate_limiter import RateLimitedSession
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,7 +33,7 @@ class GoogleCustomSearchService:
         self.api_key = api_key
         self.cx = cx  # Custom Search Engine ID
         self.endpoint = 'https://www.googleapis.com/customsearch/v1'
-        self.session = requests.Session()
+        self.session = with_response_cache(RateLimitedSession(create_session()))
         
         # Fallback placeholder images (public domain Wikimedia Commons)
         self.placeholder_images = {
@@ -224,30 +227,13 @@ class GoogleCustomSearchService:
             # Progress update
             if results['processed'] % 10 == 0:
                 logger.info(f"Progress: {results['processed']}/{results['total_figures']} figures processed")
-            
-            # Rate limiting (Google CSE has 100 queries/day free tier)
-            time.sleep(0.5)
         
         return results
 
 def load_figures_data() -> List[Dict]:
     """Load historical figures data from file"""
     try:
-        with open('OrbGameInfluentialPeopleSeeds', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Parse the JSON structure
-        figures = []
-        for category, epochs in data.items():
-            for epoch, people in epochs.items():
-                for person in people:
-                    figures.append({
-                        'name': person['name'],
-                        'figureName': person['name'],
-                        'category': category,
-                        'epoch': epoch,
-                        'context': person.get('context', '')
-                    })
+        figures = load_catalog().figure_list()
         
         logger.info(f"Loaded {len(figures)} historical figures from JSON data")
         return figures
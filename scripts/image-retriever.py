@@ -4,30 +4,42 @@ Orb Game Image Retriever
 Systematic image gathering for historical figures
 """
 
-import requests
 import json
 import hashlib
 import os
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
-import time
 from tqdm import tqdm
 from PIL import Image
 import io
 import pymongo
 from pathlib import Path
 
+from image_pipeline.cascade import Step, run_cascade
+from image_pipeline.checkpoint import CheckpointJournal
+from image_pipeline.fetched import get_shared_store
+from image_pipeline.http_cache import with_response_cache
+from image_pipeline.http_session import create_session
+from image_pipeline.mongo_bulk import DEFAULT_BATCH_SIZE, BulkReplacer
+from image_pipeline.names import safe_name
+from image_pipeline.probe import check_dimensions, probe_url
+from image_pipeline.rate_limiter import RateLimitedSession
+from image_pipeline.renditions import describe, prepare, render_ladder, rendition_name
+
 class ImageRetriever:
     """
     Systematic image retriever for historical figures
     """
     
-    def __init__(self, mongo_uri: str, output_dir: str = "images"):
-        self.session = requests.Session()
+    def __init__(self, mongo_uri: str, output_dir: str = "images", batch_size: int = DEFAULT_BATCH_SIZE,
+                 images_per_type: int = 1):
+        self.session = with_response_cache(RateLimitedSession(create_session()))
         self.mongo_client = pymongo.MongoClient(mongo_uri)
         self.db = self.mongo_client.orbgame
         self.images_collection = self.db.historical_figure_images
+        # Figure documents are upserted in unordered bulk writes
+        self.writer = BulkReplacer(self.images_collection, batch_size)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         
@@ -42,6 +54,8 @@ class ImageRetriever:
         
         # Image types to search for
         self.image_types = ["portrait", "achievement", "invention", "artifact"]
+        # A type is satisfied by this many validated images; remaining queries are skipped
+        self.images_per_type = images_per_type
         
     def load_historical_figures(self) -> Dict:
         """Load historical figures from JSON file"""
@@ -166,34 +180,56 @@ class ImageRetriever:
     def download_and_validate(self, image_info: Dict, figure_name: str) -> Optional[Dict]:
         """Download, validate, and process image"""
         try:
-            # Download image
-            response = self.session.get(image_info["url"], timeout=30)
-            response.raise_for_status()
+            # Probe the header first so undersized or oddly shaped images
+            # are rejected without downloading the full body
+            # (on probe errors the full download below decides)
+            try:
+                probe, _ = probe_url(self.session, image_info["url"])
+            except Exception:
+                probe = None
+            if probe and not check_dimensions(probe)[0]:
+                return None
             
-            # Open with PIL for validation
-            img = Image.open(io.BytesIO(response.content))
+            # Download image (once per run; later stages reuse the bytes)
+            fetched = get_shared_store()
+            data, _ = fetched.fetch(self.session, image_info["url"], timeout=30)
+            
+            # Open with PIL for validation (only the header is parsed here)
+            try:
+                img = Image.open(io.BytesIO(data))
+            except Exception:
+                fetched.discard(image_info["url"])
+                raise
             
             # Validate dimensions
             width, height = img.size
             if width < 200 or height < 200:
+                fetched.discard(image_info["url"])
                 return None  # Too small
-            if width > 1024 or height > 1024:
-                # Resize if too large
-                img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
-                width, height = img.size
             
             # Check aspect ratio
             ratio = width / height
             if ratio < 0.3 or ratio > 3.0:
+                fetched.discard(image_info["url"])
                 return None  # Poor aspect ratio
             
             # Generate filename
             url_hash = hashlib.md5(image_info["url"].encode()).hexdigest()[:8]
-            filename = f"{figure_name.lower().replace(' ', '_')}_{image_info['type']}_{url_hash}.jpg"
+            filename = f"{safe_name(figure_name).lower()}_{image_info['type']}_{url_hash}.jpg"
             filepath = self.output_dir / filename
             
-            # Save image
-            img.save(filepath, "JPEG", quality=85)
+            # Decode once and write the rendition ladder; the largest JPEG
+            # rung (at most 1024px) is the image itself
+            renditions = []
+            primary = None
+            for rendition in render_ladder(prepare(img)):
+                if rendition.extension == "jpg" and primary is None:
+                    path = primary = filepath
+                    width, height = rendition.width, rendition.height
+                else:
+                    path = self.output_dir / rendition_name(filename, rendition.size, rendition.extension)
+                path.write_bytes(rendition.data)
+                renditions.append(describe(rendition, localPath=str(path)))
             
             # Update image info
             image_info.update({
@@ -201,6 +237,7 @@ class ImageRetriever:
                 "width": width,
                 "height": height,
                 "fileSize": filepath.stat().st_size,
+                "renditions": renditions,
                 "retrieved": datetime.now().isoformat()
             })
             
@@ -210,38 +247,48 @@ class ImageRetriever:
             print(f"⚠️ Failed to download {image_info['url']}: {e}")
             return None
     
-    def search_figure_images(self, figure_name: str, category: str, epoch: str, achievement: str) -> List[Dict]:
-        """Search for all image types for a figure"""
+    def search_figure_images(self, figure_name: str, category: str, epoch: str, achievement: str,
+                             journal: Optional[CheckpointJournal] = None) -> List[Dict]:
+        """Search for all image types for a figure (types already in the journal are reused)"""
         all_images = []
         search_terms = self.generate_search_terms(figure_name, category, achievement)
         
         print(f"🔍 Searching for images of {figure_name} ({category}/{epoch})")
         
         for image_type, terms in search_terms.items():
+            if journal and journal.done(category, epoch, figure_name, image_type):
+                print(f"  ⏭️ {image_type} already retrieved")
+                all_images.extend(journal.get(category, epoch, figure_name, image_type))
+                continue
+            
             print(f"  📸 Searching {image_type} images...")
             
-            for search_term in terms:
-                # Search multiple sources
-                images = []
-                images.extend(self.search_wikimedia(search_term, image_type))
-                images.extend(self.search_smithsonian(search_term, image_type))
-                
-                # Download and validate
-                for image_info in images:
-                    processed_image = self.download_and_validate(image_info, figure_name)
-                    if processed_image:
-                        processed_image["figureName"] = figure_name
-                        processed_image["category"] = category
-                        processed_image["epoch"] = epoch
-                        all_images.append(processed_image)
-                        break  # Take first valid image of this type
-                
-                time.sleep(1)  # Rate limiting
+            def validate(image_info):
+                processed_image = self.download_and_validate(image_info, figure_name)
+                if processed_image:
+                    processed_image["figureName"] = figure_name
+                    processed_image["category"] = category
+                    processed_image["epoch"] = epoch
+                return processed_image
+            
+            # Search term by term, source by source, until the type is satisfied
+            steps = (
+                Step(source, f"{source}: {term}", lambda search=search, term=term: search(term, image_type))
+                for term in terms
+                for source, search in (("wikimedia", self.search_wikimedia), ("smithsonian", self.search_smithsonian))
+            )
+            cascade = run_cascade(steps, want=self.images_per_type, accept=validate)
+            type_images = [image for _, image in cascade.results]
+            all_images.extend(type_images)
+            print(f"    ✅ {len(type_images)} valid, {cascade.issued} queries sent, {cascade.skipped} skipped")
+            
+            if journal:
+                journal.record(category, epoch, figure_name, image_type, data=type_images)
         
         return all_images
     
     def store_figure_images(self, figure_name: str, category: str, epoch: str, images: List[Dict]) -> bool:
-        """Store images in MongoDB"""
+        """Queue images for storage in MongoDB (written by the bulk writer)"""
         try:
             if not images:
                 return False
@@ -269,19 +316,23 @@ class ImageRetriever:
                 "epoch": epoch
             }
             
-            result = self.images_collection.replace_one(
-                filter_query, doc, upsert=True
-            )
+            self.writer.add(filter_query, doc, label=f"{figure_name} ({category}/{epoch})")
             
-            print(f"✅ Stored {len(images)} images for {figure_name}")
+            print(f"✅ Queued {len(images)} images for {figure_name}")
             return True
             
         except Exception as e:
             print(f"❌ Failed to store images for {figure_name}: {e}")
             return False
     
-    def process_all_figures(self) -> Dict:
-        """Process all historical figures"""
+    def process_all_figures(self, journal: Optional[CheckpointJournal] = None) -> Dict:
+        """
+        Process all historical figures
+        
+        With a checkpoint journal, figure/type searches finished by an earlier
+        run are not repeated; their images are re-queued for the (idempotent)
+        upsert so nothing is lost if that run died before its last bulk write.
+        """
         figures_data = self.load_historical_figures()
         
         if not figures_data:
@@ -320,7 +371,7 @@ class ImageRetriever:
                     print(f"\n📋 Processing {results['processed_figures']}/{results['total_figures']}: {figure_name}")
                     
                     # Search for images
-                    images = self.search_figure_images(figure_name, category, epoch, achievement)
+                    images = self.search_figure_images(figure_name, category, epoch, achievement, journal)
                     
                     if images:
                         # Store in database
@@ -335,8 +386,15 @@ class ImageRetriever:
                                 if img_type not in results["coverage"]:
                                     results["coverage"][img_type] = 0
                                 results["coverage"][img_type] += 1
-                    
-                    time.sleep(2)  # Rate limiting between figures
+        
+        # Flush the last partial batch; failed writes do not count as stored
+        self.writer.close()
+        for failure in self.writer.failures:
+            results["successful_figures"] -= 1
+            results["total_images"] -= failure["doc"]["totalImages"]
+            for img_type, count in failure["doc"]["coverage"].items():
+                if img_type in results["coverage"]:
+                    results["coverage"][img_type] -= count
         
         return results
     
@@ -366,11 +424,17 @@ def main():
     parser.add_argument("--mongo-uri", required=True, help="MongoDB connection string")
     parser.add_argument("--output-dir", default="images", help="Output directory for images")
     parser.add_argument("--test", action="store_true", help="Test with first 5 figures only")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Figures per MongoDB bulk write (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--images-per-type", type=int, default=1,
+                        help="Validated images that satisfy each figure/type (default: 1)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip figure/type searches recorded in <output-dir>/retrieval_progress.jsonl")
     
     args = parser.parse_args()
     
     # Initialize retriever
-    retriever = ImageRetriever(args.mongo_uri, args.output_dir)
+    retriever = ImageRetriever(args.mongo_uri, args.output_dir, args.batch_size, args.images_per_type)
     
     if args.test:
         print("🧪 TEST MODE: Processing first 5 figures only")
@@ -395,9 +459,13 @@ def main():
                     break
             if count >= 5:
                 break
+        retriever.writer.close()
     else:
-        # Process all figures
-        results = retriever.process_all_figures()
+        # Process all figures, journaling each completed figure/type
+        with CheckpointJournal(str(Path(args.output_dir) / "retrieval_progress.jsonl"), resume=args.resume) as journal:
+            if args.resume:
+                print(f"♻️ Resuming: {len(journal)} figure/type searches already done")
+            results = retriever.process_all_figures(journal)
         retriever.generate_report(results)
 
 if __name__ == "__main__":
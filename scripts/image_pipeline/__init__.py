@@ -0,0 +1,6 @@
+"""
+Shared building blocks for the Orb Game image retrieval scripts
+
+The phase scripts in scripts/ are run directly (python3 scripts/<name>.py),
+which puts scripts/ on sys.path, so they can `from image_pipeline import ...`.
+"""
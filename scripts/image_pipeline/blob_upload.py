@@ -0,0 +1,332 @@
+"""
+Concurrent Azure Blob Storage upload stage
+
+Uploads run on a bounded thread pool instead of one blob at a time, so
+publishing the image set is limited by bandwidth rather than per-blob round
+trips. Blobs above `max_single_put_size` are split into `max_block_size`
+blocks, and up to `max_concurrency` blocks of one blob are sent in parallel.
+Aggregate counts, bytes and MB/s are kept across all workers.
+
+With a `BlobIndex` (one `list_blobs(include=["metadata"])` call per run),
+blobs whose stored SHA-256 metadata or Content-MD5 matches the local bytes
+are skipped, so re-publishing an unchanged image set only costs the listing
+plus local hashing.
+
+`ServerCopier` publishes by asking the storage service to copy straight
+from the source URL (`start_copy_from_url`), so the bytes never pass
+through this machine; one background thread polls every pending copy.
+
+`create_blob_service` accepts a connection string, which also covers the
+Azurite emulator ("UseDevelopmentStorage=true").
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DEFAULT_UPLOAD_WORKERS = 8
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_SINGLE_PUT_SIZE = 8 * 1024 * 1024
+
+AZURITE_CONNECTION_STRING = "UseDevelopmentStorage=true"
+
+# Blob metadata keys: hex SHA-256 of uploaded bytes, source of server-side copies
+HASH_METADATA_KEY = "sha256"
+SOURCE_METADATA_KEY = "sourceurl"
+
+UPLOADED = "uploaded"
+UNCHANGED = "unchanged"
+COPIED = "copied"
+
+DEFAULT_COPY_POLL_INTERVAL = 1.0
+DEFAULT_COPY_TIMEOUT = 120.0
+
+
+class CopyFailed(Exception):
+    """A server-side copy ended in failed/aborted state or timed out"""
+
+
+def create_blob_service(connection_string=None, account_url=None, credential=None,
+                        max_block_size=DEFAULT_MAX_BLOCK_SIZE, max_single_put_size=DEFAULT_MAX_SINGLE_PUT_SIZE):
+    """BlobServiceClient from a connection string, or an account URL plus credential"""
+    from azure.storage.blob import BlobServiceClient
+
+    options = {"max_block_size": max_block_size, "max_single_put_size": max_single_put_size}
+    if connection_string:
+        return BlobServiceClient.from_connection_string(connection_string, **options)
+    return BlobServiceClient(account_url=account_url, credential=credential, **options)
+
+
+def ensure_container(container_client):
+    """Create the container if it does not exist (e.g. a fresh Azurite instance)"""
+    from azure.core.exceptions import ResourceExistsError
+
+    try:
+        container_client.create_container()
+        return True
+    except ResourceExistsError:
+        return False
+
+
+class BlobIndex:
+    """
+    In-memory snapshot of a container's blobs (name -> content hashes),
+    taken with a single listing call.
+    """
+
+    def __init__(self, container_client, prefix=None):
+        self.blobs = {}
+        self.lock = threading.Lock()
+        for blob in container_client.list_blobs(name_starts_with=prefix, include=["metadata", "copy"]):
+            content_md5 = blob.content_settings.content_md5 if blob.content_settings else None
+            self.blobs[blob.name] = {
+                "sha256": (blob.metadata or {}).get(HASH_METADATA_KEY),
+                "md5": bytes(content_md5).hex() if content_md5 else None,
+                "size": blob.size,
+                "source": (blob.metadata or {}).get(SOURCE_METADATA_KEY),
+                "copy_status": blob.copy.status if blob.copy else None,
+            }
+
+    def __len__(self):
+        return len(self.blobs)
+
+    def unchanged(self, blob_name, sha256_hex, md5_hex, size):
+        """True if the stored blob already holds these bytes"""
+        entry = self.blobs.get(blob_name)
+        if not entry or entry["size"] != size:
+            return False
+        if entry["sha256"]:
+            return entry["sha256"] == sha256_hex
+        return entry["md5"] == md5_hex
+
+    def copied_from(self, blob_name, source_url):
+        """
+        True if the blob is a completed server-side copy of `source_url`.
+        The source metadata is set when a copy starts, so pending, failed,
+        aborted or interrupted copies are only told apart by copy status.
+        """
+        entry = self.blobs.get(blob_name)
+        return bool(entry) and entry.get("source") == source_url and entry.get("copy_status") == "success"
+
+    def update(self, blob_name, sha256_hex=None, md5_hex=None, size=None, source=None, copy_status=None):
+        with self.lock:
+            self.blobs[blob_name] = {"sha256": sha256_hex, "md5": md5_hex, "size": size, "source": source,
+                                     "copy_status": copy_status}
+
+
+class ServerCopier:
+    """
+    Start server-side copies and resolve their futures from a single poller
+    thread that checks every pending copy each `poll_interval` seconds.
+    """
+
+    def __init__(self, container_client, poll_interval=DEFAULT_COPY_POLL_INTERVAL, timeout=DEFAULT_COPY_TIMEOUT):
+        self.container_client = container_client
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.pending = {}  # blob name -> (blob client, future, started, source url)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self._poll, name="blob-copy-poller", daemon=True)
+        self.thread.start()
+
+    def copy(self, blob_name, source_url, metadata=None):
+        """
+        Start copying `source_url` into `blob_name`; the future resolves to the
+        blob client. A copy of the same source already pending for the name
+        shares its future; a different source for a pending name is rejected.
+        """
+        future = Future()
+        blob_client = self.container_client.get_blob_client(blob_name)
+        with self.lock:
+            if blob_name in self.pending:
+                _, pending_future, _, pending_source = self.pending[blob_name]
+                if pending_source == source_url:
+                    return pending_future
+                future.set_exception(CopyFailed(f"copy from {pending_source} already pending for {blob_name}"))
+                return future
+            # Reserve the name before starting so a concurrent copy cannot race it
+            self.pending[blob_name] = (blob_client, future, time.time(), source_url)
+        try:
+            copy = blob_client.start_copy_from_url(
+                source_url, metadata=dict(metadata or {}, **{SOURCE_METADATA_KEY: source_url}))
+        except Exception as e:
+            self._resolve(blob_name, future, exception=e)
+            return future
+        if copy.get("copy_status") == "success":
+            self._resolve(blob_name, future, result=blob_client)
+        else:
+            self.wakeup.set()
+        return future
+
+    def _resolve(self, blob_name, future, result=None, exception=None):
+        with self.lock:
+            self.pending.pop(blob_name, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def _poll(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            with self.lock:
+                pending = list(self.pending.items())
+            for blob_name, (blob_client, future, started, _) in pending:
+                try:
+                    copy = blob_client.get_blob_properties().copy
+                    if copy.status == "success":
+                        self._resolve(blob_name, future, result=blob_client)
+                    elif copy.status in ("failed", "aborted"):
+                        self._resolve(blob_name, future, exception=CopyFailed(f"{copy.status}: {copy.status_description}"))
+                    elif time.time() - started > self.timeout:
+                        blob_client.abort_copy(copy.id)
+                        self._resolve(blob_name, future, exception=CopyFailed(f"timed out after {self.timeout:.0f}s"))
+                except Exception as e:
+                    self._resolve(blob_name, future, exception=e)
+
+
+class BlobUploader:
+    """
+    Bounded worker pool for download-and-upload jobs. Jobs are submitted with
+    `submit()` and call `upload()` from their worker thread; results come back
+    through the returned futures, so callers keep their own result order.
+    """
+
+    def __init__(self, container_client, workers=DEFAULT_UPLOAD_WORKERS,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, limiter=None, index=None):
+        self.container_client = container_client
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter
+        self.index = index
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="blob-upload")
+        self.lock = threading.Lock()
+        self.stats = {"uploaded": 0, "unchanged": 0, "copied": 0, "failed": 0, "bytes": 0, "skipped_bytes": 0}
+        self.start_time = None
+        self.end_time = None
+        self.copier = None
+
+    def submit(self, func, *args, **kwargs):
+        with self.lock:
+            if self.start_time is None:
+                self.start_time = time.time()
+        return self.executor.submit(func, *args, **kwargs)
+
+    def exists(self, blob_name):
+        if self.index is not None:
+            return blob_name in self.index.blobs
+        return self.container_client.get_blob_client(blob_name).exists()
+
+    def existing_name(self, blob_name, legacy_names=()):
+        """
+        Name to publish under: `blob_name`, unless only a legacy name for the
+        same image is stored, in which case that blob is kept (and updated
+        in place) so URLs already saved elsewhere stay valid
+        """
+        legacy_names = [name for name in legacy_names if name != blob_name]
+        try:
+            if not legacy_names or self.exists(blob_name):
+                return blob_name
+            for name in legacy_names:
+                if self.exists(name):
+                    return name
+        except Exception:
+            pass  # Existence checks are best effort; publish under the new name
+        return blob_name
+
+    def upload(self, blob_name, data, content_type=None, metadata=None, overwrite=True):
+        """
+        Upload `data` to `blob_name` unless the index shows identical bytes
+        are already stored. Returns (blob_client, UPLOADED or UNCHANGED);
+        raises on failure.
+        """
+        from azure.storage.blob import ContentSettings
+
+        blob_client = self.container_client.get_blob_client(blob_name)
+        sha256_hex = hashlib.sha256(data).hexdigest()
+        md5 = hashlib.md5(data).digest()
+        if self.index is not None and self.index.unchanged(blob_name, sha256_hex, md5.hex(), len(data)):
+            self._record(unchanged=1, skipped_bytes=len(data))
+            return blob_client, UNCHANGED
+
+        if self.limiter:
+            self.limiter.acquire(blob_client.url)
+        try:
+            blob_client.upload_blob(
+                data,
+                overwrite=overwrite,
+                # Content-MD5 is only computed by the service for single-shot
+                # uploads; set it explicitly so block uploads carry it too
+                content_settings=ContentSettings(content_type=content_type, content_md5=bytearray(md5)),
+                metadata=dict(metadata or {}, **{HASH_METADATA_KEY: sha256_hex}),
+                max_concurrency=self.max_concurrency,
+            )
+        except Exception:
+            self._record(failed=1)
+            raise
+        if self.index is not None:
+            self.index.update(blob_name, sha256_hex, md5.hex(), len(data))
+        self._record(uploaded=1, nbytes=len(data))
+        return blob_client, UPLOADED
+
+    def copy_from_url(self, blob_name, source_url):
+        """
+        Publish `source_url` with a server-side copy, waiting for it to
+        complete. Returns (blob_client, COPIED or UNCHANGED); raises on
+        failure so the caller can fall back to a client-side transfer.
+        """
+        if self.index is not None and self.index.copied_from(blob_name, source_url):
+            self._record(unchanged=1)
+            return self.container_client.get_blob_client(blob_name), UNCHANGED
+
+        with self.lock:
+            if self.copier is None:
+                self.copier = ServerCopier(self.container_client)
+        if self.limiter:
+            self.limiter.acquire(self.container_client.url)
+        # The poller aborts copies after `timeout`; never wait much longer than that
+        blob_client = self.copier.copy(blob_name, source_url).result(
+            timeout=self.copier.timeout + self.copier.poll_interval)
+        if self.index is not None:
+            self.index.update(blob_name, source=source_url, copy_status="success")
+        self._record(copied=1)
+        return blob_client, COPIED
+
+    def _record(self, uploaded=0, unchanged=0, copied=0, failed=0, nbytes=0, skipped_bytes=0):
+        with self.lock:
+            self.stats["uploaded"] += uploaded
+            self.stats["unchanged"] += unchanged
+            self.stats["copied"] += copied
+            self.stats["failed"] += failed
+            self.stats["bytes"] += nbytes
+            self.stats["skipped_bytes"] += skipped_bytes
+            self.end_time = time.time()
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return max((self.end_time or time.time()) - self.start_time, 1e-6)
+
+    def throughput(self):
+        """Aggregate upload throughput in MB/s across all workers"""
+        elapsed = self.elapsed()
+        return self.stats["bytes"] / elapsed / (1024 * 1024) if elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.stats['uploaded']} uploaded, {self.stats['copied']} copied server-side, "
+                f"{self.stats['unchanged']} unchanged, {self.stats['failed']} failed, "
+                f"{self.stats['bytes'] / (1024 * 1024):.1f} MB in {self.elapsed():.1f}s "
+                f"({self.throughput():.2f} MB/s)")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
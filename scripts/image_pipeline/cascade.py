@@ -0,0 +1,54 @@
+"""
+Early-exit query cascade
+
+A figure/type slot is filled from an ordered list of query steps (source x
+search term, highest priority first). Steps are lazy: a step's request is
+only issued if the slot still needs results, so once the first `want`
+accepted results are in, every lower-priority query is skipped instead of
+being sent and thrown away.
+"""
+
+from collections import namedtuple
+
+Step = namedtuple("Step", ["group", "label", "fetch"])
+CascadeResult = namedtuple("CascadeResult", ["results", "issued", "skipped", "errors"])
+
+
+def run_cascade(steps, want=1, accept=None, one_hit_per_group=False):
+    """
+    Issue steps in order until `want` results have been accepted.
+
+    `fetch()` returns a list of candidates; `accept(candidate)` returns the
+    processed result or None to reject it (e.g. download + validation).
+    With `one_hit_per_group`, a group (usually a source) stops after its
+    first step that produced results. Returns a CascadeResult whose
+    `results` are (step, result) pairs.
+    """
+    results = []
+    issued = 0
+    skipped = 0
+    errors = []
+    satisfied_groups = set()
+
+    for step in steps:
+        if len(results) >= want or (one_hit_per_group and step.group in satisfied_groups):
+            skipped += 1
+            continue
+
+        issued += 1
+        try:
+            candidates = step.fetch() or []
+        except Exception as e:
+            errors.append((step, e))
+            continue
+
+        for candidate in candidates:
+            result = accept(candidate) if accept else candidate
+            if result is None:
+                continue
+            results.append((step, result))
+            satisfied_groups.add(step.group)
+            if len(results) >= want:
+                break
+
+    return CascadeResult(results, issued, skipped, errors)
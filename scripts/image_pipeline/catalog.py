@@ -0,0 +1,104 @@
+"""
+Historical figure catalog over OrbGameInfluentialPeopleSeeds
+
+The seeds file (`{category: {epoch: [{"name", "context"}]}}`) is parsed once
+per process and cached against its modification time, so every lookup after
+the first is a dict access instead of a re-read and linear scan. Figures are
+indexed by normalized name, category, epoch and (name, category, epoch);
+`resolve` maps file stems and other spellings back to figures.
+"""
+
+import json
+import os
+import threading
+
+from .names import NameResolver, name_key
+
+DEFAULT_SEEDS_PATH = "OrbGameInfluentialPeopleSeeds"
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """Lookup key for a figure name (accent-, case- and punctuation-insensitive)"""
+    return name_key(name)
+
+
+class FigureCatalog:
+    def __init__(self, data, path=DEFAULT_SEEDS_PATH):
+        self.path = path
+        self.figures = []
+        self.by_name = {}
+        self.by_category = {}
+        self.by_epoch = {}
+        self.by_key = {}
+
+        for category, epochs in data.items():
+            for epoch, people in epochs.items():
+                for person in people:
+                    figure = {
+                        "name": person["name"],
+                        "figureName": person["name"],
+                        "category": category,
+                        "epoch": epoch,
+                        "context": person.get("context", ""),
+                    }
+                    key = normalize_name(person["name"])
+                    self.figures.append(figure)
+                    self.by_name.setdefault(key, []).append(figure)
+                    self.by_category.setdefault(category, []).append(figure)
+                    self.by_epoch.setdefault(epoch, []).append(figure)
+                    self.by_key[(key, category, epoch)] = figure
+
+        self.resolver = NameResolver([figure["name"] for figure in self.figures], self.figures)
+
+    def __len__(self):
+        return len(self.figures)
+
+    def __iter__(self):
+        return iter(self.figures)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self.by_name
+
+    def find(self, name, category=None, epoch=None):
+        """The figure called `name` (optionally in a given category/epoch), or None"""
+        key = normalize_name(name)
+        if category is not None and epoch is not None:
+            return self.by_key.get((key, category, epoch))
+        for figure in self.by_name.get(key, []):
+            if category in (None, figure["category"]) and epoch in (None, figure["epoch"]):
+                return figure
+        return None
+
+    def resolve(self, text):
+        """The figure a file stem, blob name or misspelling refers to, or None"""
+        return self.resolver.resolve(text)
+
+    def category_and_epoch(self, name, default=(None, None)):
+        figure = self.find(name) or self.resolve(name)
+        return (figure["category"], figure["epoch"]) if figure else default
+
+    def names(self):
+        """Set of normalized names, for O(1) membership tests"""
+        return set(self.by_name)
+
+    def figure_list(self):
+        """Copies of every figure in file order, safe for callers to modify"""
+        return [dict(figure) for figure in self.figures]
+
+
+def load_catalog(path=DEFAULT_SEEDS_PATH):
+    """Return the catalog for `path`, re-reading the file only if it changed"""
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cache_key = os.path.abspath(path)
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = FigureCatalog(json.load(f), path)
+        _cache[cache_key] = (signature, catalog)
+        return catalog
@@ -0,0 +1,79 @@
+"""
+Crash-safe checkpoint journal for long acquisition runs
+
+Each completed unit of work (a figure, or a figure/image-type pair) is
+appended to a JSONL journal as `{"key": [...], "data": ..., "completedAt": ...}`
+and fsynced before the run moves on. With `resume=True` the journal is
+replayed so finished keys can be skipped and their results reused; a torn
+last line from a crash mid-write is dropped, and unreadable lines elsewhere
+are skipped (and kept) so the records after them survive. Without `resume` the journal is
+started afresh.
+"""
+
+import json
+import os
+from datetime import datetime
+
+
+class CheckpointJournal:
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.completed = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume:
+            self._load()
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            lines = f.readlines()
+        valid_bytes = 0
+        for number, line in enumerate(lines, 1):
+            last = number == len(lines)
+            try:
+                entry = json.loads(line) if line.endswith(b"\n") or not last else None
+                key = tuple(entry["key"]) if entry is not None else None
+            except (ValueError, TypeError, KeyError):
+                entry = key = None
+            if key is None:
+                if last:
+                    # Torn write from a crash: cut it off so new appends start on a clean line
+                    break
+                print(f"⚠️ Skipping unreadable checkpoint line {number} in {self.path}")
+            else:
+                self.completed[key] = entry.get("data")
+            valid_bytes += len(line)
+        if valid_bytes < sum(len(line) for line in lines):
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+    def done(self, *key):
+        return tuple(key) in self.completed
+
+    def get(self, *key, default=None):
+        return self.completed.get(tuple(key), default)
+
+    def record(self, *key, data=None):
+        """Durably mark `key` as completed with its result"""
+        entry = {"key": list(key), "data": data, "completedAt": datetime.now().isoformat()}
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.completed[tuple(key)] = data
+
+    def __len__(self):
+        return len(self.completed)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
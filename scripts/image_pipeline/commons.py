@@ -0,0 +1,108 @@
+"""
+Bulk Wikimedia Commons imageinfo resolution
+
+Searches only need to produce `File:` titles; URLs, sizes, MIME types,
+licenses and thumbnails are then resolved for many titles at once, 50 per
+API request (the MediaWiki multi-title limit), following `continue` tokens.
+"""
+
+COMMONS_API = "https://commons.wikimedia.org/w/api.php"
+TITLES_PER_REQUEST = 50
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".tif", ".tiff", ".svg")
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def is_image_title(title):
+    """Cheap pre-filter for search hits before imageinfo confirms the MIME type"""
+    return title.startswith("File:") and title.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def metadata_value(extmetadata, field):
+    return extmetadata.get(field, {}).get("value")
+
+
+def imageinfo_record(page):
+    """Flatten an API page with imageinfo into the fields the scripts use"""
+    info = page["imageinfo"][0]
+    extmetadata = info.get("extmetadata", {})
+    record = {
+        "title": page["title"],
+        "url": info.get("url"),
+        "description_url": info.get("descriptionurl"),
+        "width": info.get("width", 0),
+        "height": info.get("height", 0),
+        "size": info.get("size", 0),
+        "mime": info.get("mime", ""),
+        "license": metadata_value(extmetadata, "LicenseShortName") or "Unknown",
+        "artist": metadata_value(extmetadata, "Artist"),
+    }
+    if "thumburl" in info:
+        record.update({
+            "thumb_url": info["thumburl"],
+            "thumb_width": info.get("thumbwidth"),
+            "thumb_height": info.get("thumbheight"),
+        })
+    return record
+
+
+def resolve_imageinfo(session, titles, thumb_width=None, api_url=COMMONS_API):
+    """
+    Resolve `File:` titles to imageinfo records in 50-title batches.
+
+    Returns {requested title: record or None}. Titles the API normalises or
+    redirects are mapped back to the title the caller asked for; missing files
+    map to None.
+    """
+    unique_titles = list(dict.fromkeys(titles))
+    resolved = {}
+
+    for batch in chunked(unique_titles, TITLES_PER_REQUEST):
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": 2,
+            "prop": "imageinfo",
+            "iiprop": "url|size|mime|extmetadata",
+            "iiextmetadatafilter": "LicenseShortName|Artist",
+            "titles": "|".join(batch),
+        }
+        if thumb_width:
+            params["iiurlwidth"] = thumb_width
+
+        aliases = {}
+        pages = {}
+        continuation = {}
+        while True:
+            response = session.get(api_url, params={**params, **continuation}, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            query = data.get("query", {})
+
+            for mapping in query.get("normalized", []) + query.get("redirects", []):
+                aliases[mapping["to"]] = aliases.get(mapping["from"], mapping["from"])
+
+            # With continuation a page can come back several times; keep the
+            # copy that carries imageinfo
+            for page in query.get("pages", []):
+                if "imageinfo" in page or page["title"] not in pages:
+                    pages[page["title"]] = page
+
+            if "continue" not in data:
+                break
+            continuation = data["continue"]
+
+        for title, page in pages.items():
+            requested = aliases.get(title, title)
+            if page.get("missing") or page.get("invalid") or not page.get("imageinfo"):
+                resolved[requested] = None
+            else:
+                resolved[requested] = imageinfo_record(page)
+
+        for title in batch:
+            resolved.setdefault(title, None)
+
+    return resolved
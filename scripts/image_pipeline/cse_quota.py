@@ -0,0 +1,199 @@
+"""
+Google Custom Search quota ledger and query scheduler
+
+`DailyQuotaLedger` persists queries spent per UTC day (the CSE quota resets
+at midnight Pacific, but a UTC day boundary is close enough for budgeting
+and identical on every machine), so the daily cap holds across restarts.
+Each update re-reads the ledger under an exclusive lock on a sidecar
+`.lock` file (fcntl.flock), so concurrent runs on one machine share the
+budget; where fcntl is unavailable only threads of one process are
+serialised.
+
+`QueryScheduler` orders (figure, image type) searches by expected payoff:
+missing portraits first, then missing types for the figures with the
+fewest images. Follow-up queries for a pair are only issued if the earlier
+ones found nothing, and identical query strings are only paid for once.
+Whatever the budget cannot cover stays pending for the next day's run.
+
+`error_reasons` reads the reasons of a CSE error answer, so a 403 is only
+treated as the day's quota running out when the API says so
+(`DAILY_QUOTA_REASONS`).
+"""
+
+import heapq
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_LEDGER_PATH = ".cache/cse_quota.json"
+DEFAULT_DAILY_LIMIT = 9500
+HISTORY_DAYS = 30
+
+# 403 reasons meaning the day's quota is spent, or the per-minute rate was hit
+DAILY_QUOTA_REASONS = {"dailyLimitExceeded", "quotaExceeded"}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def utc_today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def error_reasons(payload):
+    """Reasons listed in a Google API error body ({"error": {"errors": [{"reason": ...}]}})"""
+    error = payload.get("error") if isinstance(payload, dict) else None
+    if not isinstance(error, dict):
+        return set()
+    reasons = {item.get("reason") for item in error.get("errors") or [] if isinstance(item, dict)}
+    for detail in error.get("details") or []:
+        if isinstance(detail, dict) and detail.get("reason"):
+            reasons.add(detail["reason"])
+    reasons.discard(None)
+    return reasons
+
+
+class DailyQuotaLedger:
+    def __init__(self, path=DEFAULT_LEDGER_PATH, limit=DEFAULT_DAILY_LIMIT):
+        self.path = path
+        self.limit = limit
+        self.lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"days": {}}
+
+    def _save(self, data):
+        # Keep a month of history for reporting; write atomically
+        days = data["days"]
+        for day in sorted(days)[:-HISTORY_DAYS]:
+            del days[day]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the ledger across threads and, with fcntl, across processes"""
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _adjust(self, delta=0, exhaust=False):
+        with self._locked():
+            data = self._load()
+            today = utc_today()
+            used = data["days"].get(today, 0)
+            if exhaust:
+                used = max(used, self.limit)
+            elif delta > 0 and used + delta > self.limit:
+                return False
+            else:
+                used = max(0, used + delta)
+            data["days"][today] = used
+            self._save(data)
+            return True
+
+    def used(self):
+        return self._load()["days"].get(utc_today(), 0)
+
+    def remaining(self):
+        return max(0, self.limit - self.used())
+
+    def reserve(self, count=1):
+        """Claim `count` queries from today's budget; False if it would exceed the limit"""
+        return self._adjust(count)
+
+    def refund(self, count=1):
+        """Return queries that were not billed (cache hits, failed requests)"""
+        self._adjust(-count)
+
+    def exhaust(self):
+        """The API reported the quota as spent: stop for the rest of the day"""
+        self._adjust(exhaust=True)
+
+
+class QueryScheduler:
+    """
+    Priority queue of (figure, image type) searches. Each pair owns an
+    ordered list of queries; only the next query of a pair is queued.
+    """
+
+    PORTRAIT_TIER = 0
+    OTHER_TIER = 1
+
+    def __init__(self):
+        self.heap = []
+        self.sequence = 0
+        self.pairs = {}
+        self.query_results = {}
+
+    def add(self, figure_key, image_type, queries, covered_types=0):
+        """
+        Queue a pair. `covered_types` is how many image types the figure
+        already has images for; emptier figures go first within a tier.
+        """
+        tier = self.PORTRAIT_TIER if image_type == "portraits" else self.OTHER_TIER
+        self.pairs[(figure_key, image_type)] = {"queries": list(queries), "tier": tier, "covered": covered_types}
+        self._push(figure_key, image_type, 0)
+
+    def _push(self, figure_key, image_type, rank):
+        pair = self.pairs[(figure_key, image_type)]
+        if rank >= len(pair["queries"]):
+            return False
+        # First queries of every pair before any follow-up query
+        priority = (pair["tier"], rank, pair["covered"], self.sequence)
+        heapq.heappush(self.heap, (priority, figure_key, image_type, rank))
+        self.sequence += 1
+        return True
+
+    def __len__(self):
+        return len(self.heap)
+
+    def pop(self):
+        """Return (figure_key, image_type, rank, query) for the highest-payoff query"""
+        _, figure_key, image_type, rank = heapq.heappop(self.heap)
+        return figure_key, image_type, rank, self.pairs[(figure_key, image_type)]["queries"][rank]
+
+    def requeue(self, figure_key, image_type, rank):
+        """Put a query back (e.g. it could not be sent today)"""
+        self._push(figure_key, image_type, rank)
+
+    def known_result(self, query):
+        """URLs for a query already answered in this run, or None"""
+        return self.query_results.get(query)
+
+    def complete(self, figure_key, image_type, rank, query, urls):
+        """
+        Record a query's answer. Returns True when the pair is finished (it
+        found images or ran out of queries), False if a follow-up was queued.
+        """
+        self.query_results[query] = urls
+        if urls:
+            return True
+        return not self._push(figure_key, image_type, rank + 1)
+
+    def pending_pairs(self):
+        return len({(figure_key, image_type) for _, figure_key, image_type, _ in self.heap})
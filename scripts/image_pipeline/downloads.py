@@ -0,0 +1,65 @@
+"""
+Streaming, resumable file downloads
+
+Bodies are streamed straight to `<file>.part`, fsynced and atomically renamed
+into place, so a crash never leaves a truncated image under the final name.
+An existing `.part` file is resumed with an HTTP Range request when the server
+supports it.
+"""
+
+import os
+
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = ".part"
+
+
+class EmptyDownloadError(Exception):
+    """The server answered successfully but sent no bytes"""
+
+
+def download_to_file(session, url, path, timeout=30, chunk_size=CHUNK_SIZE):
+    """
+    Download `url` to `path` via `path.part`. Returns the number of bytes
+    transferred by this call (less than the file size when resuming).
+    `session` must be a requests-style session supporting stream=True.
+    """
+    path = str(path)
+    part_path = path + PART_SUFFIX
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+    # identity encoding keeps Range offsets aligned with the bytes on disk
+    headers = {"Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+
+    response = session.get(url, headers=headers, stream=True, timeout=timeout)
+    try:
+        if offset and response.status_code == 416:
+            # The partial file is stale or already complete; start over next time
+            os.remove(part_path)
+        response.raise_for_status()
+
+        if offset and response.status_code == 206:
+            mode = "ab"
+        else:
+            # Server ignored the Range header: rewrite from the beginning
+            mode = "wb"
+            offset = 0
+
+        transferred = 0
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    transferred += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        response.close()
+
+    if offset + transferred == 0:
+        os.remove(part_path)
+        raise EmptyDownloadError(f"Empty response body from {url}")
+
+    os.replace(part_path, path)
+    return transferred
@@ -0,0 +1,265 @@
+"""
+Download-once store for fetched image bytes
+
+Validation, downloading, hashing and uploading used to fetch the same image
+URL separately. `FetchedBytes.fetch()` transfers a URL once and keeps the
+body (and its Content-Type) in a byte-bounded in-memory LRU; every body is
+also written to a local spill directory, so entries evicted from memory, and
+later stages running as separate scripts, are served from disk instead of
+the network. Concurrent fetches of one URL wait for a single transfer.
+
+Files that are already on disk (streamed downloads) are recorded with
+`put_file()` as a reference to their path instead of a second copy.
+
+Spilled entries expire after `ttl` seconds (a day by default, ORB_FETCH_TTL
+to change it), so images that change upstream are fetched again. The spill
+directory is pruned to `disk_limit` bytes, oldest first, when a store is
+opened and again whenever a spill takes it over the limit. Validation
+stages `discard()` the bodies of candidates they reject.
+
+The spill directory defaults to .cache/fetched_images and can be moved with
+ORB_FETCH_STORE.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_STORE_DIR = os.path.join(".cache", "fetched_images")
+STORE_ENV_VAR = "ORB_FETCH_STORE"
+TTL_ENV_VAR = "ORB_FETCH_TTL"
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+DEFAULT_DISK_LIMIT = 2 * 1024 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+# A spill over `disk_limit` prunes down to this fraction of it, so the
+# directory is not walked again on every following spill
+PRUNE_LOW_WATER = 0.9
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class FetchedBytes:
+    def __init__(self, store_dir=None, memory_limit=DEFAULT_MEMORY_LIMIT, disk_limit=DEFAULT_DISK_LIMIT, ttl=None):
+        self.store_dir = store_dir or os.environ.get(STORE_ENV_VAR) or DEFAULT_STORE_DIR
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.ttl = ttl if ttl is not None else float(os.environ.get(TTL_ENV_VAR) or DEFAULT_TTL)
+        self.memory = OrderedDict()  # key -> (data, content_type)
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.url_locks = {}  # url -> [lock, number of fetches using it]
+        self.disk_bytes = 0
+        self.prune_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "fetched": 0, "fetched_bytes": 0, "pruned": 0}
+        self.prune()
+
+    def _paths(self, key):
+        directory = os.path.join(self.store_dir, key[:2])
+        base = os.path.join(directory, key)
+        return base, base + ".type", base + ".ref"
+
+    def _fresh(self, path):
+        try:
+            return time.time() - os.stat(path).st_mtime < self.ttl
+        except FileNotFoundError:
+            return False
+
+    def prune(self, limit=None):
+        """Drop expired spill entries, then the oldest ones until under `limit` (default `disk_limit`)"""
+        limit = self.disk_limit if limit is None else limit
+        entries = {}  # key -> [newest mtime, bytes, paths]
+        if not os.path.isdir(self.store_dir):
+            return 0
+        for directory, _, files in os.walk(self.store_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entry = entries.setdefault(name.split(".", 1)[0], [0.0, 0, []])
+                entry[0] = max(entry[0], stat.st_mtime)
+                entry[1] += stat.st_size
+                entry[2].append(path)
+
+        now = time.time()
+        total = sum(entry[1] for entry in entries.values())
+        removed = 0
+        for mtime, size, paths in sorted(entries.values()):
+            if now - mtime < self.ttl and total <= limit:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        with self.lock:
+            self.disk_bytes = total
+            self.stats["pruned"] += removed
+        return removed
+
+    def _account(self, nbytes):
+        """Count spilled bytes; prune when the spill directory outgrows `disk_limit`"""
+        with self.lock:
+            self.disk_bytes += nbytes
+            over = self.disk_bytes > self.disk_limit
+        # One pruning pass at a time; spills arriving meanwhile are counted by it
+        if over and self.prune_lock.acquire(blocking=False):
+            try:
+                self.prune(int(self.disk_limit * PRUNE_LOW_WATER))
+            finally:
+                self.prune_lock.release()
+
+    def _remember(self, key, data, content_type):
+        with self.lock:
+            if key in self.memory:
+                self.memory_bytes -= len(self.memory.pop(key)[0])
+            if len(data) > self.memory_limit:
+                return
+            self.memory[key] = (data, content_type)
+            self.memory_bytes += len(data)
+            # Evicted entries remain available from the spill directory
+            while self.memory_bytes > self.memory_limit:
+                _, (evicted, _) = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def _write(self, path, payload):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def _spill(self, key, data, content_type):
+        if len(data) > self.disk_limit:
+            return
+        data_path, type_path, ref_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        self._write(type_path, (content_type or "").encode("utf-8"))
+        self._write(data_path, data)
+        if os.path.exists(ref_path):
+            os.remove(ref_path)
+        self._account(len(data))
+
+    def _read_spilled(self, key):
+        """(data, content_type) from the spill directory, or None if missing or expired"""
+        data_path, type_path, ref_path = self._paths(key)
+        try:
+            if self._fresh(data_path):
+                with open(data_path, "rb") as f:
+                    data = f.read()
+            elif self._fresh(ref_path):
+                with open(ref_path, "r", encoding="utf-8") as f:
+                    target = f.read()
+                with open(target, "rb") as f:
+                    data = f.read()
+            else:
+                return None
+            with open(type_path, "r", encoding="utf-8") as f:
+                content_type = f.read()
+        except FileNotFoundError:
+            return None
+        return data, content_type
+
+    def lookup(self, url):
+        """(data, content_type) for an already fetched URL, or None"""
+        key = url_key(url)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry
+        entry = self._read_spilled(key)
+        if entry is None:
+            return None
+        with self.lock:
+            self.stats["disk_hits"] += 1
+        self._remember(key, *entry)
+        return entry
+
+    def get(self, url):
+        entry = self.lookup(url)
+        return entry[0] if entry else None
+
+    def put(self, url, data, content_type=None):
+        key = url_key(url)
+        self._spill(key, data, content_type)
+        self._remember(key, data, content_type)
+
+    def put_file(self, url, path, content_type=None):
+        """Record a file already on disk for `url` by reference, without copying it"""
+        key = url_key(url)
+        data_path, type_path, ref_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        self._write(type_path, (content_type or "").encode("utf-8"))
+        self._write(ref_path, os.path.abspath(path).encode("utf-8"))
+        if os.path.exists(data_path):
+            os.remove(data_path)
+        self._account(len(os.path.abspath(path)))
+
+    def discard(self, url):
+        """Forget a URL's body (e.g. a rejected candidate) in memory and on disk"""
+        key = url_key(url)
+        with self.lock:
+            if key in self.memory:
+                self.memory_bytes -= len(self.memory.pop(key)[0])
+        freed = 0
+        for path in self._paths(key):
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.disk_bytes = max(0, self.disk_bytes - freed)
+
+    def fetch(self, session, url, timeout=30):
+        """
+        Return (data, content_type) for `url`, transferring it only if no
+        earlier stage has. HTTP errors propagate as from session.get().
+        """
+        entry = self.lookup(url)
+        if entry:
+            return entry
+        # The lock stays registered while any fetch of this URL holds or
+        # waits for it, so a later caller cannot start a second transfer
+        with self.lock:
+            waiters = self.url_locks.setdefault(url, [threading.Lock(), 0])
+            waiters[1] += 1
+        try:
+            with waiters[0]:
+                entry = self.lookup(url)
+                if entry:
+                    return entry
+                response = session.get(url, timeout=timeout)
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "")
+                self.put(url, response.content, content_type)
+                with self.lock:
+                    self.stats["fetched"] += 1
+                    self.stats["fetched_bytes"] += len(response.content)
+                return response.content, content_type
+        finally:
+            with self.lock:
+                waiters[1] -= 1
+                if not waiters[1]:
+                    del self.url_locks[url]
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_store():
+    """Process-wide store so every stage in a run shares one cache"""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = FetchedBytes()
+        return _shared_store
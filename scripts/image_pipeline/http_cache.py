@@ -0,0 +1,241 @@
+"""
+Persistent on-disk cache for search API responses
+
+Responses are stored in SQLite, keyed on a SHA-256 of method + URL + sorted
+query parameters (API keys excluded). Fresh entries are served without touching
+the network; stale entries are revalidated with If-None-Match /
+If-Modified-Since so an unchanged result costs a 304 instead of a full
+response (a revalidation is still a network request, and a billed CSE query).
+
+Scripts opt in by wrapping their session:
+
+    session = with_response_cache(RateLimitedSession(requests.Session()))
+
+which is a no-op unless ORB_HTTP_CACHE is set (to a path, or "1" for the
+default location) or a path is passed explicitly.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "http_responses.sqlite")
+CACHE_ENV_VAR = "ORB_HTTP_CACHE"
+
+DAY = 24 * 3600
+
+# Only these API hosts are cached; image downloads always go to the network
+HOST_TTLS = {
+    "www.googleapis.com": 30 * DAY,
+    "query.wikidata.org": 7 * DAY,
+    "commons.wikimedia.org": 7 * DAY,
+    "en.wikipedia.org": 7 * DAY,
+    "api.si.edu": 7 * DAY,
+}
+
+# Credentials are never part of the key and never stored
+IGNORED_PARAMS = {"key", "api_key"}
+# Stripped from stored URLs as well (the CSE engine id still keys the entry)
+REDACTED_PARAMS = IGNORED_PARAMS | {"cx"}
+
+
+def cache_key(method, url, params=None):
+    """Content address for a request"""
+    items = sorted(
+        (str(k), str(v)) for k, v in (params or {}).items()
+        if k not in IGNORED_PARAMS and v is not None
+    )
+    raw = f"{method.upper()} {url}?{urlencode(items)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def redact_url(url):
+    """`url` without credential query parameters, for storage and logs"""
+    parts = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in REDACTED_PARAMS]
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+class ResponseCache:
+    """SQLite-backed store of response bodies and validators"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._redact_stored_urls()
+        self.conn.commit()
+
+    def _redact_stored_urls(self):
+        """Scrub credentials from URLs written by earlier versions of this cache"""
+        rows = self.conn.execute("SELECT key, url FROM responses WHERE url LIKE '%?%'").fetchall()
+        for key, url in rows:
+            redacted = redact_url(url)
+            if redacted != url:
+                self.conn.execute("UPDATE responses SET url = ? WHERE key = ?", (redacted, key))
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, status, headers, body, etag, last_modified, expires_at "
+                "FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        url, status, headers, body, etag, last_modified, expires_at = row
+        return {
+            "url": url,
+            "status": status,
+            "headers": json.loads(headers),
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires_at": expires_at,
+        }
+
+    def put(self, key, response, ttl):
+        now = time.time()
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "set-cookie"}
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, redact_url(response.url), response.status_code, json.dumps(headers), response.content,
+                 response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now + ttl)
+            )
+            self.conn.commit()
+
+    def touch(self, key, ttl):
+        """Extend the lifetime of an entry after a 304 revalidation"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE responses SET expires_at = ? WHERE key = ?", (time.time() + ttl, key)
+            )
+            self.conn.commit()
+
+    def purge_expired(self, older_than=0):
+        """Delete entries that expired more than `older_than` seconds ago"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM responses WHERE expires_at < ?", (time.time() - older_than,)
+            )
+            self.conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CachedResponse:
+    """
+    Minimal requests.Response stand-in for a cached entry. `from_cache` is
+    False when the entry was revalidated with a 304, since that request
+    still went over the network (and counts against API quotas).
+    """
+
+    def __init__(self, entry, from_cache=True):
+        self.from_cache = from_cache
+        self.url = entry["url"]
+        self.status_code = entry["status"]
+        self.headers = CaseInsensitiveDict(entry["headers"])
+        self.content = entry["body"]
+        self.encoding = requests.utils.get_encoding_from_headers(self.headers) or "utf-8"
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def close(self):
+        pass
+
+
+class CachingSession:
+    """
+    Wraps a session (plain or RateLimitedSession) and answers GET requests to
+    cacheable API hosts from the ResponseCache when possible.
+    """
+
+    def __init__(self, session, cache=None, ttls=None, refresh=False):
+        self.session = session
+        self.cache = cache or ResponseCache()
+        self.ttls = dict(HOST_TTLS if ttls is None else ttls)
+        self.refresh = refresh
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    def get(self, url, params=None, **kwargs):
+        ttl = self.ttls.get(urlparse(url).netloc)
+        if ttl is None or kwargs.get("stream"):
+            return self.session.get(url, params=params, **kwargs)
+
+        key = cache_key("GET", url, params)
+        entry = self.cache.get(key)
+        if entry and not self.refresh and entry["expires_at"] > time.time():
+            self.stats["hits"] += 1
+            return CachedResponse(entry)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(url, params=params, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry:
+            self.cache.touch(key, ttl)
+            self.stats["revalidated"] += 1
+            return CachedResponse(entry, from_cache=False)
+
+        self.stats["misses"] += 1
+        if response.status_code == 200:
+            self.cache.put(key, response, ttl)
+        return response
+
+    def __getattr__(self, name):
+        # post, head, headers, mount, ... go straight to the wrapped session
+        return getattr(self.session, name)
+
+
+def with_response_cache(session, path=None):
+    """Wrap `session` in a CachingSession if a cache path is given or ORB_HTTP_CACHE is set"""
+    path = path or os.getenv(CACHE_ENV_VAR)
+    if not path:
+        return session
+    if path == "1":
+        path = DEFAULT_CACHE_PATH
+    return CachingSession(session, ResponseCache(path))
@@ -0,0 +1,240 @@
+"""
+Shared HTTP session factory for the image scripts
+
+Every script gets the same User-Agent, pooled keep-alive connections sized per
+host, and retry/backoff on transient server errors, instead of opening a new
+TCP+TLS connection for every bare requests.get().
+
+HTTP/2 multiplexing is available through httpx (pip install "httpx[http2]").
+By default (http2=None) every session follows ORB_HTTP2=1; http2=True or
+False overrides it. When httpx is not installed the requests session is
+used. The httpx client is wrapped in `HTTP2Session`, which keeps the
+requests API the scripts are written against: requests-style responses
+(raise_for_status, iter_content, json, ...) and transport errors raised as
+requests.exceptions.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "OrbGame-ImageRetrieval/1.0 (https://orbgame.us; contact@orbgame.us) Python/3.x"
+BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+IMAGE_ACCEPT = "image/webp,image/apng,image/*,*/*;q=0.8"
+API_ACCEPT = "application/json, text/html, */*"
+
+# Keep-alive connections kept open per host
+HOST_POOL_SIZES = {
+    "upload.wikimedia.org": 16,
+    "commons.wikimedia.org": 8,
+    "en.wikipedia.org": 8,
+    "query.wikidata.org": 4,
+    "api.si.edu": 4,
+    "ids.si.edu": 8,
+    "www.googleapis.com": 4,
+}
+DEFAULT_POOL_SIZE = 10
+
+RETRY_STATUS_CODES = (500, 502, 504)  # 429/503 are handled by RateLimitedSession
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+
+def _retry_policy(retries, backoff_factor):
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def http2_enabled(http2=None):
+    """Explicit flag if given, otherwise ORB_HTTP2=1"""
+    if http2 is None:
+        http2 = os.getenv("ORB_HTTP2") == "1"
+    return http2
+
+
+class HTTP2Response:
+    """requests.Response-like view of an httpx.Response"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.reason = response.reason_phrase
+        self.encoding = response.encoding
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        with _translate_errors():
+            return self._response.read()
+
+    @property
+    def text(self):
+        self.content
+        return self._response.text
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            kind = "Client" if self.status_code < 500 else "Server"
+            raise requests.HTTPError(f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}", response=self)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        with _translate_errors():
+            if decode_unicode:
+                yield from self._response.iter_text(chunk_size)
+            else:
+                yield from self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+
+@contextmanager
+def _translate_errors():
+    """Raise httpx transport errors as the requests exceptions callers catch"""
+    import httpx
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except (httpx.RemoteProtocolError, httpx.ReadError) as e:
+        raise requests.exceptions.ChunkedEncodingError(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    except httpx.InvalidURL as e:
+        raise requests.exceptions.InvalidURL(str(e)) from e
+
+
+def _httpx_timeout(timeout):
+    """requests timeout (seconds or a (connect, read) tuple) as an httpx timeout"""
+    import httpx
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class HTTP2Session:
+    """
+    requests.Session-like wrapper around an HTTP/2 httpx.Client, so callers
+    written against requests work unchanged (including stream=True)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.headers = client.headers
+
+    def request(self, method, url, params=None, data=None, headers=None, json=None, timeout=None,
+                stream=False, allow_redirects=True, **kwargs):
+        body = {"content": data} if isinstance(data, (bytes, str)) else {"data": data}
+        request = self.client.build_request(method, url, params=params, headers=headers, json=json,
+                                            timeout=_httpx_timeout(timeout), **body)
+        with _translate_errors():
+            response = self.client.send(request, stream=stream, follow_redirects=allow_redirects)
+        return HTTP2Response(response)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def mount(self, prefix, adapter):
+        """Connection pools are managed by httpx; requests adapters do not apply"""
+
+    def close(self):
+        self.client.close()
+
+
+def create_http2_client(user_agent=USER_AGENT, accept=API_ACCEPT, pool_size=DEFAULT_POOL_SIZE,
+                        retries=DEFAULT_RETRIES):
+    """Return an HTTP2Session over an HTTP/2 httpx.Client, or None if httpx/h2 are unavailable"""
+    try:
+        import httpx
+        import h2  # noqa: F401 - httpx needs it for http2=True
+    except ImportError:
+        return None
+
+    return HTTP2Session(httpx.Client(
+        http2=True,
+        follow_redirects=True,
+        headers={"User-Agent": user_agent, "Accept": accept, "Accept-Language": "en-US,en;q=0.9"},
+        limits=httpx.Limits(max_connections=pool_size * 4, max_keepalive_connections=pool_size),
+        transport=httpx.HTTPTransport(http2=True, retries=retries),
+    ))
+
+
+def create_session(user_agent=USER_AGENT, accept=API_ACCEPT, pool_size=None, pool_sizes=None,
+                   retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF, http2=None):
+    """
+    Create a pooled, retrying session.
+
+    pool_size overrides the default per-host pool size (e.g. to match a
+    worker count); pool_sizes overrides individual hosts. http2=None
+    follows ORB_HTTP2.
+    """
+    if http2_enabled(http2):
+        client = create_http2_client(user_agent, accept, pool_size or DEFAULT_POOL_SIZE, retries)
+        if client is not None:
+            return client
+        print("⚠️ HTTP/2 requested but httpx[http2] is not installed; using HTTP/1.1 keep-alive")
+
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": user_agent,
+        "Accept": accept,
+        "Accept-Language": "en-US,en;q=0.9",
+    })
+
+    default_size = pool_size or DEFAULT_POOL_SIZE
+    retry = _retry_policy(retries, backoff_factor)
+    default_adapter = HTTPAdapter(pool_connections=default_size, pool_maxsize=default_size, max_retries=retry)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+
+    # Longer prefixes win, so each host gets its own pool size
+    sizes = dict(HOST_POOL_SIZES)
+    sizes.update(pool_sizes or {})
+    for host, size in sizes.items():
+        size = max(size, pool_size or 0)
+        session.mount(f"https://{host}/", HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=retry))
+
+    return session
+
+
+_shared_sessions = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_session(accept=IMAGE_ACCEPT, user_agent=USER_AGENT):
+    """Process-wide session for module-level helpers that used bare requests.get"""
+    key = (accept, user_agent)
+    with _shared_lock:
+        if key not in _shared_sessions:
+            _shared_sessions[key] = create_session(user_agent=user_agent, accept=accept)
+        return _shared_sessions[key]
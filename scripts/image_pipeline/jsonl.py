@@ -0,0 +1,99 @@
+"""
+Line-delimited JSON (JSONL) records for the phase hand-off files
+
+Phases write one record per line as soon as it is ready, flushed
+immediately, so memory stays flat and a crash keeps everything written so
+far. Readers stream records one at a time and still accept the legacy
+single-array `.json` files. `export_json` (scripts/export-phase-json.py)
+turns a `.jsonl` file back into the indented JSON array the other tools
+expect.
+"""
+
+import json
+import os
+
+
+def jsonl_path(path):
+    """`name.json` -> `name.jsonl`"""
+    base, _ = os.path.splitext(path)
+    return base + ".jsonl"
+
+
+def find_input(path):
+    """Prefer `<name>.jsonl`, fall back to the legacy `<name>.json`; None if neither exists"""
+    for candidate in (jsonl_path(path), path):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def read_records(path):
+    """Yield records from a `.jsonl` file, or from a legacy JSON array"""
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_number}: {e}") from e
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def count_records(path):
+    """Number of records without parsing them (one pass over the lines)"""
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+    with open(path, "r", encoding="utf-8") as f:
+        return len(json.load(f))
+
+
+class JsonlWriter:
+    """Append records to a `.jsonl` file, one flushed line per record"""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.count = 0
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def export_json(source, destination=None, indent=2):
+    """
+    Stream a `.jsonl` file into a JSON array file, formatted like
+    json.dump(records, f, indent=2). Returns (destination, record count).
+    """
+    if destination is None:
+        destination = os.path.splitext(source)[0] + ".json"
+    tmp_path = destination + ".tmp"
+    pad = " " * indent
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for record in read_records(source):
+            text = json.dumps(record, indent=indent, ensure_ascii=False)
+            out.write(",\n" if count else "\n")
+            out.write("\n".join(pad + line for line in text.splitlines()))
+            count += 1
+        out.write("\n]" if count else "]")
+    os.replace(tmp_path, destination)
+    return destination, count
@@ -0,0 +1,110 @@
+"""
+Batched MongoDB upserts
+
+`BulkReplacer` accumulates `ReplaceOne(..., upsert=True)` operations (and
+`UpdateOne` field updates, via `update`) and flushes them with unordered `bulk_write` every `batch_size` documents, so a
+full load costs one round-trip per batch instead of one per figure. Write
+errors are reported per batch and collected in `failures`; an unordered
+batch still applies every operation that did not fail.
+
+`content_fingerprint` gives documents a stable digest of their content so
+unchanged documents can be skipped instead of rewritten.
+"""
+
+import hashlib
+import json
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+DEFAULT_BATCH_SIZE = 500
+FINGERPRINT_FIELD = "contentFingerprint"
+
+
+def content_fingerprint(value):
+    """SHA-256 of the canonical JSON form of `value` (key order independent)"""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def fetch_fingerprints(collection, key_fields):
+    """Map key tuples to stored fingerprints with a single projection query"""
+    projection = {field: 1 for field in key_fields}
+    projection[FINGERPRINT_FIELD] = 1
+    projection["_id"] = 0
+    return {
+        tuple(doc.get(field) for field in key_fields): doc.get(FINGERPRINT_FIELD)
+        for doc in collection.find({}, projection)
+    }
+
+
+class BulkReplacer:
+    def __init__(self, collection, batch_size=DEFAULT_BATCH_SIZE, verbose=True):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.verbose = verbose
+        self.pending = []
+        self.batches = 0
+        self.stats = {"submitted": 0, "matched": 0, "modified": 0, "upserted": 0, "failed": 0}
+        self.failures = []
+
+    def add(self, filter_query, doc, label=None):
+        """Queue an upsert; flushes automatically when the batch is full"""
+        self.pending.append((label or str(filter_query), doc, ReplaceOne(filter_query, doc, upsert=True)))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def update(self, filter_query, update, label=None, array_filters=None):
+        """Queue an in-place update of an existing document (no upsert)"""
+        operation = UpdateOne(filter_query, update, array_filters=array_filters)
+        self.pending.append((label or str(filter_query), update, operation))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send queued operations; returns the list of failures in this batch"""
+        if not self.pending:
+            return []
+        batch, self.pending = self.pending, []
+        self.batches += 1
+
+        try:
+            result = self.collection.bulk_write([op for _, _, op in batch], ordered=False)
+            details = result.bulk_api_result
+            errors = []
+        except BulkWriteError as e:
+            details = e.details
+            errors = details.get("writeErrors", [])
+        except PyMongoError as e:
+            # Nothing is known to have been applied (network error, auth, ...)
+            details = {}
+            errors = [{"index": i, "errmsg": str(e)} for i in range(len(batch))]
+
+        failures = []
+        for error in errors:
+            label, doc, _ = batch[error["index"]]
+            failures.append({"label": label, "doc": doc, "error": error.get("errmsg", "Unknown error")})
+
+        self.stats["submitted"] += len(batch)
+        self.stats["matched"] += details.get("nMatched", 0)
+        self.stats["modified"] += details.get("nModified", 0)
+        self.stats["upserted"] += details.get("nUpserted", 0)
+        self.stats["failed"] += len(failures)
+        self.failures.extend(failures)
+
+        if self.verbose:
+            print(f"    📦 Batch {self.batches}: {len(batch)} upserts, {details.get('nUpserted', 0)} new, "
+                  f"{details.get('nModified', 0)} updated, {len(failures)} failed")
+            for failure in failures:
+                print(f"      ❌ {failure['label']}: {failure['error']}")
+        return failures
+
+    def close(self):
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
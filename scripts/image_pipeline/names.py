@@ -0,0 +1,102 @@
+"""
+Unicode-normalised figure name matching
+
+Scripts turn figure names into file and blob names in different ways
+("Pelé" → "Pelé" or "Pele"; "W.G. Grace" → "W.G._Grace", "WG_Grace"),
+and the reverse mapping used exact string comparisons, so figures were
+reported missing or dropped into default categories. Every name is reduced
+to a key (NFKD-folded to ASCII, case-folded, punctuation stripped, tokens
+sorted) and looked up in a precomputed index; a difflib fallback, memoised
+per query, catches what is left (typos, dropped tokens).
+"""
+
+import difflib
+import re
+import unicodedata
+
+DEFAULT_CUTOFF = 0.85
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_SAFE_SEPARATORS = re.compile(r"[^0-9A-Za-z]+")
+
+
+def fold(text):
+    """ASCII-fold and case-fold: "Frédéric" -> "frederic" """
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.encode("ascii", "ignore").decode("ascii").casefold()
+
+
+def name_tokens(text):
+    """Words of a name or file stem, ignoring case, accents and punctuation"""
+    return [token for token in _NON_ALNUM.split(fold(text)) if token]
+
+
+def name_key(text):
+    """Order-insensitive lookup key: "Nasir al-Din al-Tusi" -> "al al din nasir tusi" """
+    return " ".join(sorted(name_tokens(text)))
+
+
+def compact_key(text):
+    """Key ignoring word boundaries, so "W.G. Grace" and "WG_Grace" agree"""
+    return "".join(name_tokens(text))
+
+
+def safe_name(name, separator="_"):
+    """
+    Filesystem- and blob-safe form of a name that keeps its case:
+    "Pelé" -> "Pele", "W.G. Grace" -> "W_G_Grace"
+    """
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    ascii_name = "".join(c for c in decomposed if not unicodedata.combining(c)).encode("ascii", "ignore").decode("ascii")
+    return separator.join(part for part in _SAFE_SEPARATORS.split(ascii_name) if part)
+
+
+def legacy_safe_names(name):
+    """
+    Forms the scripts produced before `safe_name` ("Pelé" -> "Pelé",
+    "W.G. Grace" -> "W.G._Grace" / "WG_Grace"), so files and blobs already
+    stored under them can be found and kept instead of duplicated
+    """
+    spaced = (name or "").replace(" ", "_")
+    candidates = [
+        spaced.replace("/", "_"),
+        "".join(c for c in spaced.replace("-", "_") if c.isalnum() or c == "_"),
+        "".join(c for c in spaced.replace("/", "_").replace("\\", "_") if c.isalnum() or c in "_-"),
+    ]
+    return [candidate for candidate in dict.fromkeys(candidates) if candidate != safe_name(name)]
+
+
+class NameResolver:
+    """
+    Map arbitrary spellings (file stems, blob names, user input) back to a
+    canonical name. `values` are returned for matches; they default to the
+    names themselves.
+    """
+
+    def __init__(self, names, values=None, cutoff=DEFAULT_CUTOFF):
+        self.cutoff = cutoff
+        self.by_key = {}
+        self.by_compact = {}
+        self.memo = {}
+        values = names if values is None else values
+        for name, value in zip(names, values):
+            self.by_key.setdefault(name_key(name), value)
+            self.by_compact.setdefault(compact_key(name), value)
+        self.keys = list(self.by_key)
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def resolve(self, text, default=None):
+        key = name_key(text)
+        if key in self.by_key:
+            return self.by_key[key]
+        compact = compact_key(text)
+        if compact in self.by_compact:
+            return self.by_compact[compact]
+        if key not in self.memo:
+            matches = difflib.get_close_matches(key, self.keys, n=1, cutoff=self.cutoff)
+            self.memo[key] = self.by_key[matches[0]] if matches else None
+        match = self.memo[key]
+        return default if match is None else match
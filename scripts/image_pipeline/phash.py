@@ -0,0 +1,124 @@
+"""
+Vectorized perceptual hashing and a Hamming-distance index
+
+pHash (DCT of a 32x32 grayscale thumbnail, top-left 8x8 low frequencies
+compared to their median) and dHash (horizontal gradient of a 9x8
+thumbnail) are computed for whole batches with NumPy and packed into 64-bit
+integers. Stored hashes are 16-character hex strings.
+
+`BKTree` finds every stored hash within a Hamming distance of a query without
+comparing against the whole corpus, so resized or re-encoded copies of the
+same picture can be found across all figures.
+"""
+
+import numpy as np
+from PIL import Image
+
+PHASH_SIZE = 32
+PHASH_LOW_FREQ = 8
+DHASH_SIZE = (9, 8)
+DEFAULT_MAX_DISTANCE = 6
+
+_BIT_WEIGHTS = (np.uint64(1) << np.arange(63, -1, -1, dtype=np.uint64))
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis, so dct2(x) = D @ x @ D.T"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def hash_inputs(img):
+    """
+    Reduce an open PIL image to the grayscale thumbnails the hashes need:
+    (32x32 float32 for pHash, 8x9 float32 for dHash)
+    """
+    gray = img.convert("L")
+    small = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS), dtype=np.float32)
+    gradient = np.asarray(gray.resize(DHASH_SIZE, Image.Resampling.LANCZOS), dtype=np.float32)
+    return small, gradient
+
+
+def pack_bits(bits):
+    """(N, 64) boolean array -> list of N Python ints"""
+    return [int(value) for value in (bits.astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)]
+
+
+def phash_batch(thumbnails):
+    """pHash for a stack of 32x32 grayscale arrays"""
+    if not len(thumbnails):
+        return []
+    stack = np.asarray(thumbnails, dtype=np.float64)
+    coefficients = np.einsum("ij,njk,lk->nil", _DCT, stack, _DCT)
+    low = coefficients[:, :PHASH_LOW_FREQ, :PHASH_LOW_FREQ].reshape(len(stack), -1)
+    # The DC term says nothing about structure; exclude it from the median
+    medians = np.median(low[:, 1:], axis=1, keepdims=True)
+    return pack_bits(low > medians)
+
+
+def dhash_batch(gradients):
+    """dHash for a stack of 8x9 grayscale arrays"""
+    if not len(gradients):
+        return []
+    stack = np.asarray(gradients, dtype=np.float32)
+    return pack_bits((stack[:, :, 1:] > stack[:, :, :-1]).reshape(len(stack), -1))
+
+
+def to_hex(value):
+    return f"{value:016x}"
+
+
+def from_hex(text):
+    return int(text, 16)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item=None):
+        node = [value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance=DEFAULT_MAX_DISTANCE):
+        """Return [(distance, stored_value, item)] within max_distance, closest first"""
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            stored, item, children = stack.pop()
+            distance = hamming(value, stored)
+            if distance <= max_distance:
+                matches.append((distance, stored, item))
+            # Triangle inequality: only subtrees at d +/- max_distance can match
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,162 @@
+"""
+Header-only image probing
+
+Reads just the first few KB of a file or URL (an HTTP Range request for
+remote images) and parses the format, width and height from the JPEG, PNG,
+GIF or WebP header. Candidates can then be rejected on size or aspect ratio
+before the full body is downloaded or decoded.
+
+Probes return None when the format is unrecognised or the header did not
+fit in the bytes read; callers should then fall back to a full decode.
+"""
+
+import struct
+from collections import namedtuple
+
+PROBE_BYTES = 16 * 1024
+# JPEG SOF markers can sit behind large EXIF/ICC segments
+MAX_PROBE_BYTES = 256 * 1024
+
+ImageProbe = namedtuple("ImageProbe", ["format", "width", "height"])
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+class NeedMoreData(Exception):
+    """The header continues past the bytes read so far"""
+
+
+def _probe_jpeg(data):
+    i = 2
+    while True:
+        if i + 4 > len(data):
+            raise NeedMoreData
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before the real marker
+            i += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            i += 2
+            continue
+        if marker == 0xD9:
+            return None
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                raise NeedMoreData
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return ImageProbe("JPEG", width, height)
+        i += 2 + length
+
+
+def _probe_webp(data):
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageProbe("WEBP", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = struct.unpack("<I", data[21:25])[0]
+        return ImageProbe("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return ImageProbe("WEBP", width, height)
+    return None
+
+
+def probe_bytes(data):
+    """
+    Parse an ImageProbe from the leading bytes of an image. Returns None for
+    unknown formats; raises NeedMoreData if the header is incomplete.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        if len(data) < 24:
+            raise NeedMoreData
+        width, height = struct.unpack(">II", data[16:24])
+        return ImageProbe("PNG", width, height)
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        if len(data) < 10:
+            raise NeedMoreData
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageProbe("GIF", width, height)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        if len(data) < 30:
+            raise NeedMoreData
+        return _probe_webp(data)
+    if data[:2] == b"\xff\xd8":
+        return _probe_jpeg(data)
+    return None
+
+
+def probe_file(path, max_bytes=MAX_PROBE_BYTES):
+    """Probe a local file by reading only as much of its head as needed"""
+    limit = PROBE_BYTES
+    try:
+        with open(path, "rb") as f:
+            data = f.read(limit)
+            while True:
+                try:
+                    return probe_bytes(data)
+                except NeedMoreData:
+                    # Short read means end of file: the header is truncated
+                    if len(data) < limit or limit >= max_bytes:
+                        return None
+                    limit *= 2
+                    data += f.read(limit - len(data))
+    except OSError:
+        return None
+
+
+def _read_range(session, url, start, end, timeout):
+    """Bytes start..end (inclusive) of `url`, and its content type"""
+    headers = {"Range": f"bytes={start}-{end}", "Accept-Encoding": "identity"}
+    response = session.get(url, headers=headers, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+        # A server that ignores Range sends 200 with the whole body from
+        # byte 0: skip what we already have and stop after `end`
+        skip = 0 if response.status_code == 206 else start
+        data = b""
+        for chunk in response.iter_content(chunk_size=min(end + 1, 16 * 1024)):
+            data += chunk
+            if len(data) >= skip + end - start + 1:
+                break
+        return data[skip:skip + end - start + 1], response.headers.get("content-type", "")
+    finally:
+        response.close()
+
+
+def probe_url(session, url, timeout=10, max_bytes=MAX_PROBE_BYTES):
+    """
+    Probe a remote image with Range requests, each growing the head by
+    fetching only the bytes not read yet. Returns (ImageProbe or None,
+    content_type); network and HTTP errors propagate to the caller.
+    """
+    size = PROBE_BYTES
+    data, content_type = _read_range(session, url, 0, size - 1, timeout)
+    while True:
+        try:
+            return probe_bytes(data), content_type
+        except NeedMoreData:
+            if len(data) < size or size >= max_bytes:
+                return None, content_type
+            start, size = size, min(size * 4, max_bytes)
+            more, _ = _read_range(session, url, start, size - 1, timeout)
+            data += more
+
+
+def check_dimensions(probe, min_side=200, max_side=None, min_ratio=0.3, max_ratio=3.0):
+    """Apply the scripts' size and aspect-ratio rules; returns (ok, reason)"""
+    width, height = probe.width, probe.height
+    if width < min_side or height < min_side:
+        return False, "Too small"
+    if max_side and (width > max_side or height > max_side):
+        return False, "Too large"
+    ratio = width / height
+    if ratio < min_ratio or ratio > max_ratio:
+        return False, "Poor aspect ratio"
+    return True, "Valid"
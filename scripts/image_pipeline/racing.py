@@ -0,0 +1,98 @@
+"""
+Priority-ordered source racing with hedged requests
+
+Sources are given highest priority first. Instead of trying them one after
+another (so a figure costs the sum of every failing source's timeout), the
+top `width` sources run concurrently and the highest-priority success wins
+as soon as every source above it has answered or timed out. When a source
+fails, the next one in priority order joins the race. A source that has not
+answered after `hedge_delay` seconds gets one duplicate request, and the
+first copy to answer counts, which cuts off slow-connection tails.
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
+
+DEFAULT_RACE_WIDTH = 3
+DEFAULT_HEDGE_DELAY = 3.0
+DEFAULT_SOURCE_TIMEOUT = 20.0
+
+RaceResult = namedtuple("RaceResult", ["index", "value", "launched", "hedged", "elapsed"])
+
+
+def race(executor, calls, width=DEFAULT_RACE_WIDTH, hedge_delay=DEFAULT_HEDGE_DELAY,
+         timeout=DEFAULT_SOURCE_TIMEOUT):
+    """
+    Race zero-argument `calls` (highest priority first) on `executor`.
+
+    A call succeeds by returning a truthy value; None, a falsy value or an
+    exception is a failure. Returns a RaceResult whose `index`/`value` are
+    those of the highest-priority success (both None if every call failed).
+    Calls still running when the race is decided are abandoned, not waited for.
+    """
+    start = time.monotonic()
+    pending = {}  # future -> call index
+    started = {}  # call index -> start time
+    attempts = {}  # call index -> attempts still running
+    results = {}
+    failed = set()
+    hedged = set()
+    launched = 0
+    next_index = 0
+
+    def submit(index):
+        nonlocal launched
+        pending[executor.submit(calls[index])] = index
+        attempts[index] = attempts.get(index, 0) + 1
+        launched += 1
+
+    def resolved(index):
+        return index in results or index in failed
+
+    while True:
+        # Decide as soon as the best remaining call has an answer
+        for index in range(len(calls)):
+            if index in results:
+                return RaceResult(index, results[index], launched, len(hedged), time.monotonic() - start)
+            if index not in failed:
+                break
+        else:
+            return RaceResult(None, None, launched, len(hedged), time.monotonic() - start)
+
+        # Keep `width` unresolved calls in flight
+        running = [index for index in started if not resolved(index)]
+        while len(running) < width and next_index < len(calls):
+            started[next_index] = time.monotonic()
+            submit(next_index)
+            running.append(next_index)
+            next_index += 1
+
+        now = time.monotonic()
+        timed_out = [index for index in running if now - started[index] >= timeout]
+        if timed_out:
+            failed.update(timed_out)
+            continue
+        for index in running:
+            if index not in hedged and now - started[index] >= hedge_delay:
+                hedged.add(index)
+                submit(index)
+
+        deadlines = [started[index] + timeout for index in running]
+        deadlines += [started[index] + hedge_delay for index in running if index not in hedged]
+        waiting = [future for future, index in pending.items() if not resolved(index)]
+        done, _ = wait(waiting, timeout=max(0.0, min(deadlines) - time.monotonic()), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            index = pending.pop(future)
+            attempts[index] -= 1
+            if resolved(index):
+                continue
+            try:
+                value = future.result()
+            except Exception:
+                value = None
+            if value:
+                results[index] = value
+            elif attempts[index] == 0:
+                failed.add(index)
@@ -0,0 +1,179 @@
+"""
+Per-host token-bucket rate limiting shared by the image scripts
+
+Every request to an external host takes a token from that host's bucket, so
+scripts run at exactly the allowed rate instead of sleeping a fixed amount
+after each call. 429 responses and Retry-After headers pause the host's
+bucket for everyone sharing the limiter.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Sustained requests per second and burst size for each host.
+# Keys starting with "." match any subdomain.
+HOST_RATES = {
+    "commons.wikimedia.org": (5.0, 5),
+    "upload.wikimedia.org": (10.0, 10),
+    "en.wikipedia.org": (5.0, 5),
+    "query.wikidata.org": (1.0, 2),
+    "api.si.edu": (1000 / 3600, 5),  # api.data.gov: 1000 requests/hour
+    "www.googleapis.com": (1.0, 1),
+    ".blob.core.windows.net": (50.0, 50),
+}
+DEFAULT_RATE = (2.0, 2)
+
+# Status codes that mean "slow down" rather than "failed"
+THROTTLE_STATUS_CODES = (429, 503)
+MAX_RETRY_AFTER = 300  # seconds
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens/second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (used for 429 / Retry-After)"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class HostRateLimiter:
+    """Lazily creates one TokenBucket per host"""
+
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE):
+        self.rates = dict(HOST_RATES if rates is None else rates)
+        self.default_rate = default_rate
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def rate_for(self, host):
+        """Return (rate, burst) for a host, honouring ".suffix" entries"""
+        if host in self.rates:
+            return self.rates[host]
+        for pattern, rate in self.rates.items():
+            if pattern.startswith(".") and host.endswith(pattern):
+                return rate
+        return self.default_rate
+
+    def bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(*self.rate_for(host))
+            return self.buckets[host]
+
+    def acquire(self, url):
+        """Wait for a token for the host of `url`"""
+        return self.bucket(urlparse(url).netloc).acquire()
+
+    def pause(self, url, seconds):
+        """Pause the host of `url` for `seconds`"""
+        self.bucket(urlparse(url).netloc).pause(min(seconds, MAX_RETRY_AFTER))
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_limiter():
+    """Return the process-wide limiter so all callers share the same buckets"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = HostRateLimiter()
+        return _shared_limiter
+
+
+class RateLimitedSession:
+    """
+    Wraps a requests.Session so every request waits for its host's token and
+    throttling responses (429/503) pause the host and are retried.
+    """
+
+    def __init__(self, session, limiter=None, max_retries=3):
+        self.session = session
+        self.limiter = limiter or get_shared_limiter()
+        self.max_retries = max_retries
+
+    def request(self, method, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(url)
+            response = self.session.request(method, url, **kwargs)
+
+            if response.status_code not in THROTTLE_STATUS_CODES or attempt == self.max_retries:
+                return response
+
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            if delay is None:
+                if response.status_code != 429:
+                    return response
+                delay = (2 ** attempt) + random.random()
+            self.limiter.pause(url, delay)
+            response.close()
+
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def __getattr__(self, name):
+        # headers, mount, close, ... go straight to the wrapped session
+        return getattr(self.session, name)
@@ -0,0 +1,104 @@
+"""
+Multi-resolution image renditions from a single decode
+
+The game client renders small orb thumbnails, so serving only full-size
+originals wastes bytes and decode time. Each source image is decoded once
+(JPEG sources are decoded at a reduced DCT scale via `draft`) and a fixed
+ladder of renditions is produced, largest first, each size downscaled from
+the previous one. Every size is encoded as WebP with a JPEG fallback.
+Rendition names are derived from the original's name, so re-runs produce
+the same names (and, with the same Pillow, the same bytes).
+"""
+
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+RENDITION_SIZES = (1024, 512, 256, 128)
+
+# extension -> (Pillow format, content type, save options)
+RENDITION_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+Rendition = namedtuple("Rendition", ["size", "extension", "width", "height", "content_type", "data"])
+
+
+def rendition_name(name, size, extension):
+    """Deterministic name for a rendition of `name`: photo.jpg -> photo_256.webp"""
+    stem = os.path.splitext(name)[0]
+    return f"{stem}_{size}.{extension}"
+
+
+def prepare(img, max_size=max(RENDITION_SIZES)):
+    """Decode an opened image once, at the smallest scale that still covers `max_size`"""
+    img.draft("RGB", (max_size, max_size))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    return img
+
+
+def _flatten(img):
+    """JPEG has no alpha channel: composite onto white"""
+    if img.mode != "RGBA":
+        return img
+    background = Image.new("RGB", img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel("A"))
+    return background
+
+
+def render_ladder(img, sizes=RENDITION_SIZES, formats=RENDITION_FORMATS):
+    """
+    Yield Renditions of a prepared image, largest first. Sizes bound the
+    long side and nothing is upscaled: of the sizes at or above the
+    source's long side only the smallest is kept, at native resolution.
+    """
+    long_side = max(img.size)
+    covering = [size for size in sizes if size >= long_side]
+    rungs = {size for size in sizes if size < long_side}
+    if covering:
+        rungs.add(min(covering))
+    current = img
+    for size in sorted(rungs, reverse=True):
+        frame = current.copy()
+        frame.thumbnail((size, size), Image.Resampling.LANCZOS)
+        current = frame
+        for extension, (image_format, content_type, options) in formats.items():
+            out = BytesIO()
+            (frame if image_format == "WEBP" else _flatten(frame)).save(out, image_format, **options)
+            yield Rendition(size, extension, frame.width, frame.height, content_type, out.getvalue())
+
+
+def make_renditions(data, sizes=RENDITION_SIZES, formats=RENDITION_FORMATS):
+    """Decode image bytes once and return the full rendition ladder"""
+    img = prepare(Image.open(BytesIO(data)), max(sizes))
+    return list(render_ladder(img, sizes, formats))
+
+
+def rendition_urls(records, key="blob_url"):
+    """
+    Size -> format -> URL map of described renditions, for a client to pick a
+    size: {"256": {"webp": ..., "jpg": ...}} (string keys, as MongoDB needs)
+    """
+    urls = {}
+    for record in records:
+        if record.get(key):
+            urls.setdefault(str(record["size"]), {})[record["format"]] = record[key]
+    return urls
+
+
+def describe(rendition, **location):
+    """Rendition record for JSON results and figure documents"""
+    return dict({
+        "size": rendition.size,
+        "format": rendition.extension,
+        "contentType": rendition.content_type,
+        "width": rendition.width,
+        "height": rendition.height,
+        "bytes": len(rendition.data),
+    }, **location)
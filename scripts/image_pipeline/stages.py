@@ -0,0 +1,141 @@
+"""
+In-process streaming pipeline runner
+
+Stages run as threads connected by bounded `queue.Queue`s, so a downstream
+stage starts on the first item while upstream stages are still producing,
+and a slow stage applies back-pressure instead of buffering everything.
+Each queue is closed with a DONE sentinel. If any stage fails, the whole
+pipeline is aborted (blocked puts/gets give up) and the error is reported
+by `run()`.
+"""
+
+import queue
+import threading
+import time
+import traceback
+
+DONE = object()
+POLL_SECONDS = 0.5
+
+
+class PipelineAborted(Exception):
+    """Raised inside stages when another stage has failed"""
+
+
+def in_order(indexed_items, start=0):
+    """Re-sequence (index, item) pairs produced out of order by parallel workers"""
+    pending = {}
+    next_index = start
+    for index, item in indexed_items:
+        pending[index] = item
+        while next_index in pending:
+            yield next_index, pending.pop(next_index)
+            next_index += 1
+
+
+class Pipeline:
+    def __init__(self, queue_size=32):
+        self.queue_size = queue_size
+        self.abort = threading.Event()
+        self.threads = []
+        self.errors = []
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def queue(self):
+        return queue.Queue(maxsize=self.queue_size)
+
+    def put(self, q, item):
+        while True:
+            if self.abort.is_set():
+                raise PipelineAborted
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def close(self, q):
+        self.put(q, DONE)
+
+    def iterate(self, q):
+        """Yield items from `q` until DONE (which is put back for sibling workers)"""
+        while True:
+            try:
+                item = q.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if self.abort.is_set():
+                    raise PipelineAborted
+                continue
+            if item is DONE:
+                self.put(q, DONE)
+                return
+            yield item
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name]["items"] += 1
+
+    def stage(self, name, target, workers=1, on_finish=None):
+        """
+        Run `target()` in `workers` threads. `on_finish` runs once, after the
+        last worker returns (e.g. to close the stage's output queue).
+        """
+        self.stats[name] = {"items": 0, "started": None, "finished": None}
+        remaining = [workers]
+
+        def run():
+            try:
+                with self.lock:
+                    if self.stats[name]["started"] is None:
+                        self.stats[name]["started"] = time.time()
+                target()
+                with self.lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self.stats[name]["finished"] = time.time()
+                    if on_finish:
+                        on_finish()
+            except PipelineAborted:
+                pass
+            except BaseException as e:
+                self.errors.append((name, e, traceback.format_exc()))
+                self.abort.set()
+
+        for i in range(workers):
+            thread = threading.Thread(target=run, name=f"{name}-{i}", daemon=True)
+            self.threads.append(thread)
+
+    def source(self, name, items, outbox):
+        """Stage that feeds an iterable into `outbox`"""
+        def produce():
+            for item in items:
+                self.put(outbox, item)
+                self.count(name)
+        self.stage(name, produce, on_finish=lambda: self.close(outbox))
+
+    def map(self, name, func, inbox, outbox, workers=1):
+        """Stage that puts func(item) into `outbox` for every item of `inbox`"""
+        def work():
+            for item in self.iterate(inbox):
+                result = func(item)
+                self.count(name)
+                if result is not None:
+                    self.put(outbox, result)
+        self.stage(name, work, workers=workers, on_finish=lambda: self.close(outbox))
+
+    def run(self):
+        """Start every stage, wait for them, and return the list of errors"""
+        start = time.time()
+        for thread in self.threads:
+            thread.start()
+        try:
+            for thread in self.threads:
+                while thread.is_alive():
+                    thread.join(POLL_SECONDS)
+        except KeyboardInterrupt:
+            self.abort.set()
+            raise
+        self.elapsed = time.time() - start
+        return self.errors
@@ -0,0 +1,40 @@
+"""
+Single-pass image inspection for phase 3
+
+Each file is opened once: fully decoded (which catches truncated or corrupt
+files, like `verify()` did), measured, and reduced to the grayscale
+thumbnails the perceptual hashes need. `inspect_chunk` is the unit of work
+handed to process-pool workers; hashes are computed for the whole chunk in
+one NumPy batch.
+"""
+
+from PIL import Image
+
+from .phash import dhash_batch, hash_inputs, phash_batch, to_hex
+
+
+def inspect_image(path):
+    """Return (report, hash_inputs or None) for one image file"""
+    try:
+        with Image.open(path) as img:
+            img.load()
+            width, height = img.size
+            inputs = hash_inputs(img)
+        return {"valid": True, "reason": f"Valid ({width}x{height})", "width": width, "height": height}, inputs
+    except Exception as e:
+        return {"valid": False, "reason": f"Invalid image: {e}"}, None
+
+
+def inspect_chunk(paths):
+    """
+    Inspect and hash a list of image paths. Returns one report per path, in
+    order; valid reports carry `phash`/`dhash` as 16-digit hex strings.
+    """
+    results = [inspect_image(path) for path in paths]
+    hashed = [(report, inputs) for report, inputs in results if inputs is not None]
+    phashes = phash_batch([inputs[0] for _, inputs in hashed])
+    dhashes = dhash_batch([inputs[1] for _, inputs in hashed])
+    for (report, _), phash, dhash in zip(hashed, phashes, dhashes):
+        report["phash"] = to_hex(phash)
+        report["dhash"] = to_hex(dhash)
+    return [report for report, _ in results]
@@ -0,0 +1,130 @@
+"""
+Batched Wikidata portrait (P18) lookup
+
+Instead of one SPARQL query per figure, names are resolved hundreds at a time
+with a single `VALUES ?label { ... }` query. Every answer, including "no
+portrait", is cached per figure in a small JSON file, so later runs and later
+phases only query figures they have never seen.
+"""
+
+import json
+import os
+import re
+import threading
+
+SPARQL_ENDPOINT = "https://query.wikidata.org/sparql"
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_CACHE_PATH = os.path.join(".cache", "wikidata_portraits.json")
+
+PORTRAIT_QUERY = """
+SELECT ?label ?person ?image WHERE {{
+  VALUES ?label {{ {values} }}
+  ?person rdfs:label ?label ;
+          wdt:P18 ?image .
+}}
+"""
+
+
+def sparql_string(value):
+    """Quote a Python string as a SPARQL literal"""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def build_portrait_query(names):
+    """Build one query that resolves every name in `names`"""
+    values = " ".join(f"{sparql_string(name)}@en" for name in names)
+    return PORTRAIT_QUERY.format(values=values)
+
+
+def qid_number(entity_url):
+    """Numeric part of a Wikidata entity URL, for deterministic tie-breaking"""
+    match = re.search(r"Q(\d+)$", entity_url)
+    return int(match.group(1)) if match else float("inf")
+
+
+def parse_portrait_bindings(bindings):
+    """Map label -> {"qid", "image"}, keeping the lowest QID when a label is ambiguous"""
+    matches = {}
+    for row in bindings:
+        label = row["label"]["value"]
+        person = row["person"]["value"]
+        current = matches.get(label)
+        if current is None or qid_number(person) < qid_number(current["entity"]):
+            matches[label] = {"entity": person, "image": row["image"]["value"]}
+
+    return {
+        label: {"qid": match["entity"].rsplit("/", 1)[-1], "image": match["image"]}
+        for label, match in matches.items()
+    }
+
+
+class WikidataPortraitResolver:
+    """Resolves figure names to their Wikidata QID and P18 image in batches"""
+
+    def __init__(self, session, cache_path=DEFAULT_CACHE_PATH, batch_size=DEFAULT_BATCH_SIZE):
+        self.session = session
+        self.cache_path = cache_path
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable Wikidata cache {self.cache_path}: {e}")
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.cache, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def _query_batch(self, names):
+        # POST keeps long VALUES lists out of the URL
+        response = self.session.post(
+            SPARQL_ENDPOINT,
+            data={"query": build_portrait_query(names), "format": "json"},
+            headers={"Accept": "application/sparql-results+json"},
+            timeout=60
+        )
+        response.raise_for_status()
+        return parse_portrait_bindings(response.json().get("results", {}).get("bindings", []))
+
+    def resolve(self, names):
+        """
+        Resolve every name not already cached. Returns {name: {"qid", "image"} or None}.
+        A batch that fails is left uncached so the next call retries it.
+        """
+        with self.lock:
+            pending = list(dict.fromkeys(name for name in names if name not in self.cache))
+
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                try:
+                    found = self._query_batch(batch)
+                except Exception as e:
+                    print(f"⚠️ Wikidata batch lookup failed for {len(batch)} figures: {e}")
+                    continue
+
+                for name in batch:
+                    self.cache[name] = found.get(name)
+                self._save_cache()
+
+            return {name: self.cache.get(name) for name in names}
+
+    def get(self, name):
+        """Portrait for a single figure (queries Wikidata only on a cache miss)"""
+        if name not in self.cache:
+            self.resolve([name])
+        return self.cache.get(name)
@@ -5,36 +5,36 @@ Analyzes existing images and identifies missing ones from historical figures dat
 """
 
 import os
-import json
 from pathlib import Path
 
+from image_pipeline.catalog import load_catalog
+
 def get_existing_images():
     """Get list of existing image files."""
     image_dir = Path("downloaded_images")
     if not image_dir.exists():
         return []
     
+    try:
+        catalog = load_catalog()
+    except Exception as e:
+        print(f"Error reading OrbGameInfluentialPeopleSeeds: {e}")
+        catalog = None
+    
     images = []
     for file in image_dir.glob("*.jpg"):
-        # Extract name from filename (remove _portrait_0.jpg)
-        name = file.stem.replace("_portrait_0", "")
-        images.append(name)
+        # Extract name from filename (remove _portrait_0.jpg / _portraits_0.jpg)
+        name = file.stem.replace("_portraits_0", "").replace("_portrait_0", "")
+        # Report files under the figure's canonical name ("Pele" -> "Pelé")
+        figure = catalog.resolve(name) if catalog else None
+        images.append(figure["name"] if figure else name)
     
     return images
 
 def get_required_figures():
     """Get list of required figures from the data file."""
     try:
-        with open("OrbGameInfluentialPeopleSeeds", "r") as f:
-            data = json.load(f)
-        
-        figures = []
-        for category, epochs in data.items():
-            for epoch, people in epochs.items():
-                for person in people:
-                    figures.append(person["name"])
-        
-        return figures
+        return [figure["name"] for figure in load_catalog()]
     except Exception as e:
         print(f"Error reading OrbGameInfluentialPeopleSeeds: {e}")
         return []
@@ -50,9 +50,11 @@ def analyze_inventory():
     print(f"\n📁 Existing Images: {len(existing)}")
     print(f"📋 Required Figures: {len(required)}")
     
-    # Find missing images
-    missing = [name for name in required if name not in existing]
-    extra = [name for name in existing if name not in required]
+    # Find missing images (set lookups keep this linear in the number of figures)
+    existing_names = set(existing)
+    required_names = set(required)
+    missing = [name for name in required if name not in existing_names]
+    extra = [name for name in existing if name not in required_names]
     
     print(f"❌ Missing Images: {len(missing)}")
     print(f"➕ Extra Images: {len(extra)}")
@@ -75,15 +77,11 @@ def analyze_inventory():
         print("-" * 30)
         
         try:
-            with open("OrbGameInfluentialPeopleSeeds", "r") as f:
-                data = json.load(f)
+            missing_names = set(missing)
             
-            for category, epochs in data.items():
-                category_missing = []
-                for epoch, people in epochs.items():
-                    for person in people:
-                        if person["name"] in missing:
-                            category_missing.append(f"{person['name']} ({epoch})")
+            for category, people in load_catalog().by_category.items():
+                category_missing = [f"{person['name']} ({person['epoch']})" for person in people
+                                    if person["name"] in missing_names]
                 
                 if category_missing:
                     print(f"\n{category.upper()}:")
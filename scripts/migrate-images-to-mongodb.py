@@ -14,6 +14,8 @@ from urllib.parse import urlparse
 import argparse
 from typing import Dict, List, Optional
 
+from image_pipeline.catalog import load_catalog
+
 def encode_image_to_base64(file_path: str) -> Optional[str]:
     """Convert image file to base64 string."""
     try:
@@ -46,6 +48,14 @@ def get_figure_name_from_filename(filename: str) -> str:
     name = name.replace('_achievement_0', '')
     name = name.replace('_invention_0', '')
     name = name.replace('_artifact_0', '')
+    
+    # Map the file stem back to the figure's canonical name ("Pele" -> "Pelé")
+    try:
+        figure = load_catalog().resolve(name)
+        if figure:
+            return figure['name']
+    except Exception as e:
+        print(f"⚠️ Error reading figure data: {e}")
     return name
 
 def categorize_image_type(filename: str) -> str:
@@ -65,18 +75,15 @@ def categorize_image_type(filename: str) -> str:
 def get_category_and_epoch_for_figure(figure_name: str) -> tuple:
     """Get category and epoch for a figure from the data file."""
     try:
-        with open("OrbGameInfluentialPeopleSeeds", "r") as f:
-            data = json.load(f)
-            
-        for category, epochs in data.items():
-            for epoch, figures in epochs.items():
-                for figure in figures:
-                    if figure.get('name', '').lower() == figure_name.lower():
-                        return category, epoch
+        catalog = load_catalog()
+        figure = catalog.find(figure_name) or catalog.resolve(figure_name)
+        if figure:
+            return figure['category'], figure['epoch']
     except Exception as e:
         print(f"⚠️ Error reading figure data: {e}")
     
     # Default fallback
+    print(f"⚠️ No seed entry matches {figure_name}, using default category/epoch")
     return 'Technology', 'Modern'
 
 def migrate_images_to_mongodb():
@@ -4,16 +4,20 @@ Multi-Source Image Retrieval for Orb Game Historical Figures
 Uses Wikimedia Commons, Wikipedia, and other free sources
 """
 
-import requests
 import json
-import time
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import os
 import sys
 import re
 from urllib.parse import quote
 
+from image_pipeline.catalog import load_catalog
+from image_pipeline.commons import is_image_title, resolve_imageinfo
+from image_pipeline.http_cache import with_response_cache
+from image_pipeline.http_session import create_session
+from image_pipeline.rate_limiter import RateLimitedSession
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,10 +33,7 @@ class MultiSourceImageRetrievalService:
     """Multi-source image retrieval service using free APIs"""
     
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'OrbGame/1.0 (Educational Project)'
-        })
+        self.session = with_response_cache(RateLimitedSession(create_session(user_agent='OrbGame/1.0 (Educational Project)')))
         
         # Wikimedia Commons API
         self.wikimedia_api = "https://commons.wikimedia.org/w/api.php"
@@ -40,6 +41,9 @@ class MultiSourceImageRetrievalService:
         # Wikipedia API
         self.wikipedia_api = "https://en.wikipedia.org/w/api.php"
         
+        # Width of the thumbnails requested from Commons imageinfo
+        self.thumb_width = 120
+        
         # Fallback placeholder images (public domain)
         self.placeholder_images = {
             'portraits': 'https://upload.wikimedia.org/wikipedia/commons/thumb/4/47/Generic_Feed_icon.svg/120px-Generic_Feed_icon.svg.png',
@@ -51,7 +55,7 @@ class MultiSourceImageRetrievalService:
         logger.info("✅ Multi-source image retrieval service initialized")
     
     def search_wikimedia_commons(self, query: str, image_type: str) -> Optional[str]:
-        """Search Wikimedia Commons for images"""
+        """Search Wikimedia Commons for images, returning a File: title"""
         try:
             params = {
                 'action': 'query',
@@ -70,15 +74,12 @@ class MultiSourceImageRetrievalService:
             results = data.get('query', {}).get('search', [])
             
             if results:
-                # Extract image URL from the first result
+                # URLs are resolved later in bulk by resolve_image_urls
                 for result in results:
                     title = result.get('title', '')
-                    if title.startswith('File:') and any(ext in title.lower() for ext in ['.jpg', '.jpeg', '.png', '.svg']):
-                        # Convert title to URL
-                        filename = title.replace('File:', '').replace(' ', '_')
-                        image_url = f"https://upload.wikimedia.org/wikipedia/commons/thumb/{filename}/120px-{filename}"
-                        logger.info(f"✅ Found Wikimedia image: {image_url}")
-                        return image_url
+                    if is_image_title(title):
+                        logger.info(f"✅ Found Wikimedia image: {title}")
+                        return title
             
             logger.warning(f"No Wikimedia Commons results for: {query}")
             return None
@@ -88,7 +89,7 @@ class MultiSourceImageRetrievalService:
             return None
     
     def search_wikipedia(self, query: str, image_type: str) -> Optional[str]:
-        """Search Wikipedia for images"""
+        """Search Wikipedia for images, returning a File: title"""
         try:
             params = {
                 'action': 'query',
@@ -116,7 +117,7 @@ class MultiSourceImageRetrievalService:
             return None
     
     def get_wikipedia_page_images(self, page_title: str) -> Optional[str]:
-        """Get images from a Wikipedia page"""
+        """Get the first image File: title from a Wikipedia page"""
         try:
             params = {
                 'action': 'query',
@@ -136,12 +137,9 @@ class MultiSourceImageRetrievalService:
                 images = page_data.get('images', [])
                 for image in images:
                     image_title = image.get('title', '')
-                    if image_title.startswith('File:') and any(ext in image_title.lower() for ext in ['.jpg', '.jpeg', '.png']):
-                        # Convert to Wikimedia Commons URL
-                        filename = image_title.replace('File:', '').replace(' ', '_')
-                        image_url = f"https://upload.wikimedia.org/wikipedia/commons/thumb/{filename}/120px-{filename}"
-                        logger.info(f"✅ Found Wikipedia image: {image_url}")
-                        return image_url
+                    if is_image_title(image_title):
+                        logger.info(f"✅ Found Wikipedia image: {image_title}")
+                        return image_title
             
             return None
             
@@ -149,8 +147,8 @@ class MultiSourceImageRetrievalService:
             logger.error(f"Failed to get Wikipedia page images for '{page_title}': {e}")
             return None
     
-    def search_public_domain_images(self, query: str, image_type: str) -> Optional[str]:
-        """Search for public domain images using various sources"""
+    def search_public_domain_images(self, query: str, image_type: str) -> Optional[Tuple[str, str]]:
+        """Search for public domain images, returning (File: title, source name)"""
         try:
             # Try Pixabay-like search patterns
             search_terms = [
@@ -162,16 +160,14 @@ class MultiSourceImageRetrievalService:
             
             for term in search_terms:
                 # Try Wikimedia Commons first
-                image_url = self.search_wikimedia_commons(term, image_type)
-                if image_url:
-                    return image_url
+                file_title = self.search_wikimedia_commons(term, image_type)
+                if file_title:
+                    return file_title, 'wikimedia_commons'
                 
                 # Try Wikipedia
-                image_url = self.search_wikipedia(term, image_type)
-                if image_url:
-                    return image_url
-                
-                time.sleep(0.1)  # Rate limiting
+                file_title = self.search_wikipedia(term, image_type)
+                if file_title:
+                    return file_title, 'wikipedia'
             
             return None
             
@@ -269,29 +265,28 @@ class MultiSourceImageRetrievalService:
                 for query in queries:
                     try:
                         # Try to get real image from public domain sources
-                        image_url = self.search_public_domain_images(query, image_type)
+                        match = self.search_public_domain_images(query, image_type)
                         
-                        if image_url and image_url != self.placeholder_images.get(image_type):
+                        if match:
+                            file_title, source_name = match
+                            # 'url' is filled in by resolve_image_urls
                             image_data = {
-                                'url': image_url,
-                                'source': 'Wikimedia Commons' if 'wikimedia' in image_url else 'Wikipedia',
+                                'url': None,
+                                'fileTitle': file_title,
+                                'source': 'Wikimedia Commons' if source_name == 'wikimedia_commons' else 'Wikipedia',
                                 'licensing': 'Public Domain',
                                 'reliability': 'High',
                                 'searchTerm': query,
                                 'priority': 90,
-                                'source_name': 'wikimedia_commons' if 'wikimedia' in image_url else 'wikipedia'
+                                'source_name': source_name
                             }
                             
                             figure_result['images'][image_type].append(image_data)
                             results['images_added'][image_type] += 1
-                            
-                            if 'wikimedia' in image_url:
-                                results['sources_used']['wikimedia_commons'] += 1
-                            else:
-                                results['sources_used']['wikipedia'] += 1
+                            results['sources_used'][source_name] += 1
                             
                             image_found = True
-                            logger.info(f"✅ Added real {image_type} for {figure_name}: {image_url}")
+                            logger.info(f"✅ Added real {image_type} for {figure_name}: {file_title}")
                             break
                             
                     except Exception as e:
@@ -323,30 +318,57 @@ class MultiSourceImageRetrievalService:
             # Progress update
             if results['processed'] % 10 == 0:
                 logger.info(f"Progress: {results['processed']}/{results['total_figures']} figures processed")
-            
-            # Rate limiting
-            time.sleep(0.5)
         
+        self.resolve_image_urls(results)
         return results
+    
+    def resolve_image_urls(self, results: Dict):
+        """Resolve every found File: title to real URLs with bulk imageinfo requests"""
+        pending = [
+            (image_type, image_data)
+            for figure_result in results['figures']
+            for image_type, images in figure_result['images'].items()
+            for image_data in images
+            if image_data.get('fileTitle') and not image_data.get('url')
+        ]
+        if not pending:
+            return
+        
+        titles = [image_data['fileTitle'] for _, image_data in pending]
+        logger.info(f"Resolving {len(set(titles))} Commons files in bulk")
+        try:
+            infos = resolve_imageinfo(self.session, titles, thumb_width=self.thumb_width)
+        except Exception as e:
+            logger.error(f"Bulk imageinfo lookup failed: {e}")
+            infos = {}
+        
+        for image_type, image_data in pending:
+            info = infos.get(image_data['fileTitle'])
+            if info:
+                image_data['url'] = info.get('thumb_url') or info['url']
+                image_data['originalUrl'] = info['url']
+                image_data['width'] = info['width']
+                image_data['height'] = info['height']
+                image_data['licensing'] = info['license']
+                continue
+            
+            # Unresolvable (e.g. a local, non-Commons Wikipedia file): use the fallback
+            logger.warning(f"Could not resolve {image_data['fileTitle']}, using fallback")
+            results['sources_used'][image_data['source_name']] -= 1
+            results['sources_used']['fallback'] += 1
+            image_data.update({
+                'url': self.placeholder_images.get(image_type, self.placeholder_images['achievements']),
+                'source': 'Fallback',
+                'licensing': 'Public Domain',
+                'reliability': 'Low',
+                'priority': 10,
+                'source_name': 'fallback'
+            })
 
 def load_figures_data() -> List[Dict]:
     """Load historical figures data from file"""
     try:
-        with open('OrbGameInfluentialPeopleSeeds', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Parse the JSON structure
-        figures = []
-        for category, epochs in data.items():
-            for epoch, people in epochs.items():
-                for person in people:
-                    figures.append({
-                        'name': person['name'],
-                        'figureName': person['name'],
-                        'category': category,
-                        'epoch': epoch,
-                        'context': person.get('context', '')
-                    })
+        figures = load_catalog().figure_list()
         
         logger.info(f"Loaded {len(figures)} historical figures from JSON data")
         return figures
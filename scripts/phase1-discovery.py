@@ -8,6 +8,8 @@ import json
 import sys
 from pathlib import Path
 
+from image_pipeline.jsonl import JsonlWriter
+
 def load_historical_figures():
     """Load historical figures from JSON file"""
     try:
@@ -55,33 +57,21 @@ def generate_search_queries(figure_name, category, achievement):
         ]
     }
 
-def main():
-    """Main execution function"""
-    print("🔍 Phase 1: Discovery & Preparation")
-    print("=" * 40)
-    
-    # Load historical figures
-    print("📖 Loading historical figures...")
-    data = load_historical_figures()
-    
-    # Extract search targets
-    search_targets = []
-    total_figures = 0
-    
+def iter_search_targets(data):
+    """Yield one search target per figure in the historical figures data"""
     for category, epochs in data.items():
         if category == "metadata":
             continue
             
         for epoch, figures in epochs.items():
             for figure in figures:
-                total_figures += 1
                 figure_name = figure["name"]
                 achievement = figure["achievement"]
                 
                 # Generate search queries for each image type
                 queries = generate_search_queries(figure_name, category, achievement)
                 
-                search_target = {
+                yield {
                     "name": figure_name,
                     "category": category,
                     "epoch": epoch,
@@ -89,13 +79,32 @@ def main():
                     "queries": queries,
                     "priority": "high" if figure_name in ["Archimedes", "Albert Einstein", "Leonardo da Vinci"] else "medium"
                 }
-                
-                search_targets.append(search_target)
+
+def main():
+    """Main execution function"""
+    print("🔍 Phase 1: Discovery & Preparation")
+    print("=" * 40)
     
-    # Save search targets
-    output_file = "search_targets.json"
-    with open(output_file, "w") as f:
-        json.dump(search_targets, f, indent=2)
+    # Load historical figures
+    print("📖 Loading historical figures...")
+    data = load_historical_figures()
+    
+    # Extract search targets, one JSONL record per figure
+    output_file = "search_targets.jsonl"
+    writer = JsonlWriter(output_file)
+    sample = None
+    categories = set()
+    epochs_seen = set()
+    total_figures = 0
+    
+    for search_target in iter_search_targets(data):
+        total_figures += 1
+        writer.write(search_target)
+        sample = sample or search_target
+        categories.add(search_target["category"])
+        epochs_seen.add(search_target["epoch"])
+    
+    writer.close()
     
     # Generate summary
     print(f"✅ Extracted {total_figures} figures")
@@ -103,7 +112,6 @@ def main():
     
     # Show sample queries
     print("\n📋 Sample search queries:")
-    sample = search_targets[0]  # First figure
     print(f"Figure: {sample['name']}")
     print(f"Category: {sample['category']}")
     print(f"Epoch: {sample['epoch']}")
@@ -112,13 +120,10 @@ def main():
         print(f"  {img_type}: {queries[0]}")  # Show first query for each type
     
     # Generate coverage summary
-    categories = set(target['category'] for target in search_targets)
-    epochs = set(target['epoch'] for target in search_targets)
-    
     print(f"\n📊 Coverage Summary:")
     print(f"  Total Figures: {total_figures}")
     print(f"  Categories: {len(categories)} ({', '.join(sorted(categories))})")
-    print(f"  Epochs: {len(epochs)} ({', '.join(sorted(epochs))})")
+    print(f"  Epochs: {len(epochs_seen)} ({', '.join(sorted(epochs_seen))})")
     print(f"  Queries per Figure: 20 (5 types × 4 queries each)")
     print(f"  Total Queries: {total_figures * 20}")
     
@@ -14,25 +14,49 @@ Key improvements:
 - Fixed User-Agent policy compliance
 - Broader search terms (figure name only, not restrictive)
 - Multiple fallback sources
-- Better error handling and retry logic
+- Better error handling; transient failures are retried by the session (urllib3 Retry)
 - Detailed logging for debugging
+- Optional concurrent acquisition mode (--concurrency N) with per-host caps:
+  asyncio schedules the work, but every request is still a blocking
+  requests call run in a worker thread (this is not async I/O)
+- Results are streamed to raw_image_metadata_final.jsonl, one line per figure
+- Completed figures are journaled (fsynced); --resume skips them after a crash
 """
 
-import json
-import requests
-import time
+import argparse
+import asyncio
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlparse
 import re
 from tqdm import tqdm
 
+from image_pipeline.checkpoint import CheckpointJournal
+from image_pipeline.commons import COMMONS_API, is_image_title, resolve_imageinfo
+from image_pipeline.http_cache import with_response_cache
+from image_pipeline.http_session import API_ACCEPT, create_session
+from image_pipeline.jsonl import JsonlWriter, find_input, read_records
+from image_pipeline.rate_limiter import RateLimitedSession
+from image_pipeline.wikidata import WikidataPortraitResolver
+
 # Configuration
 SEARCH_LIMIT = 10
-RETRY_ATTEMPTS = 3
-DELAY_BETWEEN_REQUESTS = 1  # seconds
 DOWNLOAD_DIR = "downloaded_images"
+CHECKPOINT_FILE = "raw_image_metadata_final.progress.jsonl"
+IMAGE_TYPES = ["portrait", "achievement", "invention", "artifact"]
+
+# Concurrent mode: maximum in-flight requests per host
+HOST_CONCURRENCY = {
+    "query.wikidata.org": 4,
+    "commons.wikimedia.org": 8,
+    "en.wikipedia.org": 8,
+    "api.si.edu": 4,
+    "upload.wikimedia.org": 8,
+}
+DEFAULT_HOST_CONCURRENCY = 4
 
 # User-Agent for Wikimedia compliance
 USER_AGENT = "OrbGame-ImageRetrieval/1.0 (https://orbgame.us; contact@orbgame.us) Python/3.x"
@@ -43,65 +67,41 @@ def setup_directories():
     print(f"📁 Download directory: {DOWNLOAD_DIR}")
 
 def load_search_targets():
-    """Load the search targets from Phase 1"""
-    try:
-        with open('search_targets.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Error: search_targets.json not found")
+    """Load the search targets from Phase 1 (search_targets.jsonl or legacy .json)"""
+    input_file = find_input("search_targets.json")
+    if not input_file:
+        print("❌ Error: search_targets.jsonl not found")
         print("Please run phase1-discovery.py first")
         sys.exit(1)
+    return list(read_records(input_file))
 
-def get_session():
-    """Create a session with proper headers"""
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': USER_AGENT,
-        'Accept': 'application/json, text/html, */*',
-        'Accept-Language': 'en-US,en;q=0.9',
-    })
-    return session
+def get_session(pool_size=10, cache_path=None):
+    """Create a pooled session with proper headers"""
+    session = create_session(user_agent=USER_AGENT, accept=API_ACCEPT, pool_size=pool_size)
+    # Pace every request with the shared per-host token buckets;
+    # cached API responses never reach the network (or the limiter)
+    return with_response_cache(RateLimitedSession(session), cache_path)
 
-def get_wikidata_portrait(figure_name, session):
-    """Get portrait image from Wikidata using P18 property"""
+def get_wikidata_portrait(figure_name, resolver):
+    """Get portrait image from Wikidata using P18 property (batched via resolver)"""
     try:
-        # SPARQL query to find portrait image
-        query = f"""
-        SELECT ?image WHERE {{
-          ?person rdfs:label "{figure_name}"@en.
-          ?person wdt:P18 ?image.
-        }}
-        LIMIT 1
-        """
-        
-        url = 'https://query.wikidata.org/sparql'
-        params = {
-            'format': 'json',
-            'query': query
-        }
-        
-        response = session.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
-        results = data.get('results', {}).get('bindings', [])
-        
-        if results:
-            image_url = results[0]['image']['value']
+        match = resolver.get(figure_name)
+        if match:
             return {
-                'url': image_url,
+                'url': match['image'],
                 'source': 'Wikidata',
                 'type': 'portrait',
                 'license': 'public domain',
-                'title': f"{figure_name} portrait"
+                'title': f"{figure_name} portrait",
+                'wikidata_id': match['qid']
             }
     except Exception as e:
         print(f"⚠️ Wikidata search failed for '{figure_name}': {e}")
     
     return None
 
-def search_commons_broader(figure_name, image_type, session):
-    """Search Wikimedia Commons with broader terms"""
+def search_commons_titles(figure_name, image_type, session, term_cache=None):
+    """Search Wikimedia Commons with broader terms, returning (term, File: titles)"""
     try:
         # Try different search strategies
         search_terms = [
@@ -111,47 +111,110 @@ def search_commons_broader(figure_name, image_type, session):
         ]
         
         for term in search_terms:
-            url = "https://commons.wikimedia.org/w/api.php"
-            params = {
-                "action": "query",
-                "format": "json",
-                "generator": "search",
-                "gsrsearch": term,
-                "gsrlimit": SEARCH_LIMIT,
-                "prop": "imageinfo",
-                "iiprop": "url|extmetadata|size|mime"
-            }
-            
-            response = session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            if "query" in data and "pages" in data["query"]:
-                results = []
-                for page_id, page in data["query"]["pages"].items():
-                    if "imageinfo" in page and page["imageinfo"][0].get("mime", "").startswith("image/"):
-                        info = page["imageinfo"][0]
-                        license_info = info.get("extmetadata", {}).get("LicenseShortName", {}).get("value", "Unknown")
-                        
-                        # Accept any license for now (we can filter later)
-                        results.append({
-                            "url": info["url"],
-                            "title": page["title"],
-                            "source": "Wikimedia Commons",
-                            "license": license_info,
-                            "size": info.get("size", 0),
-                            "mime": info.get("mime", ""),
-                            "type": image_type,
-                            "query": term
-                        })
+            # The name-only terms are shared by every image type
+            if term_cache is not None and term in term_cache:
+                titles = term_cache[term]
+            else:
+                url = COMMONS_API
+                params = {
+                    "action": "query",
+                    "format": "json",
+                    "list": "search",
+                    "srsearch": term,
+                    "srnamespace": 6,  # File namespace
+                    "srlimit": SEARCH_LIMIT
+                }
                 
-                if results:
-                    return results
+                response = session.get(url, params=params, timeout=30)
+                response.raise_for_status()
+                
+                data = response.json()
+                titles = [hit["title"] for hit in data.get("query", {}).get("search", [])
+                          if is_image_title(hit["title"])]
+                if term_cache is not None:
+                    term_cache[term] = titles
+            
+            if titles:
+                return term, titles
         
     except Exception as e:
         print(f"⚠️ Commons search failed for '{figure_name}': {e}")
     
-    return []
+    return None, []
+
+def commons_results(hits, infos):
+    """Build image records for {image_type: (term, titles)} from resolved imageinfo"""
+    results = {}
+    for image_type, (term, type_titles) in hits.items():
+        results[image_type] = []
+        for title in type_titles:
+            info = infos.get(title)
+            if info and info["mime"].startswith("image/"):
+                # Accept any license for now (we can filter later)
+                results[image_type].append({
+                    "url": info["url"],
+                    "title": info["title"],
+                    "source": "Wikimedia Commons",
+                    "license": info["license"],
+                    "size": info["size"],
+                    "mime": info["mime"],
+                    "type": image_type,
+                    "query": term
+                })
+    return results
+
+class CommonsImageIndex:
+    """
+    Commons search hits for many figures, with imageinfo for every hit title
+    resolved in shared 50-title requests instead of one request per figure.
+    `prefetch` searches a batch of figures (in parallel with `workers`)
+    before resolving; `images` falls back to a one-figure prefetch.
+    """
+    
+    def __init__(self, session, image_types=IMAGE_TYPES):
+        self.session = session
+        self.image_types = image_types
+        self.hits = {}   # figure name -> {image_type: (term, titles)}
+        self.infos = {}  # File: title -> imageinfo record or None
+        self.lock = threading.Lock()
+    
+    def _search(self, figure_name):
+        term_cache = {}
+        return figure_name, {
+            image_type: search_commons_titles(figure_name, image_type, self.session, term_cache)
+            for image_type in self.image_types
+        }
+    
+    def prefetch(self, figure_names, workers=1):
+        with self.lock:
+            names = [name for name in dict.fromkeys(figure_names) if name not in self.hits]
+        if not names:
+            return
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                searched = list(executor.map(self._search, names))
+        else:
+            searched = [self._search(name) for name in names]
+        
+        titles = [title for _, hits in searched for _, type_titles in hits.values() for title in type_titles]
+        with self.lock:
+            titles = [title for title in dict.fromkeys(titles) if title not in self.infos]
+        infos = {}
+        if titles:
+            try:
+                infos = resolve_imageinfo(self.session, titles)
+            except Exception as e:
+                print(f"⚠️ Commons imageinfo lookup failed for {len(titles)} files: {e}")
+        with self.lock:
+            self.infos.update(infos)
+            self.hits.update(searched)
+    
+    def images(self, figure_name):
+        """{image_type: [image records]} for a figure"""
+        if figure_name not in self.hits:
+            self.prefetch([figure_name])
+        with self.lock:
+            return commons_results(self.hits[figure_name], self.infos)
 
 def scrape_wikipedia_images(figure_name, session):
     """Scrape Wikipedia page for images"""
@@ -230,28 +293,23 @@ def search_smithsonian_api(figure_name, image_type, session):
     return []
 
 def download_image(url, filename, session):
-    """Download an image with retry logic"""
-    for attempt in range(RETRY_ATTEMPTS):
-        try:
-            response = session.get(url, timeout=30, stream=True)
-            response.raise_for_status()
-            
-            filepath = os.path.join(DOWNLOAD_DIR, filename)
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            return filepath
-            
-        except Exception as e:
-            if attempt == RETRY_ATTEMPTS - 1:
-                print(f"❌ Failed to download {url}: {e}")
-                return None
-            time.sleep(1)
-    
-    return None
+    """Download an image; the session's urllib3 Retry handles transient failures"""
+    try:
+        response = session.get(url, timeout=30, stream=True)
+        response.raise_for_status()
+        
+        filepath = os.path.join(DOWNLOAD_DIR, filename)
+        with open(filepath, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+        
+        return filepath
+        
+    except Exception as e:
+        print(f"❌ Failed to download {url}: {e}")
+        return None
 
-def process_figure(figure_data, session):
+def process_figure(figure_data, session, resolver, commons):
     """Process a single figure with multiple strategies"""
     figure_name = figure_data["name"]
     category = figure_data["category"]
@@ -263,15 +321,15 @@ def process_figure(figure_data, session):
     
     # Strategy 1: Wikidata for portraits
     print("  📸 Trying Wikidata for portrait...")
-    portrait = get_wikidata_portrait(figure_name, session)
+    portrait = get_wikidata_portrait(figure_name, resolver)
     if portrait:
         all_images.append(portrait)
         print(f"    ✅ Found portrait from Wikidata")
     
     # Strategy 2: Wikimedia Commons with broader search
-    for image_type in ["portrait", "achievement", "invention", "artifact"]:
-        print(f"  📸 Searching Commons for {image_type}...")
-        commons_images = search_commons_broader(figure_name, image_type, session)
+    print("  📸 Searching Commons...")
+    commons_by_type = commons.images(figure_name)
+    for image_type, commons_images in commons_by_type.items():
         if commons_images:
             all_images.extend(commons_images)
             print(f"    ✅ Found {len(commons_images)} {image_type} images from Commons")
@@ -294,57 +352,205 @@ def process_figure(figure_data, session):
     # Download images
     downloaded_images = []
     for i, img in enumerate(all_images):
-        # Create filename
-        safe_name = re.sub(r'[^a-zA-Z0-9]', '_', figure_name)
-        filename = f"{safe_name}_{img['type']}_{i}.jpg"
-        
         # Download image
-        filepath = download_image(img["url"], filename, session)
+        filepath = download_image(img["url"], image_filename(figure_name, img, i), session)
         if filepath:
             img["local_path"] = filepath
             downloaded_images.append(img)
     
     print(f"    📊 Found {len(all_images)} images, downloaded {len(downloaded_images)}")
     
+    return figure_result(figure_data, all_images, downloaded_images)
+
+def image_filename(figure_name, img, index):
+    """Build the download filename for the index-th image of a figure"""
+    safe_name = re.sub(r'[^a-zA-Z0-9]', '_', figure_name)
+    return f"{safe_name}_{img['type']}_{index}.jpg"
+
+def figure_result(figure_data, all_images, downloaded_images):
+    """Build the raw_image_metadata_final.json record for a figure"""
     return {
-        "figure_name": figure_name,
-        "category": category,
-        "epoch": epoch,
+        "figure_name": figure_data["name"],
+        "category": figure_data["category"],
+        "epoch": figure_data["epoch"],
         "total_found": len(all_images),
         "total_downloaded": len(downloaded_images),
         "images": downloaded_images
     }
 
+class HostLimiter:
+    """Per-host concurrency caps for the concurrent (thread-backed) acquisition mode"""
+    
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.semaphores = {}
+    
+    async def run(self, url, func, *args):
+        """Run a blocking request helper in a worker thread under its host's cap"""
+        host = urlparse(url).netloc
+        if host not in self.semaphores:
+            limit = min(HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY), self.concurrency)
+            self.semaphores[host] = asyncio.Semaphore(limit)
+        
+        async with self.semaphores[host]:
+            return await asyncio.to_thread(func, *args)
+
+async def process_figure_async(figure_data, session, resolver, commons, limiter):
+    """Process a single figure, fanning out all strategies concurrently"""
+    figure_name = figure_data["name"]
+    
+    # Strategies 1, 2 and 4 are independent of each other
+    portrait, smithsonian_images, commons_by_type = await asyncio.gather(
+        limiter.run("https://query.wikidata.org/sparql", get_wikidata_portrait, figure_name, resolver),
+        limiter.run("https://api.si.edu/", search_smithsonian_api, figure_name, "artifact", session),
+        limiter.run(COMMONS_API, commons.images, figure_name)
+    )
+    
+    # Keep the serial ordering so filenames and indexes match process_figure
+    all_images = []
+    if portrait:
+        all_images.append(portrait)
+    for commons_images in commons_by_type.values():
+        all_images.extend(commons_images)
+    
+    # Strategy 3 only runs when no portrait was found
+    if not any(img["type"] == "portrait" for img in all_images):
+        wiki_images = await limiter.run("https://en.wikipedia.org/", scrape_wikipedia_images, figure_name, session)
+        all_images.extend(wiki_images)
+    
+    all_images.extend(smithsonian_images)
+    
+    # Download images concurrently, preserving order
+    filepaths = await asyncio.gather(*[
+        limiter.run(img["url"], download_image, img["url"], image_filename(figure_name, img, i), session)
+        for i, img in enumerate(all_images)
+    ])
+    
+    downloaded_images = []
+    for img, filepath in zip(all_images, filepaths):
+        if filepath:
+            img["local_path"] = filepath
+            downloaded_images.append(img)
+    
+    return figure_result(figure_data, all_images, downloaded_images)
+
+def figure_key(figure_data):
+    """Checkpoint journal key for a search target"""
+    return figure_data["name"], figure_data["category"], figure_data["epoch"]
+
+async def process_figures_async(search_targets, session, resolver, commons, concurrency, on_result, journal):
+    """
+    Process all figures with up to `concurrency` figures in flight, passing
+    each result to on_result in input order as soon as its predecessors are done.
+    Figures already in the journal are replayed instead of processed.
+    The event loop only schedules work: each blocking request runs in a
+    thread from a pool of `concurrency` workers.
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    
+    limiter = HostLimiter(concurrency)
+    figure_slots = asyncio.Semaphore(concurrency)
+    progress = tqdm(total=len(search_targets), desc="Processing figures")
+    finished = {}
+    next_index = 0
+    
+    async def run_figure(index, figure_data):
+        nonlocal next_index
+        if journal.done(*figure_key(figure_data)):
+            finished[index] = journal.get(*figure_key(figure_data))
+        else:
+            async with figure_slots:
+                finished[index] = await process_figure_async(figure_data, session, resolver, commons, limiter)
+            journal.record(*figure_key(figure_data), data=finished[index])
+        progress.update(1)
+        # Emit in input order, so the output matches the serial run
+        while next_index in finished:
+            on_result(finished.pop(next_index))
+            next_index += 1
+    
+    try:
+        await asyncio.gather(*[run_figure(i, figure_data) for i, figure_data in enumerate(search_targets)])
+    finally:
+        progress.close()
+
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Phase 2 (Final): Multi-Source Image Acquisition")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="Process up to N figures concurrently in worker threads (default: serial)")
+    parser.add_argument("--http-cache", metavar="PATH",
+                        help="Cache search API responses in this SQLite file (or set ORB_HTTP_CACHE)")
+    parser.add_argument("--test", action="store_true", help="Test with first 5 figures only")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Reuse figures already recorded in {CHECKPOINT_FILE}")
+    args = parser.parse_args()
+    
     print("🔍 Phase 2 (Final): Multi-Source Image Acquisition")
     print("=" * 60)
     
     # Setup
     setup_directories()
     search_targets = load_search_targets()
-    session = get_session()
+    if args.test:
+        search_targets = search_targets[:5]
     
     print(f"📖 Processing {len(search_targets)} figures...")
     
-    # Process each figure
-    results = []
-    for i, figure_data in enumerate(tqdm(search_targets, desc="Processing figures")):
-        result = process_figure(figure_data, session)
-        results.append(result)
-        
-        # Add delay to be respectful to APIs
-        time.sleep(DELAY_BETWEEN_REQUESTS)
+    pool_size = args.concurrency if args.concurrency > 0 else 10
+    session = get_session(pool_size=pool_size, cache_path=args.http_cache)
+    
+    # Resolve every Wikidata portrait up front in a handful of batched queries
+    print("📸 Resolving Wikidata portraits in batches...")
+    resolver = WikidataPortraitResolver(session)
+    portraits = resolver.resolve([figure_data["name"] for figure_data in search_targets])
+    print(f"    ✅ {sum(1 for match in portraits.values() if match)} figures have a Wikidata portrait")
+    
+    # The output is rewritten in full; journaled figures are copied, not re-fetched
+    journal = CheckpointJournal(CHECKPOINT_FILE, resume=args.resume)
+    if args.resume:
+        print(f"♻️ Resuming: {len(journal)} figures already completed")
+    pending = [figure_data["name"] for figure_data in search_targets if not journal.done(*figure_key(figure_data))]
     
-    # Save results
-    output_file = "raw_image_metadata_final.json"
-    with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
+    # Search Commons for every pending figure, then resolve all hit files in 50-title requests
+    print("📸 Searching Wikimedia Commons...")
+    commons = CommonsImageIndex(session)
+    commons.prefetch(pending, workers=max(args.concurrency, 1))
+    print(f"    ✅ {sum(1 for info in commons.infos.values() if info)} Commons files resolved")
+    
+    # Each result is written as soon as it is final; only counters stay in memory
+    output_file = "raw_image_metadata_final.jsonl"
+    writer = JsonlWriter(output_file)
+    totals = {"found": 0, "downloaded": 0, "figures_with_images": 0}
+    
+    def save_result(result):
+        writer.write(result)
+        totals["found"] += result["total_found"]
+        totals["downloaded"] += result["total_downloaded"]
+        if result["total_downloaded"] > 0:
+            totals["figures_with_images"] += 1
+    
+    try:
+        if args.concurrency > 0:
+            print(f"⚡ Concurrent mode: {args.concurrency} figures in flight (thread pool)")
+            asyncio.run(process_figures_async(search_targets, session, resolver, commons, args.concurrency, save_result, journal))
+        else:
+            # Process each figure
+            for i, figure_data in enumerate(tqdm(search_targets, desc="Processing figures")):
+                if journal.done(*figure_key(figure_data)):
+                    save_result(journal.get(*figure_key(figure_data)))
+                    continue
+                result = process_figure(figure_data, session, resolver, commons)
+                journal.record(*figure_key(figure_data), data=result)
+                save_result(result)
+    finally:
+        writer.close()
+        journal.close()
     
     # Summary
-    total_found = sum(r["total_found"] for r in results)
-    total_downloaded = sum(r["total_downloaded"] for r in results)
-    figures_with_images = sum(1 for r in results if r["total_downloaded"] > 0)
+    total_found = totals["found"]
+    total_downloaded = totals["downloaded"]
+    figures_with_images = totals["figures_with_images"]
     
     print("\n" + "=" * 60)
     print("📊 PHASE 2 (FINAL) SUMMARY")
@@ -356,6 +562,9 @@ def main():
     print(f"Average Images per Figure: {total_downloaded/len(search_targets):.1f}")
     print(f"Metadata Saved: {output_file}")
     print(f"Images Directory: {DOWNLOAD_DIR}")
+    if hasattr(session, "stats"):
+        print(f"HTTP Cache: {session.stats['hits']} hits, {session.stats['revalidated']} revalidated, "
+              f"{session.stats['misses']} misses")
     
     if total_downloaded > 0:
         print("\n🎯 Next step: Run phase3-validation.py to filter and categorize images")
@@ -28,6 +28,8 @@ from urllib.parse import quote_plus
 import re
 from tqdm import tqdm
 
+from image_pipeline.jsonl import find_input, read_records
+
 # Configuration
 SEARCH_LIMIT = 10
 RETRY_ATTEMPTS = 3
@@ -41,11 +43,11 @@ def setup_directories():
 
 def load_search_targets():
     """Load the search targets from Phase 1"""
-    try:
-        with open('search_targets.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Error: search_targets.json not found")
+    input_file = find_input("search_targets.json")
+    if input_file:
+        return list(read_records(input_file))
+    else:
+        print("❌ Error: search_targets.jsonl not found")
         print("Please run phase1-discovery.py first")
         sys.exit(1)
 
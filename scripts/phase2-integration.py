@@ -6,13 +6,14 @@ Query Wikimedia Commons API for each figure and download relevant images
 
 import requests
 import json
-import os
 import time
 import sys
 from pathlib import Path
 from urllib.parse import quote
 import hashlib
 
+from image_pipeline.jsonl import find_input, read_records
+
 # Configuration
 SEARCH_LIMIT = 3  # Number of images per query
 DOWNLOAD_DIR = "downloaded_images"
@@ -107,15 +108,15 @@ def main():
     print("=" * 50)
     
     # Check if search targets exist
-    if not os.path.exists("search_targets.json"):
-        print("❌ Error: search_targets.json not found")
+    search_targets_file = find_input("search_targets.json")
+    if not search_targets_file:
+        print("❌ Error: search_targets.jsonl not found")
         print("Please run phase1-discovery.py first")
         sys.exit(1)
     
     # Load search targets
     print("📖 Loading search targets...")
-    with open("search_targets.json", "r") as f:
-        search_targets = json.load(f)
+    search_targets = list(read_records(search_targets_file))
     
     # Create download directory
     download_dir = Path(DOWNLOAD_DIR)
@@ -8,54 +8,79 @@ This script processes the nested metadata structure from Phase 2:
 - Removes duplicates and low-quality images
 - Categorizes images properly
 - Prepares for MongoDB storage
+
+Duplicates are found with 64-bit pHash/dHash values computed in NumPy
+batches and a BK-tree Hamming index over the whole corpus, so resized or
+re-encoded copies from different sources are caught, not just exact matches.
+
+Figures are inspected in batches of about --chunk-size images, read straight
+from the input stream. Use --workers N to validate, measure and hash the
+batches in a process pool (at most 2N in flight); results are merged in input
+order, so the output is identical to a serial run.
+
+Input and outputs are JSONL (one record per line), streamed figure by figure;
+scripts/export-phase-json.py converts them back to the old JSON arrays.
 """
 
-import json
+import argparse
 import os
 import sys
 from pathlib import Path
-from PIL import Image
-import hashlib
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 
-def is_valid_image(path):
-    """Check if image file is valid - keeping all images"""
-    try:
-        with Image.open(path) as img:
-            # Check if image can be opened
-            img.verify()
-            
-            # Reopen for size checking (just for info, not validation)
-            with Image.open(path) as img:
-                width, height = img.size
-                
-                # Accept all images regardless of size, aspect ratio, or file size
-                return True, f"Valid ({width}x{height})"
-                
-    except Exception as e:
-        return False, f"Invalid image: {e}"
+from image_pipeline.jsonl import JsonlWriter, find_input, read_records
+from image_pipeline.phash import DEFAULT_MAX_DISTANCE, BKTree, from_hex, hamming
+from image_pipeline.validation import inspect_chunk
 
-def calculate_image_hash(path):
-    """Calculate perceptual hash for deduplication"""
-    try:
-        with Image.open(path) as img:
-            # Convert to grayscale and resize for consistent hashing
-            img = img.convert('L').resize((8, 8), Image.Resampling.LANCZOS)
-            
-            # Calculate average pixel value
-            pixels = list(img.getdata())
-            avg = sum(pixels) / len(pixels)
-            
-            # Create binary hash
-            bits = ''.join(['1' if pixel > avg else '0' for pixel in pixels])
-            
-            return bits
-            
-    except Exception:
-        return None
+DEFAULT_CHUNK_SIZE = 64
+
+def figure_batches(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Group consecutive figures into batches of about `chunk_size` distinct existing image paths"""
+    figures, paths = [], {}
+    for figure_data in records:
+        figures.append(figure_data)
+        for img in figure_data.get("images", []):
+            if img.get("local_path") and os.path.exists(img["local_path"]):
+                paths[img["local_path"]] = None
+        if len(paths) >= chunk_size:
+            yield figures, list(paths)
+            figures, paths = [], {}
+    if figures:
+        yield figures, list(paths)
 
-def process_figure_images(figure_data):
-    """Process images for a single figure"""
+def inspect_figures(records, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield (figure_data, {path: report}) in input order. Each file is opened
+    once per batch; with workers > 1 batches run in a process pool with at
+    most 2 * workers batches in flight, so memory stays bounded.
+    """
+    batches = figure_batches(records, chunk_size)
+    if workers <= 1:
+        for figures, paths in batches:
+            reports = dict(zip(paths, inspect_chunk(paths)))
+            for figure_data in figures:
+                yield figure_data, reports
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        
+        def drain_one():
+            figures, paths, future = pending.popleft()
+            reports = dict(zip(paths, future.result()))
+            for figure_data in figures:
+                yield figure_data, reports
+        
+        for figures, paths in batches:
+            pending.append((figures, paths, executor.submit(inspect_chunk, paths)))
+            if len(pending) >= 2 * workers:
+                yield from drain_one()
+        while pending:
+            yield from drain_one()
+
+def process_figure_images(figure_data, reports):
+    """Process images for a single figure (duplicate content is removed later)"""
     figure_name = figure_data["figure_name"]
     category = figure_data["category"]
     epoch = figure_data["epoch"]
@@ -65,7 +90,6 @@ def process_figure_images(figure_data):
     
     valid_images = []
     seen_urls = set()
-    seen_hashes = set()
     
     for img in images:
         local_path = img.get("local_path")
@@ -80,19 +104,14 @@ def process_figure_images(figure_data):
             continue
         seen_urls.add(url)
         
-        # Validate image quality
-        is_valid, reason = is_valid_image(local_path)
-        if not is_valid:
-            print(f"    ❌ Invalid image: {reason}")
+        # Validate image quality (a path missing from the inspected batch counts as invalid)
+        report = reports.get(local_path)
+        if report is None:
+            print(f"    ❌ Not inspected: {local_path}")
             continue
-        
-        # Check for duplicate content (perceptual hash)
-        img_hash = calculate_image_hash(local_path)
-        if img_hash and img_hash in seen_hashes:
-            print(f"    ❌ Duplicate content: {local_path}")
+        if not report["valid"]:
+            print(f"    ❌ {report['reason']}")
             continue
-        if img_hash:
-            seen_hashes.add(img_hash)
         
         # Add to valid images
         valid_img = {
@@ -105,7 +124,10 @@ def process_figure_images(figure_data):
             "license": img.get("license", "Unknown"),
             "title": img.get("title", ""),
             "local_path": local_path,
-            "hash": img_hash
+            "width": report["width"],
+            "height": report["height"],
+            "hash": report.get("phash"),
+            "dhash": report.get("dhash")
         }
         valid_images.append(valid_img)
         print(f"    ✅ Valid image: {os.path.basename(local_path)}")
@@ -113,18 +135,92 @@ def process_figure_images(figure_data):
     print(f"    📊 Summary: {len(images)} total, {len(valid_images)} valid")
     return valid_images
 
+class NearDuplicateFilter:
+    """
+    Drop near-duplicates using the pHash/dHash values from inspection.
+    
+    pHash must be within max_distance bits and dHash within twice that. With
+    scope="figure" only copies under the same figure are dropped; matches
+    under other figures are kept and annotated with `near_duplicate_of`.
+    With scope="corpus" the first occurrence anywhere wins. The BK-tree index
+    spans every figure filtered so far.
+    """
+    
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, scope="figure"):
+        self.max_distance = max_distance
+        self.scope = scope
+        self.index = BKTree()
+        self.dropped = 0
+        self.cross_figure = 0
+    
+    def filter(self, images):
+        kept = []
+        for img in images:
+            if not img["hash"]:
+                kept.append(img)
+                continue
+            
+            phash, dhash = from_hex(img["hash"]), from_hex(img["dhash"])
+            figure_key = (img["figure_name"], img["category"], img["epoch"])
+            
+            matches = [
+                other for _, _, other in self.index.search(phash, self.max_distance)
+                if hamming(dhash, other["dhash_value"]) <= self.max_distance * 2
+            ]
+            same_figure = [m for m in matches if m["figure_key"] == figure_key]
+            original = same_figure[0] if same_figure else (matches[0] if matches and self.scope == "corpus" else None)
+            
+            if original:
+                print(f"    ❌ Near-duplicate of {os.path.basename(original['local_path'])}: {img['local_path']}")
+                self.dropped += 1
+                continue
+            if matches:
+                img["near_duplicate_of"] = matches[0]["local_path"]
+                self.cross_figure += 1
+            
+            self.index.add(phash, {"figure_key": figure_key, "local_path": img["local_path"], "dhash_value": dhash})
+            kept.append(img)
+        return kept
+
+def grouped_record(figure_name, category, epoch, images):
+    """Build the grouped_images_for_mongodb record for one figure"""
+    return {
+        "figure_name": figure_name,
+        "category": category,
+        "epoch": epoch,
+        "images": images,
+        "total_images": len(images),
+        "coverage": {
+            "portrait": len([img for img in images if img["type"] == "portrait"]),
+            "achievement": len([img for img in images if img["type"] == "achievement"]),
+            "invention": len([img for img in images if img["type"] == "invention"]),
+            "artifact": len([img for img in images if img["type"] == "artifact"])
+        }
+    }
+
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Phase 3 (Final): Validation & Categorization")
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help=f"Maximum pHash Hamming distance for near-duplicates (default: {DEFAULT_MAX_DISTANCE})")
+    parser.add_argument("--dedup-scope", choices=["figure", "corpus"], default="figure",
+                        help="Drop near-duplicates within each figure only, or across the whole corpus")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for validation and hashing (default: 1, serial)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Images per worker task (default: {DEFAULT_CHUNK_SIZE})")
+    args = parser.parse_args()
+    
     print("🔍 Phase 3 (Final): Validation & Categorization")
     print("=" * 60)
     
-    # Check if raw metadata exists
+    # Check if raw metadata exists (.jsonl preferred, legacy .json accepted)
     metadata_files = ["raw_image_metadata_final.json", "raw_image_metadata.json"]
     metadata_file = None
     
     for file in metadata_files:
-        if os.path.exists(file):
-            metadata_file = file
+        metadata_file = find_input(file)
+        if metadata_file:
             break
     
     if not metadata_file:
@@ -132,81 +228,58 @@ def main():
         print("Please run phase2-integration-final.py first")
         sys.exit(1)
     
-    # Load raw image metadata
-    print(f"📖 Loading raw image metadata from {metadata_file}...")
-    with open(metadata_file, "r") as f:
-        raw_figures = json.load(f)
+    print(f"📖 Streaming raw image metadata from {metadata_file} ({max(args.workers, 1)} inspection workers)...")
     
-    print(f"📊 Processing {len(raw_figures)} figures...")
+    # Process all figures, writing each one's results as soon as it is done
+    output_file = "filtered_images.jsonl"
+    grouped_output = "grouped_images_for_mongodb.jsonl"
+    duplicates = NearDuplicateFilter(args.max_distance, args.dedup_scope)
     
-    # Process all figures
-    all_valid_images = []
+    total_figures = 0
     total_images = 0
     total_valid = 0
+    figures_with_images = 0
+    type_counts = defaultdict(int)
+    category_counts = defaultdict(int)
     
-    for figure_data in raw_figures:
-        total_images += len(figure_data.get("images", []))
-        valid_images = process_figure_images(figure_data)
-        all_valid_images.extend(valid_images)
-        total_valid += len(valid_images)
-    
-    # Group images by figure for MongoDB storage
-    figures_with_images = defaultdict(list)
-    for img in all_valid_images:
-        key = (img["figure_name"], img["category"], img["epoch"])
-        figures_with_images[key].append(img)
-    
-    # Save filtered images
-    output_file = "filtered_images.json"
-    with open(output_file, "w") as f:
-        json.dump(all_valid_images, f, indent=2)
-    
-    # Save grouped images for MongoDB
-    grouped_output = "grouped_images_for_mongodb.json"
-    grouped_data = []
-    for (figure_name, category, epoch), images in figures_with_images.items():
-        grouped_data.append({
-            "figure_name": figure_name,
-            "category": category,
-            "epoch": epoch,
-            "images": images,
-            "total_images": len(images),
-            "coverage": {
-                "portrait": len([img for img in images if img["type"] == "portrait"]),
-                "achievement": len([img for img in images if img["type"] == "achievement"]),
-                "invention": len([img for img in images if img["type"] == "invention"]),
-                "artifact": len([img for img in images if img["type"] == "artifact"])
-            }
-        })
-    
-    with open(grouped_output, "w") as f:
-        json.dump(grouped_data, f, indent=2)
+    with JsonlWriter(output_file) as filtered_writer, JsonlWriter(grouped_output) as grouped_writer:
+        for figure_data, reports in inspect_figures(read_records(metadata_file), args.workers, args.chunk_size):
+            total_figures += 1
+            total_images += len(figure_data.get("images", []))
+            valid_images = duplicates.filter(process_figure_images(figure_data, reports))
+            
+            for img in valid_images:
+                filtered_writer.write(img)
+                type_counts[img["type"]] += 1
+                category_counts[img["category"]] += 1
+            
+            # Group images by figure for MongoDB storage
+            if valid_images:
+                grouped_writer.write(grouped_record(
+                    figure_data["figure_name"], figure_data["category"], figure_data["epoch"], valid_images
+                ))
+                figures_with_images += 1
+            total_valid += len(valid_images)
     
     # Summary statistics
     print("\n" + "=" * 60)
     print("📊 PHASE 3 (FINAL) SUMMARY")
     print("=" * 60)
-    print(f"Total Figures Processed: {len(raw_figures)}")
+    print(f"Total Figures Processed: {total_figures}")
     print(f"Total Images Found: {total_images}")
     print(f"Total Valid Images: {total_valid}")
     print(f"Success Rate: {(total_valid/total_images*100):.1f}%" if total_images > 0 else "Success Rate: 0.0%")
-    print(f"Figures with Valid Images: {len(figures_with_images)}")
-    print(f"Average Images per Figure: {total_valid/len(raw_figures):.1f}")
+    print(f"Figures with Valid Images: {figures_with_images}")
+    print(f"Average Images per Figure: {total_valid/total_figures:.1f}" if total_figures else "Average Images per Figure: 0.0")
+    print(f"Near-Duplicates Removed: {duplicates.dropped}")
+    print(f"Images Shared Across Figures: {duplicates.cross_figure}")
     
     # Coverage by image type
-    type_counts = defaultdict(int)
-    for img in all_valid_images:
-        type_counts[img["type"]] += 1
-    
     print(f"\n📈 Coverage by Image Type:")
     for img_type, count in type_counts.items():
         print(f"  {img_type.capitalize()}: {count}")
     
     # Coverage by category
-    category_counts = defaultdict(int)
-    for img in all_valid_images:
-        category_counts[img["category"]] += 1
-    
     print(f"\n📈 Coverage by Category:")
     for category, count in category_counts.items():
         print(f"  {category}: {count}")
@@ -11,9 +11,28 @@ from pathlib import Path
 from PIL import Image
 import hashlib
 
+from image_pipeline.jsonl import find_input, read_records
+from image_pipeline.probe import check_dimensions, probe_file
+
 def is_valid_image(path):
     """Check if image file is valid and meets quality standards"""
     try:
+        # Check file size (max 5MB)
+        if os.path.getsize(path) > 5 * 1024 * 1024:  # 5MB
+            return False, "File too large"
+        
+        # Reject on dimensions from the header alone (200..1024 px, ratio 0.3..3.0)
+        probe = probe_file(path)
+        if probe:
+            is_valid, reason = check_dimensions(probe, min_side=200, max_side=1024)
+            if not is_valid:
+                return False, reason
+            
+            # Only the survivors pay for a full integrity check
+            with Image.open(path) as img:
+                img.verify()
+            return True, "Valid"
+        
         with Image.open(path) as img:
             # Check if image can be opened
             img.verify()
@@ -92,8 +111,8 @@ def main():
     metadata_file = None
     
     for file in metadata_files:
-        if os.path.exists(file):
-            metadata_file = file
+        metadata_file = find_input(file)
+        if metadata_file:
             break
     
     if not metadata_file:
@@ -103,8 +122,7 @@ def main():
     
     # Load raw image metadata
     print(f"📖 Loading raw image metadata from {metadata_file}...")
-    with open(metadata_file, "r") as f:
-        raw_images = json.load(f)
+    raw_images = list(read_records(metadata_file))
     
     print(f"📊 Processing {len(raw_images)} raw images...")
     
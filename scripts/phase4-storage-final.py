@@ -8,14 +8,29 @@ This script stores the grouped image data from Phase 3 into MongoDB:
 - Stores images grouped by figure
 - Creates indexes for efficient retrieval
 - Calculates coverage statistics
+
+Figures are upserted with unordered bulk writes, --batch-size documents per
+round-trip (use --batch-size 1 for one write per figure). Each document
+carries a fingerprint of its image list; figures whose fingerprint matches
+the stored one are skipped (--force rewrites everything).
 """
 
-import json
 import sys
-import os
 from datetime import datetime
 from pymongo import MongoClient
 import argparse
+from itertools import islice
+
+from image_pipeline.jsonl import count_records, find_input, read_records
+from image_pipeline.mongo_bulk import (
+    DEFAULT_BATCH_SIZE,
+    FINGERPRINT_FIELD,
+    BulkReplacer,
+    content_fingerprint,
+    fetch_fingerprints,
+)
+
+FIGURE_KEY_FIELDS = ("figureName", "category", "epoch")
 
 def connect_mongodb(mongo_uri):
     """Connect to MongoDB"""
@@ -45,51 +60,89 @@ def calculate_coverage(images):
     
     return coverage
 
-def store_figure_images(collection, figure_data):
-    """Store or update images for a figure"""
-    try:
+def build_figure_document(figure_data):
+    """Return (filter_query, doc) for a figure, or None if it has no images"""
+    figure_name = figure_data["figure_name"]
+    category = figure_data["category"]
+    epoch = figure_data["epoch"]
+    images = figure_data["images"]
+    
+    if not images:
+        return None
+    
+    # Prepare document
+    doc = {
+        "figureName": figure_name,
+        "category": category,
+        "epoch": epoch,
+        "images": images,
+        "lastUpdated": datetime.now(),
+        "totalImages": len(images),
+        "coverage": calculate_coverage(images),
+        FINGERPRINT_FIELD: content_fingerprint(images)
+    }
+    
+    filter_query = {
+        "figureName": figure_name,
+        "category": category,
+        "epoch": epoch
+    }
+    return filter_query, doc
+
+def store_grouped_figures(collection, grouped_data, batch_size=DEFAULT_BATCH_SIZE, force=False, total_figures=None):
+    """
+    Upsert grouped figure records (any iterable, consumed lazily) in bulk,
+    skipping figures whose stored fingerprint matches. Returns counters and
+    the BulkReplacer for reporting.
+    """
+    successful_stores = 0
+    total_images_stored = 0
+    
+    # One projection query instead of a lookup per figure
+    stored_fingerprints = fetch_fingerprints(collection, FIGURE_KEY_FIELDS)
+    change_counts = {"unchanged": 0, "changed": 0, "new": 0}
+    
+    writer = BulkReplacer(collection, batch_size)
+    for i, figure_data in enumerate(grouped_data):
         figure_name = figure_data["figure_name"]
         category = figure_data["category"]
         epoch = figure_data["epoch"]
-        images = figure_data["images"]
-        
-        if not images:
-            print(f"    ⚠️ No images for {figure_name}")
-            return False
         
-        # Calculate coverage
-        coverage = calculate_coverage(images)
-        
-        # Prepare document
-        doc = {
-            "figureName": figure_name,
-            "category": category,
-            "epoch": epoch,
-            "images": images,
-            "lastUpdated": datetime.now(),
-            "totalImages": len(images),
-            "coverage": coverage
-        }
+        progress = f"{i+1}/{total_figures}" if total_figures else f"{i+1}"
+        print(f"📋 [{progress}] Processing {figure_name} ({category}/{epoch})")
         
-        # Upsert to database
-        filter_query = {
-            "figureName": figure_name,
-            "category": category,
-            "epoch": epoch
-        }
-        
-        result = collection.replace_one(filter_query, doc, upsert=True)
+        prepared = build_figure_document(figure_data)
+        if not prepared:
+            print(f"    ⚠️ No images for {figure_name}")
+            continue
         
-        if result.modified_count > 0 or result.upserted_id:
-            print(f"    ✅ Stored {len(images)} images for {figure_name}")
-            return True
+        filter_query, doc = prepared
+        key = tuple(doc[field] for field in FIGURE_KEY_FIELDS)
+        if key not in stored_fingerprints:
+            change_counts["new"] += 1
+        elif stored_fingerprints[key] == doc[FINGERPRINT_FIELD]:
+            change_counts["unchanged"] += 1
+            if not force:
+                print(f"    ⏭️ Unchanged: {figure_name}")
+                continue
         else:
-            print(f"    ⚠️ No changes for {figure_name}")
-            return False
+            change_counts["changed"] += 1
         
-    except Exception as e:
-        print(f"    ❌ Failed to store images for {figure_name}: {e}")
-        return False
+        writer.add(filter_query, doc, label=f"{figure_name} ({category}/{epoch})")
+        successful_stores += 1
+        total_images_stored += doc["totalImages"]
+    writer.close()
+    
+    # Operations that failed inside a batch were not stored
+    successful_stores -= len(writer.failures)
+    total_images_stored -= sum(failure["doc"]["totalImages"] for failure in writer.failures)
+    
+    return {
+        "successful_stores": successful_stores,
+        "total_images_stored": total_images_stored,
+        "change_counts": change_counts,
+        "writer": writer
+    }
 
 def create_indexes(collection):
     """Create indexes for efficient retrieval"""
@@ -139,16 +192,19 @@ def main():
     parser = argparse.ArgumentParser(description="Phase 4 (Final): Store Images in MongoDB")
     parser.add_argument("--mongo-uri", required=True, help="MongoDB connection string")
     parser.add_argument("--test", action="store_true", help="Test with first 10 figures only")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Figures per bulk write (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--force", action="store_true", help="Rewrite figures even if their content is unchanged")
     
     args = parser.parse_args()
     
     print("💾 Phase 4 (Final): Store Images and Metadata in MongoDB")
     print("=" * 60)
     
-    # Check if grouped images exist
-    grouped_file = "grouped_images_for_mongodb.json"
-    if not os.path.exists(grouped_file):
-        print(f"❌ Error: {grouped_file} not found")
+    # Check if grouped images exist (.jsonl preferred, legacy .json accepted)
+    grouped_file = find_input("grouped_images_for_mongodb.json")
+    if not grouped_file:
+        print("❌ Error: grouped_images_for_mongodb.jsonl not found")
         print("Please run phase3-validation-final.py first")
         sys.exit(1)
     
@@ -158,33 +214,25 @@ def main():
     db = client.orbgame
     collection = db.historical_figure_images
     
-    # Load grouped images
-    print(f"📖 Loading grouped images from {grouped_file}...")
-    with open(grouped_file, "r") as f:
-        grouped_data = json.load(f)
+    # Stream grouped images one figure at a time
+    print(f"📖 Streaming grouped images from {grouped_file}...")
+    grouped_data = read_records(grouped_file)
+    total_figures = count_records(grouped_file)
     
-    print(f"📊 Processing {len(grouped_data)} figures...")
-    
-    # Process figures
-    successful_stores = 0
-    total_images_stored = 0
+    print(f"📊 Processing {total_figures} figures...")
     
     # Limit to first 10 if test mode
     if args.test:
-        grouped_data = grouped_data[:10]
-        print(f"🧪 Test mode: Processing first {len(grouped_data)} figures")
+        grouped_data = islice(grouped_data, 10)
+        total_figures = min(total_figures, 10)
+        print(f"🧪 Test mode: Processing first {total_figures} figures")
     
-    for i, figure_data in enumerate(grouped_data):
-        figure_name = figure_data["figure_name"]
-        category = figure_data["category"]
-        epoch = figure_data["epoch"]
-        images = figure_data["images"]
-        
-        print(f"📋 [{i+1}/{len(grouped_data)}] Processing {figure_name} ({category}/{epoch})")
-        
-        if store_figure_images(collection, figure_data):
-            successful_stores += 1
-            total_images_stored += len(images)
+    # Process figures
+    outcome = store_grouped_figures(collection, grouped_data, args.batch_size, args.force, total_figures)
+    successful_stores = outcome["successful_stores"]
+    total_images_stored = outcome["total_images_stored"]
+    change_counts = outcome["change_counts"]
+    writer = outcome["writer"]
     
     # Create indexes
     print("\n🔧 Creating database indexes...")
@@ -198,10 +246,16 @@ def main():
     print("\n" + "=" * 60)
     print("📊 PHASE 4 (FINAL) SUMMARY")
     print("=" * 60)
-    print(f"Total Figures Processed: {len(grouped_data)}")
+    print(f"Total Figures Processed: {total_figures}")
     print(f"Successful Stores: {successful_stores}")
+    print(f"Content: {change_counts['new']} new, {change_counts['changed']} changed, "
+          f"{change_counts['unchanged']} unchanged{' (rewritten)' if args.force else ' (skipped)'}")
+    print(f"  New: {writer.stats['upserted']}, Updated: {writer.stats['modified']}, "
+          f"Unchanged: {writer.stats['matched'] - writer.stats['modified']}, Failed: {writer.stats['failed']}")
+    print(f"Bulk Writes: {writer.batches} (batch size {writer.batch_size})")
     print(f"Total Images Stored: {total_images_stored}")
-    print(f"Success Rate: {(successful_stores/len(grouped_data)*100):.1f}%")
+    up_to_date = successful_stores + (0 if args.force else change_counts["unchanged"])
+    print(f"Success Rate: {(up_to_date/total_figures*100):.1f}%" if total_figures else "Success Rate: 0.0%")
     
     if stats:
         print(f"\n📈 Database Statistics:")
@@ -4,12 +4,13 @@ Phase 4: Store Images and Metadata in MongoDB
 Insert images into MongoDB, structured by figure and image type
 """
 
-import json
 import sys
 from datetime import datetime
 from pymongo import MongoClient
 import argparse
 
+from image_pipeline.jsonl import find_input, read_records
+
 def connect_mongodb(mongo_uri):
     """Connect to MongoDB"""
     try:
@@ -85,8 +86,9 @@ def main():
     print("=" * 50)
     
     # Check if filtered images exist
-    if not os.path.exists("filtered_images.json"):
-        print("❌ Error: filtered_images.json not found")
+    filtered_file = find_input("filtered_images.json")
+    if not filtered_file:
+        print("❌ Error: filtered_images.jsonl not found")
         print("Please run phase3-validation.py first")
         sys.exit(1)
     
@@ -98,8 +100,7 @@ def main():
     
     # Load filtered images
     print("📖 Loading filtered images...")
-    with open("filtered_images.json", "r") as f:
-        filtered_images = json.load(f)
+    filtered_images = list(read_records(filtered_file))
     
     print(f"📊 Processing {len(filtered_images)} filtered images...")
     
@@ -177,5 +178,4 @@ def main():
     print("   curl -s \"https://api.orbgame.us/api/orb/images/stats\" | jq .")
 
 if __name__ == "__main__":
-    import os
     main() 
\ No newline at end of file
@@ -4,15 +4,24 @@ Real Image Retrieval Script for Orb Game Historical Figures
 Implements multi-source image search with validation and fallback logic
 """
 
-import requests
+import argparse
 import json
-import time
 import logging
 from PIL import Image
 from io import BytesIO
 from typing import Dict, List, Optional, Tuple
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from image_pipeline.catalog import load_catalog
+from image_pipeline.fetched import get_shared_store
+from image_pipeline.http_cache import with_response_cache
+from image_pipeline.http_session import create_session
+from image_pipeline.probe import NeedMoreData, probe_bytes, probe_url
+from image_pipeline.racing import DEFAULT_HEDGE_DELAY, DEFAULT_RACE_WIDTH, DEFAULT_SOURCE_TIMEOUT, race
+from image_pipeline.rate_limiter import RateLimitedSession
+from image_pipeline.wikidata import WikidataPortraitResolver
 
 # Configure logging
 logging.basicConfig(
@@ -28,11 +37,21 @@ logger = logging.getLogger(__name__)
 class ImageRetrievalService:
     """Multi-source image retrieval service with validation and fallback logic"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'OrbGame-ImageRetrieval/1.0 (Educational Project)'
-        })
+    def __init__(self, race_width: int = DEFAULT_RACE_WIDTH, hedge_delay: float = DEFAULT_HEDGE_DELAY,
+                 source_timeout: float = DEFAULT_SOURCE_TIMEOUT):
+        self.session = with_response_cache(RateLimitedSession(
+            create_session(user_agent='OrbGame-ImageRetrieval/1.0 (Educational Project)')
+        ))
+        self.wikidata = WikidataPortraitResolver(self.session)
+        # Fetched image bytes, shared with the download and upload stages
+        self.fetched = get_shared_store()
+        
+        # Racing configuration: a width of 1 tries sources strictly one at a time
+        self.race_width = race_width
+        self.hedge_delay = hedge_delay
+        self.source_timeout = source_timeout
+        # Room for the raced sources, their hedges and abandoned slow calls
+        self.executor = ThreadPoolExecutor(max_workers=max(4, race_width * 4))
         
         # Source priority configuration
         self.sources = {
@@ -64,28 +83,13 @@ class ImageRetrievalService:
         }
     
     def get_wikidata_portrait(self, figure_name: str) -> Optional[Dict]:
-        """Retrieve portrait from Wikidata using SPARQL"""
+        """Retrieve portrait from Wikidata using SPARQL (batched via self.wikidata)"""
         try:
-            query = f"""
-            SELECT ?image ?imageLabel WHERE {{
-              ?person rdfs:label "{figure_name}"@en.
-              ?person wdt:P18 ?image.
-              SERVICE wikibase:label {{ bd:serviceParam wikibase:language "[AUTO_LANGUAGE],en". }}
-            }}
-            LIMIT 1
-            """
-            
-            url = 'https://query.wikidata.org/sparql'
-            params = {'format': 'json', 'query': query}
-            
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            results = response.json().get('results', {}).get('bindings', [])
-            if results:
-                image_url = results[0]['image']['value']
+            match = self.wikidata.get(figure_name)
+            if match:
                 return {
-                    'url': image_url,
+                    'url': match['image'],
+                    'wikidataId': match['qid'],
                     'source': 'Wikidata',
                     'licensing': 'Public Domain',
                     'reliability': 'High',
@@ -264,21 +268,54 @@ class ImageRetrievalService:
     def is_valid_image(self, url: str) -> bool:
         """Validate image URL and format"""
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            # Bytes fetched earlier in this run (or by another stage) need no request
+            cached = self.fetched.lookup(url)
+            if cached:
+                data, content_type = cached
+                if not content_type.startswith('image/'):
+                    self.fetched.discard(url)
+                    return False
+                try:
+                    probe = probe_bytes(data)
+                except NeedMoreData:
+                    self.fetched.discard(url)
+                    return False
+                if probe:
+                    return probe.width > 0 and probe.height > 0
+                Image.open(BytesIO(data)).verify()
+                return True
+            
+            # Read only the header: a recognised JPEG/PNG/GIF/WebP header
+            # with sane dimensions is enough to accept the URL
+            # (the probe is only an optimisation: on any error, download instead)
+            try:
+                probe, content_type = probe_url(self.session, url)
+            except Exception as e:
+                logger.debug(f"Header probe failed for {url}, downloading instead: {e}")
+                probe, content_type = None, None
+            if content_type is not None and not content_type.startswith('image/'):
+                return False
+            if probe:
+                return probe.width > 0 and probe.height > 0
+            
+            # Unknown, oversized or unprobeable header: fall back to a full download,
+            # kept for the later stages
+            data, content_type = self.fetched.fetch(self.session, url, timeout=10)
             
             # Check if it's actually an image
-            content_type = response.headers.get('content-type', '')
             if not content_type.startswith('image/'):
+                self.fetched.discard(url)
                 return False
             
             # Verify image can be opened
-            img = Image.open(BytesIO(response.content))
+            img = Image.open(BytesIO(data))
             img.verify()
             
             return True
         except Exception as e:
             logger.warning(f"Image validation failed for {url}: {e}")
+            # Rejected candidates are not kept for the later stages
+            self.fetched.discard(url)
             return False
     
     def get_image_with_fallback(self, figure_name: str, image_type: str, category: str = None) -> Optional[Dict]:
@@ -288,7 +325,10 @@ class ImageRetrievalService:
             logger.error(f"Unknown image type: {image_type}")
             return None
         
-        for source_name, source_func, priority in self.sources[image_type]:
+        sources = self.sources[image_type]
+        
+        def search(source_name, source_func, priority):
+            """The source's search/metadata call only: the part that is raced and hedged"""
             try:
                 logger.info(f"Trying {source_name} for {figure_name} ({image_type})")
                 
@@ -299,20 +339,59 @@ class ImageRetrievalService:
                 else:
                     image_data = source_func(figure_name, category or 'general')
                 
-                if image_data and self.is_valid_image(image_data['url']):
-                    image_data['priority'] = priority
-                    image_data['source_name'] = source_name
-                    logger.info(f"✅ Found image via {source_name} for {figure_name}")
+                if image_data and image_data.get('url'):
                     return image_data
-                else:
-                    logger.warning(f"❌ {source_name} failed for {figure_name}")
-                
-                # Rate limiting
-                time.sleep(0.5)
+                logger.warning(f"❌ {source_name} failed for {figure_name}")
                 
             except Exception as e:
                 logger.error(f"Error with {source_name} for {figure_name}: {e}")
-                continue
+            
+            return None
+        
+        def accept(image_data, source_name, source_func, priority):
+            """Validate a search hit once (probe or download), outside any race or hedge"""
+            if not self.is_valid_image(image_data['url']):
+                logger.warning(f"❌ {source_name} failed for {figure_name}")
+                return None
+            image_data = dict(image_data, priority=priority, source_name=source_name)
+            # Fetch the winner once now; download, hashing and upload reuse these bytes
+            try:
+                self.fetched.fetch(self.session, image_data['url'])
+            except Exception as e:
+                logger.warning(f"Could not keep bytes for {image_data['url']}: {e}")
+            return image_data
+        
+        if self.race_width <= 1:
+            # Strictly sequential: each source in priority order, no hedges or timeouts
+            for requests_sent, source in enumerate(sources, 1):
+                image_data = search(*source)
+                winner = image_data and accept(image_data, *source)
+                if winner:
+                    logger.info(f"✅ Found image via {winner['source_name']} for {figure_name} "
+                                f"({requests_sent} requests)")
+                    return winner
+        else:
+            # Race the highest-priority searches; a lower-priority hit only wins
+            # once every source above it has failed or timed out. A hit that
+            # fails validation hands the race to the sources below it.
+            remaining = list(sources)
+            launched = hedged = 0
+            elapsed = 0.0
+            while remaining:
+                calls = [lambda source=source: search(*source) for source in remaining]
+                outcome = race(self.executor, calls, width=self.race_width,
+                               hedge_delay=self.hedge_delay, timeout=self.source_timeout)
+                launched += outcome.launched
+                hedged += outcome.hedged
+                elapsed += outcome.elapsed
+                if outcome.value is None:
+                    break
+                winner = accept(outcome.value, *remaining[outcome.index])
+                if winner:
+                    logger.info(f"✅ Found image via {winner['source_name']} for {figure_name} "
+                                f"({launched} requests, {hedged} hedged, {elapsed:.1f}s)")
+                    return winner
+                remaining = remaining[outcome.index + 1:]
         
         logger.warning(f"No image found for {figure_name} ({image_type})")
         return None
@@ -335,6 +414,9 @@ class ImageRetrievalService:
             'figures': []
         }
         
+        # Resolve all Wikidata portraits in a few batched SPARQL queries
+        self.wikidata.resolve([figure.get('name', figure.get('figureName')) for figure in figures_data])
+        
         for figure in figures_data:
             figure_name = figure.get('name', figure.get('figureName'))
             category = figure.get('category', 'general')
@@ -387,21 +469,7 @@ class ImageRetrievalService:
 def load_figures_data() -> List[Dict]:
     """Load historical figures data from file"""
     try:
-        with open('OrbGameInfluentialPeopleSeeds', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Parse the JSON structure
-        figures = []
-        for category, epochs in data.items():
-            for epoch, people in epochs.items():
-                for person in people:
-                    figures.append({
-                        'name': person['name'],
-                        'figureName': person['name'],
-                        'category': category,
-                        'epoch': epoch,
-                        'context': person.get('context', '')
-                    })
+        figures = load_catalog().figure_list()
         
         logger.info(f"Loaded {len(figures)} historical figures from JSON data")
         return figures
@@ -420,6 +488,17 @@ def save_results(results: Dict, filename: str = 'real_image_results.json'):
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Retrieve real images for historical figures")
+    parser.add_argument("--race-width", type=int, default=DEFAULT_RACE_WIDTH,
+                        help=f"Sources queried concurrently per image type (default: {DEFAULT_RACE_WIDTH}, 1 = sequential)")
+    parser.add_argument("--hedge-delay", type=float, default=DEFAULT_HEDGE_DELAY,
+                        help=f"Seconds before a slow source search gets a duplicate request; image downloads "
+                             f"are never hedged (default: {DEFAULT_HEDGE_DELAY}, unused at --race-width 1)")
+    parser.add_argument("--source-timeout", type=float, default=DEFAULT_SOURCE_TIMEOUT,
+                        help=f"Seconds before a source search is given up on (default: {DEFAULT_SOURCE_TIMEOUT}, "
+                             f"unused at --race-width 1)")
+    args = parser.parse_args()
+    
     logger.info("Starting real image retrieval process")
     
     # Load historical figures data
@@ -431,7 +510,7 @@ def main():
     logger.info(f"Loaded {len(figures_data)} historical figures")
     
     # Initialize image retrieval service
-    service = ImageRetrievalService()
+    service = ImageRetrievalService(args.race_width, args.hedge_delay, args.source_timeout)
     
     # Process all figures
     results = service.process_historical_figures(figures_data)
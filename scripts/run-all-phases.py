@@ -1,16 +1,93 @@
 #!/usr/bin/env python3
 """
 Master script to run all image retrieval phases
-Runs phases 1-4 in sequence with proper error handling
+
+By default (--sequential) the phase scripts run one after another as
+subprocesses; --phase N runs a single one.
+
+--streaming runs the same phase scripts in-process as a streaming pipeline
+instead: stages are threads connected by bounded queues, so validation
+starts on the first figure phase 2 has downloaded and storage upserts
+validated figures while acquisition is still running. Both modes produce
+the same outputs, but streaming needs MongoDB and the imaging dependencies
+up front, since all four phases run at once.
+
+  discover → acquire (--concurrency threads) → inspect (--validation-workers
+  threads) → validate/dedup (in input order) → store (bulk writes)
+
+--resume reuses figures recorded in the phase-2 checkpoint journal in
+either mode.
 """
 
+import importlib.util
 import subprocess
 import sys
 import argparse
+import threading
 import time
 from pathlib import Path
 
-def run_phase(phase_name, script_name, description, test_mode=False):
+SCRIPTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from image_pipeline.checkpoint import CheckpointJournal
+from image_pipeline.jsonl import JsonlWriter
+from image_pipeline.mongo_bulk import DEFAULT_BATCH_SIZE
+from image_pipeline.stages import Pipeline, in_order
+
+# Shared by the in-process pipeline and the subprocess modes
+PHASES = [
+    {
+        "name": "Phase 1: Discovery & Preparation",
+        "script": "phase1-discovery.py",
+        "description": "Extract figures and prepare search terms"
+    },
+    {
+        "name": "Phase 2: Source Integration & Query Automation",
+        "script": "phase2-integration-final.py",
+        "description": "Query Wikidata, Commons, Wikipedia and Smithsonian and download images"
+    },
+    {
+        "name": "Phase 3: Validation & Categorization",
+        "script": "phase3-validation-final.py",
+        "description": "Filter, validate, deduplicate and categorize images"
+    },
+    {
+        "name": "Phase 4: Storage in MongoDB",
+        "script": "phase4-storage-final.py",
+        "description": "Store images in MongoDB database"
+    }
+]
+
+def phase_command(number, args):
+    """Subprocess command line for a phase, passing on the options it accepts"""
+    cmd = ["python3", str(SCRIPTS_DIR / PHASES[number - 1]["script"])]
+    if number == 2:
+        if args.test:
+            cmd.append("--test")
+        if args.resume:
+            cmd.append("--resume")
+        if args.http_cache:
+            cmd += ["--http-cache", args.http_cache]
+    elif number == 3:
+        cmd += ["--max-distance", str(args.max_distance), "--dedup-scope", args.dedup_scope]
+    elif number == 4:
+        cmd += ["--mongo-uri", args.mongo_uri, "--batch-size", str(args.batch_size)]
+        if args.test:
+            cmd.append("--test")
+        if args.force:
+            cmd.append("--force")
+    return cmd
+
+def load_phase(filename):
+    """Import a phase script (hyphenated file name) as a module"""
+    module_name = filename.replace("-", "_").removesuffix(".py")
+    spec = importlib.util.spec_from_file_location(module_name, SCRIPTS_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_phase(phase_name, cmd, description):
     """Run a single phase with error handling"""
     print(f"\n{'='*60}")
     print(f"🚀 {phase_name}")
@@ -19,71 +96,180 @@ def run_phase(phase_name, script_name, description, test_mode=False):
     
     try:
         # Check if script exists
-        if not Path(script_name).exists():
-            print(f"❌ Error: {script_name} not found")
+        if not Path(cmd[1]).exists():
+            print(f"❌ Error: {cmd[1]} not found")
             return False
         
-        # Run the script
-        cmd = ["python3", script_name]
-        if test_mode:
-            cmd.append("--test")
-        
         print(f"🔧 Running: {' '.join(cmd)}")
         start_time = time.time()
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # Output streams straight through instead of appearing after the phase
+        result = subprocess.run(cmd)
         
         duration = time.time() - start_time
         
         if result.returncode == 0:
             print(f"✅ {phase_name} completed successfully ({duration:.1f}s)")
-            print(result.stdout)
             return True
         else:
-            print(f"❌ {phase_name} failed")
-            print(f"Error: {result.stderr}")
+            print(f"❌ {phase_name} failed (exit code {result.returncode})")
             return False
             
     except Exception as e:
         print(f"❌ Error running {phase_name}: {e}")
         return False
 
+def run_pipeline(args):
+    """Run phases 1-4 in-process as concurrent stages; returns True on success"""
+    # Imported here so the default sequential mode works without the imaging dependencies
+    from image_pipeline.validation import inspect_chunk
+    
+    print("📦 Loading phase modules...")
+    phase1, phase2, phase3, phase4 = (load_phase(phase["script"]) for phase in PHASES)
+    
+    # Phase 1 is instant: materialize targets so phase 2 can batch Wikidata lookups
+    targets = list(phase1.iter_search_targets(phase1.load_historical_figures()))
+    if args.test:
+        targets = targets[:5]
+    with JsonlWriter("search_targets.jsonl") as writer:
+        for target in targets:
+            writer.write(target)
+    print(f"✅ Phase 1: {len(targets)} search targets")
+    
+    phase2.setup_directories()
+    session = phase2.get_session(pool_size=max(args.concurrency, 1), cache_path=args.http_cache)
+    resolver = phase2.WikidataPortraitResolver(session)
+    resolver.resolve([target["name"] for target in targets])
+    
+    # Same journal as a standalone phase 2 run, so either mode can resume the other
+    journal = CheckpointJournal(phase2.CHECKPOINT_FILE, resume=args.resume)
+    journal_lock = threading.Lock()
+    if args.resume:
+        print(f"♻️ Resuming: {len(journal)} figures already acquired")
+    
+    # Commons hits for every pending figure, with imageinfo resolved in 50-title requests
+    commons = phase2.CommonsImageIndex(session)
+    commons.prefetch([target["name"] for target in targets if not journal.done(*phase2.figure_key(target))],
+                     workers=max(args.concurrency, 1))
+    
+    # Connect before starting threads: connect_mongodb exits the process on failure
+    print("🔌 Connecting to MongoDB...")
+    collection = phase4.connect_mongodb(args.mongo_uri).orbgame.historical_figure_images
+    
+    pipeline = Pipeline(queue_size=args.queue_size)
+    to_acquire, acquired, inspected, validated = (pipeline.queue() for _ in range(4))
+    totals = {"found": 0, "downloaded": 0, "valid": 0}
+    stored = {}
+    
+    def acquire(item):
+        index, target = item
+        key = phase2.figure_key(target)
+        if journal.done(*key):
+            return index, journal.get(*key)
+        result = phase2.process_figure(target, session, resolver, commons)
+        with journal_lock:
+            journal.record(*key, data=result)
+        return index, result
+    
+    def inspect(item):
+        # Opens each downloaded file once: decode, measure and hash
+        index, result = item
+        paths = list(dict.fromkeys(img["local_path"] for img in result["images"] if img.get("local_path")))
+        return index, (result, dict(zip(paths, inspect_chunk(paths))))
+    
+    def validate():
+        # Dedup is order-dependent, so figures are re-sequenced first
+        duplicates = phase3.NearDuplicateFilter(args.max_distance, args.dedup_scope)
+        with JsonlWriter("raw_image_metadata_final.jsonl") as raw_writer, \
+             JsonlWriter("filtered_images.jsonl") as filtered_writer, \
+             JsonlWriter("grouped_images_for_mongodb.jsonl") as grouped_writer:
+            for _, (result, reports) in in_order(pipeline.iterate(inspected)):
+                raw_writer.write(result)
+                totals["found"] += result["total_found"]
+                totals["downloaded"] += result["total_downloaded"]
+                
+                valid_images = duplicates.filter(phase3.process_figure_images(result, reports))
+                for img in valid_images:
+                    filtered_writer.write(img)
+                totals["valid"] += len(valid_images)
+                pipeline.count("validate")
+                
+                if valid_images:
+                    record = phase3.grouped_record(result["figure_name"], result["category"], result["epoch"], valid_images)
+                    grouped_writer.write(record)
+                    pipeline.put(validated, record)
+    
+    def store():
+        def figures():
+            for record in pipeline.iterate(validated):
+                pipeline.count("store")
+                yield record
+        stored.update(phase4.store_grouped_figures(collection, figures(), args.batch_size, args.force))
+    
+    pipeline.source("discover", enumerate(targets), to_acquire)
+    pipeline.map("acquire", acquire, to_acquire, acquired, workers=max(args.concurrency, 1))
+    pipeline.map("inspect", inspect, acquired, inspected, workers=max(args.validation_workers, 1))
+    pipeline.stage("validate", validate, on_finish=lambda: pipeline.close(validated))
+    pipeline.stage("store", store)
+    
+    try:
+        errors = pipeline.run()
+    finally:
+        journal.close()
+    for name, error, trace in errors:
+        print(f"\n❌ Stage '{name}' failed: {error}")
+        print(trace)
+    if errors:
+        return False
+    
+    phase4.create_indexes(collection)
+    
+    print(f"\n{'='*60}")
+    print("📊 STREAMING PIPELINE SUMMARY")
+    print(f"{'='*60}")
+    for name, stage_stats in pipeline.stats.items():
+        duration = (stage_stats["finished"] or time.time()) - (stage_stats["started"] or time.time())
+        print(f"  {name:<9} {stage_stats['items']:>6} items  {duration:7.1f}s")
+    print(f"⏱️ Wall time: {pipeline.elapsed:.1f}s")
+    print(f"🖼️ Images found: {totals['found']}, downloaded: {totals['downloaded']}, valid: {totals['valid']}")
+    writer = stored["writer"]
+    print(f"💾 Stored: {stored['successful_stores']} figures ({stored['total_images_stored']} images), "
+          f"{stored['change_counts']['unchanged']} unchanged, {writer.stats['failed']} failed writes")
+    return not writer.failures
+
 def main():
     """Main execution function"""
     parser = argparse.ArgumentParser(description="Run all image retrieval phases")
     parser.add_argument("--mongo-uri", required=True, help="MongoDB connection string")
     parser.add_argument("--test", action="store_true", help="Run in test mode (limited figures)")
     parser.add_argument("--phase", type=int, choices=[1,2,3,4], help="Run specific phase only")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--sequential", dest="streaming", action="store_false",
+                      help="Run the phase scripts one after another as subprocesses (default)")
+    mode.add_argument("--streaming", dest="streaming", action="store_true",
+                      help="Run phases 1-4 in-process as a concurrent streaming pipeline")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Figures acquired in parallel with --streaming (default: 4)")
+    parser.add_argument("--validation-workers", type=int, default=2,
+                        help="Threads decoding and hashing images with --streaming (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=32,
+                        help="Capacity of each inter-stage queue with --streaming (default: 32)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Figures per MongoDB bulk write (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--force", action="store_true", help="Rewrite figures even if their content is unchanged")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reuse figures already recorded in the phase-2 checkpoint journal")
+    parser.add_argument("--http-cache", metavar="PATH", help="Cache search API responses in this SQLite file")
+    parser.add_argument("--max-distance", type=int, default=6,
+                        help="Maximum pHash Hamming distance for near-duplicates (default: 6)")
+    parser.add_argument("--dedup-scope", choices=["figure", "corpus"], default="figure",
+                        help="Drop near-duplicates within each figure only, or across the whole corpus")
     
     args = parser.parse_args()
     
     print("🎯 Orb Game Image Retrieval - Complete Pipeline")
     print("=" * 60)
     
-    # Define phases
-    phases = [
-        {
-            "name": "Phase 1: Discovery & Preparation",
-            "script": "scripts/phase1-discovery.py",
-            "description": "Extract figures and prepare search terms"
-        },
-        {
-            "name": "Phase 2: Source Integration & Query Automation", 
-            "script": "scripts/phase2-integration.py",
-            "description": "Query Wikimedia Commons and download images"
-        },
-        {
-            "name": "Phase 3: Validation & Categorization",
-            "script": "scripts/phase3-validation.py", 
-            "description": "Filter, validate, and categorize images"
-        },
-        {
-            "name": "Phase 4: Storage in MongoDB",
-            "script": "scripts/phase4-storage.py",
-            "description": "Store images in MongoDB database"
-        }
-    ]
-    
     # Check if we're in the right directory
     if not Path("historical-figures-achievements.json").exists():
         print("❌ Error: historical-figures-achievements.json not found")
@@ -93,33 +279,33 @@ def main():
     # Run specific phase or all phases
     if args.phase:
         # Run single phase
-        phase = phases[args.phase - 1]
-        if args.phase == 4:
-            # Phase 4 needs MongoDB URI
-            cmd = ["python3", phase["script"], "--mongo-uri", args.mongo_uri]
-            if args.test:
-                cmd.append("--test")
-        else:
-            cmd = ["python3", phase["script"]]
-            if args.test:
-                cmd.append("--test")
+        phase = PHASES[args.phase - 1]
+        cmd = phase_command(args.phase, args)
         
         print(f"🎯 Running {phase['name']}")
         result = subprocess.run(cmd)
         sys.exit(result.returncode)
     
+    if args.streaming:
+        if not run_pipeline(args):
+            print("\n❌ Pipeline failed")
+            sys.exit(1)
+        print(f"\n{'='*60}")
+        print("🎉 PIPELINE COMPLETE")
+        print(f"{'='*60}")
+        return
+    
     # Run all phases
     successful_phases = 0
-    total_phases = len(phases)
+    total_phases = len(PHASES)
     
-    for i, phase in enumerate(phases, 1):
+    for i, phase in enumerate(PHASES, 1):
         print(f"\n📋 Progress: {i}/{total_phases} phases")
         
         success = run_phase(
             phase["name"], 
-            phase["script"], 
-            phase["description"],
-            test_mode=args.test
+            phase_command(i, args),
+            phase["description"]
         )
         
         if success:
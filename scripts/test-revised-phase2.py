@@ -15,8 +15,13 @@ import sys
 from pathlib import Path
 from urllib.parse import quote_plus
 import re
+from itertools import islice
 from tqdm import tqdm
 
+from image_pipeline.http_session import create_session
+from image_pipeline.jsonl import find_input, read_records
+from image_pipeline.wikidata import WikidataPortraitResolver
+
 # Configuration
 SEARCH_LIMIT = 5  # Smaller limit for testing
 RETRY_ATTEMPTS = 2
@@ -31,11 +36,12 @@ def setup_directories():
 def load_test_targets():
     """Load a small subset of search targets for testing"""
     try:
-        with open('search_targets.json', 'r') as f:
-            all_targets = json.load(f)
+        input_file = find_input("search_targets.json")
+        if not input_file:
+            raise FileNotFoundError("search_targets.jsonl")
         
         # Select first 5 figures for testing
-        test_targets = all_targets[:5]
+        test_targets = list(islice(read_records(input_file), 5))
         print(f"🧪 Testing with {len(test_targets)} figures:")
         for target in test_targets:
             print(f"   - {target['name']} ({target['category']}/{target['epoch']})")
@@ -46,41 +52,21 @@ def load_test_targets():
         print("Please run phase1-discovery.py first")
         sys.exit(1)
 
-def get_wikidata_portrait(figure_name):
-    """Get portrait image from Wikidata using P18 property"""
+def get_wikidata_portrait(figure_name, resolver):
+    """Get portrait image from Wikidata using P18 property (batched via resolver)"""
     try:
-        print(f"    🔍 Querying Wikidata for '{figure_name}'...")
-        
-        # SPARQL query to find portrait image
-        query = f"""
-        SELECT ?image WHERE {{
-          ?person rdfs:label "{figure_name}"@en.
-          ?person wdt:P18 ?image.
-        }}
-        LIMIT 1
-        """
+        print(f"    🔍 Looking up Wikidata portrait for '{figure_name}'...")
         
-        url = 'https://query.wikidata.org/sparql'
-        params = {
-            'format': 'json',
-            'query': query
-        }
-        
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
-        results = data.get('results', {}).get('bindings', [])
-        
-        if results:
-            image_url = results[0]['image']['value']
-            print(f"    ✅ Found Wikidata portrait: {image_url}")
+        match = resolver.get(figure_name)
+        if match:
+            print(f"    ✅ Found Wikidata portrait: {match['image']}")
             return {
-                'url': image_url,
+                'url': match['image'],
                 'source': 'Wikidata',
                 'type': 'portrait',
                 'license': 'public domain',
-                'title': f"{figure_name} portrait"
+                'title': f"{figure_name} portrait",
+                'wikidata_id': match['qid']
             }
         else:
             print(f"    ❌ No Wikidata portrait found")
@@ -212,7 +198,7 @@ def download_image(url, filename):
     
     return None
 
-def process_test_figure(figure_data):
+def process_test_figure(figure_data, resolver):
     """Process a single figure with multiple strategies"""
     figure_name = figure_data["name"]
     category = figure_data["category"]
@@ -223,7 +209,7 @@ def process_test_figure(figure_data):
     all_images = []
     
     # Strategy 1: Wikidata for portraits
-    portrait = get_wikidata_portrait(figure_name)
+    portrait = get_wikidata_portrait(figure_name, resolver)
     if portrait:
         all_images.append(portrait)
     
@@ -272,10 +258,14 @@ def main():
     setup_directories()
     test_targets = load_test_targets()
     
+    # One batched SPARQL query covers every test figure
+    resolver = WikidataPortraitResolver(create_session())
+    resolver.resolve([figure_data["name"] for figure_data in test_targets])
+    
     # Process each test figure
     results = []
     for i, figure_data in enumerate(test_targets):
-        result = process_test_figure(figure_data)
+        result = process_test_figure(figure_data, resolver)
         results.append(result)
         
         # Add delay to be respectful to APIs
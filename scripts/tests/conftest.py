@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import the shared package as `image_pipeline` from scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+from image_pipeline.cascade import Step, run_cascade
+
+
+class Source:
+    """Fetch callable that records whether it was issued"""
+
+    def __init__(self, candidates=(), error=None):
+        self.candidates = list(candidates)
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.candidates
+
+
+def test_lower_priority_steps_are_skipped_once_satisfied():
+    sources = [Source(["a"]), Source(["b"]), Source(["c"])]
+    steps = [Step("wiki", f"query {i}", source) for i, source in enumerate(sources)]
+    outcome = run_cascade(steps, want=1)
+    assert [result for _, result in outcome.results] == ["a"]
+    assert outcome.results[0][0] is steps[0]
+    assert (outcome.issued, outcome.skipped) == (1, 2)
+    assert [source.calls for source in sources] == [1, 0, 0]
+
+
+def test_rejected_and_empty_candidates_fall_through():
+    sources = [Source([]), Source(["bad", "good-1"]), Source(["good-2", "good-3"])]
+    steps = [Step("s", str(i), source) for i, source in enumerate(sources)]
+    outcome = run_cascade(steps, want=2, accept=lambda c: c.upper() if c.startswith("good") else None)
+    assert [result for _, result in outcome.results] == ["GOOD-1", "GOOD-2"]
+    assert (outcome.issued, outcome.skipped) == (3, 0)
+
+
+def test_errors_are_collected_and_the_cascade_continues():
+    error = RuntimeError("boom")
+    steps = [Step("a", "fails", Source(error=error)), Step("b", "works", Source(["x"])), Step("c", "none", None)]
+    outcome = run_cascade(steps, want=1)
+    assert outcome.errors == [(steps[0], error)]
+    assert [result for _, result in outcome.results] == ["x"]
+    assert (outcome.issued, outcome.skipped) == (2, 1)
+
+
+def test_one_hit_per_group():
+    steps = [
+        Step("wiki", "q1", Source(["w1"])),
+        Step("wiki", "q2", Source(["w2"])),
+        Step("commons", "q1", Source([])),
+        Step("commons", "q2", Source(["c1"])),
+    ]
+    outcome = run_cascade(steps, want=5, one_hit_per_group=True)
+    assert [result for _, result in outcome.results] == ["w1", "c1"]
+    assert (outcome.issued, outcome.skipped) == (3, 1)
+    assert steps[1].fetch.calls == 0
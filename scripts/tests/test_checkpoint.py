@@ -0,0 +1,64 @@
+import json
+
+from image_pipeline.checkpoint import CheckpointJournal
+
+
+def test_resume_skips_completed_keys(tmp_path):
+    path = str(tmp_path / "run" / "checkpoint.jsonl")
+    with CheckpointJournal(path) as journal:
+        journal.record("Pelé", "portraits", data={"urls": ["https://example.org/a.jpg"]})
+        journal.record("Ada Lovelace", "portraits", data=[])
+    with CheckpointJournal(path, resume=True) as journal:
+        assert len(journal) == 2
+        assert journal.done("Pelé", "portraits")
+        assert not journal.done("Pelé", "artifacts")
+        assert journal.get("Pelé", "portraits") == {"urls": ["https://example.org/a.jpg"]}
+        assert journal.get("Nobody", "portraits", default="missing") == "missing"
+        journal.record("Nikola Tesla", "portraits", data=1)
+    with CheckpointJournal(path, resume=True) as journal:
+        assert len(journal) == 3
+        assert journal.get("Nikola Tesla", "portraits") == 1
+
+
+def test_without_resume_the_journal_starts_fresh(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    with CheckpointJournal(path) as journal:
+        journal.record("Pelé", data=1)
+    with CheckpointJournal(path) as journal:
+        assert len(journal) == 0
+    with CheckpointJournal(path, resume=True) as journal:
+        assert len(journal) == 0
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    with CheckpointJournal(str(path)) as journal:
+        journal.record("Pelé", data=1)
+        journal.record("Ada Lovelace", data=2)
+    intact = path.read_bytes()
+    path.write_bytes(intact + b'{"key": ["Nikola Te')
+
+    with CheckpointJournal(str(path), resume=True) as journal:
+        assert len(journal) == 2
+        assert not journal.done("Nikola Tesla")
+        journal.record("Nikola Tesla", data=3)
+    with CheckpointJournal(str(path), resume=True) as journal:
+        assert len(journal) == 3
+        assert journal.get("Nikola Tesla") == 3
+    assert path.read_bytes().startswith(intact)
+
+
+def test_unreadable_middle_line_is_skipped_and_kept(tmp_path, capsys):
+    path = tmp_path / "checkpoint.jsonl"
+    lines = [
+        json.dumps({"key": ["Pelé"], "data": 1}),
+        "not json",
+        json.dumps({"no_key": True}),
+        json.dumps({"key": ["Ada Lovelace"], "data": 2}),
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    with CheckpointJournal(str(path), resume=True) as journal:
+        assert len(journal) == 2
+        assert journal.get("Ada Lovelace") == 2
+    assert "line 2" in capsys.readouterr().out
+    assert path.read_text(encoding="utf-8").splitlines() == lines
@@ -0,0 +1,92 @@
+import json
+
+from image_pipeline import cse_quota
+from image_pipeline.cse_quota import DailyQuotaLedger, QueryScheduler, error_reasons
+
+
+def test_reserve_stops_at_the_limit(tmp_path):
+    ledger = DailyQuotaLedger(str(tmp_path / "quota.json"), limit=5)
+    assert ledger.used() == 0
+    assert ledger.reserve(3)
+    assert not ledger.reserve(3)
+    assert ledger.used() == 3
+    assert ledger.reserve(2)
+    assert ledger.remaining() == 0
+    assert not ledger.reserve()
+
+
+def test_refund_and_exhaust(tmp_path):
+    ledger = DailyQuotaLedger(str(tmp_path / "quota.json"), limit=5)
+    ledger.reserve(4)
+    ledger.refund(2)
+    assert ledger.used() == 2
+    ledger.refund(10)
+    assert ledger.used() == 0
+    ledger.exhaust()
+    assert ledger.remaining() == 0
+    assert not ledger.reserve()
+
+
+def test_ledger_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "cache" / "quota.json")
+    first = DailyQuotaLedger(path, limit=10)
+    second = DailyQuotaLedger(path, limit=10)
+    assert first.reserve(6)
+    assert second.used() == 6
+    assert not second.reserve(5)
+    assert second.reserve(4)
+    assert first.remaining() == 0
+
+
+def test_usage_is_counted_per_utc_day(tmp_path, monkeypatch):
+    path = tmp_path / "quota.json"
+    ledger = DailyQuotaLedger(str(path), limit=5)
+    monkeypatch.setattr(cse_quota, "utc_today", lambda: "2024-01-01")
+    ledger.exhaust()
+    monkeypatch.setattr(cse_quota, "utc_today", lambda: "2024-01-02")
+    assert ledger.remaining() == 5
+    assert ledger.reserve(1)
+    assert json.loads(path.read_text())["days"] == {"2024-01-01": 5, "2024-01-02": 1}
+
+
+def test_corrupt_ledger_starts_empty(tmp_path):
+    path = tmp_path / "quota.json"
+    path.write_text("{not json")
+    ledger = DailyQuotaLedger(str(path), limit=5)
+    assert ledger.used() == 0
+    assert ledger.reserve(2)
+    assert ledger.used() == 2
+
+
+def test_error_reasons():
+    payload = {
+        "error": {
+            "code": 403,
+            "errors": [{"reason": "dailyLimitExceeded"}, {"message": "no reason"}],
+            "details": [{"reason": "RATE_LIMIT_EXCEEDED"}],
+        }
+    }
+    assert error_reasons(payload) == {"dailyLimitExceeded", "RATE_LIMIT_EXCEEDED"}
+    assert error_reasons({"error": "forbidden"}) == set()
+    assert error_reasons(None) == set()
+
+
+def test_scheduler_runs_first_queries_before_follow_ups():
+    scheduler = QueryScheduler()
+    scheduler.add("Pelé", "artifacts", ["pele ball", "pele trophy"])
+    scheduler.add("Pelé", "portraits", ["pele portrait", "pele photo"], covered_types=1)
+    scheduler.add("Ada", "portraits", ["ada portrait"])
+    assert scheduler.pending_pairs() == 3
+
+    assert scheduler.pop() == ("Ada", "portraits", 0, "ada portrait")
+    assert scheduler.complete("Ada", "portraits", 0, "ada portrait", [])
+    assert scheduler.pop() == ("Pelé", "portraits", 0, "pele portrait")
+    assert not scheduler.complete("Pelé", "portraits", 0, "pele portrait", [])
+    assert scheduler.known_result("pele portrait") == []
+    assert scheduler.pop() == ("Pelé", "portraits", 1, "pele photo")
+    assert scheduler.complete("Pelé", "portraits", 1, "pele photo", ["https://example.org/p.jpg"])
+
+    figure, image_type, rank, query = scheduler.pop()
+    assert (figure, image_type, rank) == ("Pelé", "artifacts", 0)
+    scheduler.requeue(figure, image_type, rank)
+    assert len(scheduler) == 1
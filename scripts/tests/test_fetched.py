@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+from image_pipeline.fetched import FetchedBytes
+
+
+class Response:
+    def __init__(self, data):
+        self.content = data
+        self.headers = {"content-type": "image/jpeg"}
+
+    def raise_for_status(self):
+        pass
+
+
+class SlowSession:
+    """Counts transfers; each one takes long enough for callers to pile up"""
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, timeout=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.05)
+        return Response(url.encode() * 10)
+
+
+def spilled_bytes(store_dir):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(store_dir) for f in files)
+
+
+def test_spill_directory_stays_under_disk_limit(tmp_path):
+    store = FetchedBytes(str(tmp_path), memory_limit=0, disk_limit=10_000)
+    for i in range(50):
+        store.put(f"https://example.org/{i}.jpg", b"x" * 1000, "image/jpeg")
+    assert spilled_bytes(tmp_path) <= 10_000 + 1000 + 50 * 16
+    # The newest entries survive
+    assert store.get("https://example.org/49.jpg") == b"x" * 1000
+
+
+def test_discard_forgets_memory_and_disk(tmp_path):
+    store = FetchedBytes(str(tmp_path))
+    store.put("https://example.org/a.jpg", b"data", "image/jpeg")
+    store.discard("https://example.org/a.jpg")
+    assert store.get("https://example.org/a.jpg") is None
+    assert spilled_bytes(tmp_path) == 0
+    assert FetchedBytes(str(tmp_path)).get("https://example.org/a.jpg") is None
+
+
+def test_concurrent_fetches_share_one_transfer(tmp_path):
+    store = FetchedBytes(str(tmp_path))
+    session = SlowSession()
+    results = []
+
+    def fetch():
+        results.append(store.fetch(session, "https://example.org/b.jpg"))
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert session.calls == 1
+    assert len(set(results)) == 1
+    assert store.url_locks == {}
+
+
+def test_expired_entries_are_fetched_again(tmp_path):
+    store = FetchedBytes(str(tmp_path), memory_limit=0, ttl=0)
+    store.put("https://example.org/c.jpg", b"old", "image/jpeg")
+    assert store.get("https://example.org/c.jpg") is None
@@ -0,0 +1,74 @@
+import http.server
+import threading
+
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("httpx")
+pytest.importorskip("h2")
+
+from image_pipeline.http_session import HTTP2Session, create_session
+
+BODY = b'{"a": 1}' * 1000
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setenv("ORB_HTTP2", "1")
+    session = create_session()
+    assert isinstance(session, HTTP2Session)
+    yield session
+    session.close()
+
+
+def test_http2_session_returns_requests_style_responses(server, session):
+    response = session.get(server + "/data", params={"q": "x"}, timeout=5)
+    assert response.ok and response.status_code == 200
+    assert response.url == server + "/data?q=x"
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == BODY
+
+
+def test_http2_session_streams(server, session):
+    response = session.get(server + "/data", stream=True, timeout=(3, 5))
+    try:
+        assert b"".join(response.iter_content(chunk_size=1024)) == BODY
+    finally:
+        response.close()
+
+
+def test_http2_session_raises_requests_exceptions(server, session):
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        session.get(server + "/missing", timeout=5).raise_for_status()
+    assert error.value.response.status_code == 404
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get("http://127.0.0.1:1/", timeout=2)
+
+
+def test_http2_off_returns_a_requests_session(monkeypatch):
+    monkeypatch.delenv("ORB_HTTP2", raising=False)
+    assert isinstance(create_session(), requests.Session)
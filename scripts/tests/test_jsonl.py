@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from image_pipeline.jsonl import JsonlWriter, count_records, export_json, find_input, jsonl_path, read_records
+
+RECORDS = [
+    {"figure_name": "Pelé", "images": [{"url": "https://example.org/a.jpg"}]},
+    {"figure_name": "Ada Lovelace", "images": []},
+    {"figure_name": "Nikola Tesla", "nested": {"epoch": "Modern", "score": 0.5}},
+]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "records.jsonl")
+    with JsonlWriter(path) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    assert writer.count == len(RECORDS)
+    assert list(read_records(path)) == RECORDS
+    assert count_records(path) == len(RECORDS)
+
+
+def test_append_keeps_earlier_records(tmp_path):
+    path = str(tmp_path / "records.jsonl")
+    with JsonlWriter(path) as writer:
+        writer.write(RECORDS[0])
+    with JsonlWriter(path, append=True) as writer:
+        writer.write(RECORDS[1])
+    assert list(read_records(path)) == RECORDS[:2]
+    with JsonlWriter(path) as writer:
+        writer.write(RECORDS[2])
+    assert list(read_records(path)) == RECORDS[2:]
+
+
+def test_blank_lines_are_ignored_and_bad_lines_reported(tmp_path):
+    path = tmp_path / "records.jsonl"
+    path.write_text(json.dumps(RECORDS[0]) + "\n\n" + json.dumps(RECORDS[1]) + "\n", encoding="utf-8")
+    assert list(read_records(str(path))) == RECORDS[:2]
+    assert count_records(str(path)) == 2
+
+    path.write_text(json.dumps(RECORDS[0]) + "\n{broken\n", encoding="utf-8")
+    with pytest.raises(ValueError, match=":2:"):
+        list(read_records(str(path)))
+
+
+def test_legacy_json_array_and_find_input(tmp_path):
+    legacy = tmp_path / "phase.json"
+    legacy.write_text(json.dumps(RECORDS), encoding="utf-8")
+    assert jsonl_path(str(legacy)) == str(tmp_path / "phase.jsonl")
+    assert find_input(str(legacy)) == str(legacy)
+    assert list(read_records(str(legacy))) == RECORDS
+    assert count_records(str(legacy)) == len(RECORDS)
+
+    with JsonlWriter(jsonl_path(str(legacy))) as writer:
+        writer.write(RECORDS[0])
+    assert find_input(str(legacy)) == str(tmp_path / "phase.jsonl")
+    assert find_input(str(tmp_path / "missing.json")) is None
+
+
+def test_export_json_matches_json_dump(tmp_path):
+    source = str(tmp_path / "records.jsonl")
+    with JsonlWriter(source) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    destination, count = export_json(source)
+    assert destination == str(tmp_path / "records.json")
+    assert count == len(RECORDS)
+    with open(destination, encoding="utf-8") as f:
+        assert f.read() == json.dumps(RECORDS, indent=2, ensure_ascii=False)
+
+
+def test_export_json_of_an_empty_file(tmp_path):
+    source = tmp_path / "empty.jsonl"
+    source.write_text("", encoding="utf-8")
+    destination, count = export_json(str(source), str(tmp_path / "out.json"))
+    assert count == 0
+    with open(destination, encoding="utf-8") as f:
+        assert json.load(f) == []
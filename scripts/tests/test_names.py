@@ -0,0 +1,46 @@
+from image_pipeline.names import NameResolver, legacy_safe_names, name_key, safe_name
+
+
+def old_download_name(name):
+    """download-google-cse-images.py sanitize_filename before safe_name"""
+    cleaned = name.replace(" ", "_").replace("/", "_").replace("\\", "_")
+    return "".join(c for c in cleaned if c.isalnum() or c in "_-")
+
+
+def test_safe_name_folds_accents_and_punctuation():
+    assert safe_name("Pelé") == "Pele"
+    assert safe_name("W.G. Grace") == "W_G_Grace"
+    assert safe_name("Albert Einstein") == "Albert_Einstein"
+    assert safe_name("  Marie   Curie ") == "Marie_Curie"
+    assert safe_name("AC/DC") == "AC_DC"
+    assert safe_name("Pelé", separator="-") == "Pele"
+    assert safe_name("") == ""
+    assert safe_name(None) == ""
+
+
+def test_safe_name_is_ascii_and_stable():
+    for name in ("Nikola Tesla", "Ada Lovelace", "Søren Kierkegaard", "Ibn al-Haytham", "Hypatia"):
+        safe = safe_name(name)
+        assert safe.isascii()
+        assert safe_name(safe) == safe
+
+
+def test_legacy_names_cover_the_old_sanitizers():
+    for name in ("Pelé", "W.G. Grace", "Ibn al-Haytham", "AC/DC", "Søren Kierkegaard"):
+        old = old_download_name(name)
+        assert old == safe_name(name) or old in legacy_safe_names(name)
+
+
+def test_legacy_names_exclude_the_current_name():
+    assert legacy_safe_names("Pelé") == ["Pelé"]
+    assert legacy_safe_names("W.G. Grace") == ["W.G._Grace", "WG_Grace"]
+    assert legacy_safe_names("Albert Einstein") == []
+
+
+def test_name_resolver_matches_file_name_forms():
+    resolver = NameResolver(["W.G. Grace", "Pelé", "Albert Einstein"])
+    assert resolver.resolve("WG_Grace") == "W.G. Grace"
+    assert resolver.resolve("pele") == "Pelé"
+    assert resolver.resolve("Einstein Albert") == "Albert Einstein"
+    assert resolver.resolve("Nobody Here") is None
+    assert name_key("Einstein, Albert") == name_key("albert einstein")
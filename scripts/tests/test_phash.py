@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from image_pipeline.phash import (
+    BKTree,
+    dhash_batch,
+    from_hex,
+    hamming,
+    hash_inputs,
+    phash_batch,
+    to_hex,
+)
+
+
+def picture(size=(256, 192)):
+    """A deterministic image with enough structure for the hashes"""
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = 128 + 60 * np.sin(x / width * 6.0) + 60 * np.cos(y / height * 4.0)
+    pixels[height // 4:height // 2, width // 5:width // 2] = 250
+    return Image.fromarray(pixels.astype(np.uint8), "L")
+
+
+def hashes(img):
+    small, gradient = hash_inputs(img)
+    return phash_batch([small])[0], dhash_batch([gradient])[0]
+
+
+def test_hex_round_trip():
+    for value in (0, 1, 0xDEADBEEF, 2 ** 64 - 1):
+        text = to_hex(value)
+        assert len(text) == 16
+        assert from_hex(text) == value
+
+
+def test_hamming():
+    assert hamming(0, 0) == 0
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(0, 2 ** 64 - 1) == 64
+
+
+def test_empty_batches():
+    assert phash_batch([]) == []
+    assert dhash_batch([]) == []
+
+
+def test_dhash_of_a_left_to_right_ramp_sets_every_bit():
+    ramp = np.tile(np.arange(9, dtype=np.float32), (8, 1))
+    assert dhash_batch([ramp]) == [2 ** 64 - 1]
+    assert dhash_batch([ramp[:, ::-1]]) == [0]
+
+
+def test_batch_hashes_match_single_hashes():
+    images = [picture(), picture((200, 200)).rotate(90)]
+    inputs = [hash_inputs(img) for img in images]
+    assert phash_batch([small for small, _ in inputs]) == [phash_batch([small])[0] for small, _ in inputs]
+    assert dhash_batch([gradient for _, gradient in inputs]) == [dhash_batch([gradient])[0] for _, gradient in inputs]
+
+
+def test_resized_copy_is_a_near_duplicate():
+    original = picture()
+    phash, dhash = hashes(original)
+    resized_phash, resized_dhash = hashes(original.resize((128, 96), Image.Resampling.BILINEAR))
+    assert hamming(phash, resized_phash) <= 6
+    assert hamming(dhash, resized_dhash) <= 6
+
+
+def test_different_pictures_are_far_apart():
+    phash, _ = hashes(picture())
+    other_phash, _ = hashes(picture().transpose(Image.Transpose.FLIP_LEFT_RIGHT).rotate(90, expand=True))
+    assert hamming(phash, other_phash) > 6
+
+
+def test_bktree_search_matches_brute_force():
+    rng = random.Random(42)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    # Near copies of a few values, a handful of bits flipped
+    for base in values[:20]:
+        values.append(base ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)))
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, item=i)
+    assert len(tree) == len(values)
+
+    for query in values[:20] + [rng.getrandbits(64) for _ in range(5)]:
+        for max_distance in (0, 2, 6, 20):
+            found = tree.search(query, max_distance)
+            expected = sorted((hamming(query, v), i) for i, v in enumerate(values) if hamming(query, v) <= max_distance)
+            assert sorted((distance, item) for distance, _, item in found) == expected
+            assert [distance for distance, _, _ in found] == sorted(distance for distance, _, _ in found)
+
+
+def test_empty_bktree():
+    assert BKTree().search(0) == []
@@ -0,0 +1,67 @@
+import struct
+import zlib
+
+from image_pipeline.probe import PROBE_BYTES, ImageProbe, check_dimensions, probe_file
+
+
+def png(width, height):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    return b"\x89PNG\r\n\x1a\n" + chunk
+
+
+def gif(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00" * 20
+
+
+def jpeg(width, height, app_padding=0):
+    """SOI, an optional large APP1 segment (like EXIF), then SOF0"""
+    data = b"\xff\xd8"
+    while app_padding > 0:
+        size = min(app_padding, 65533)
+        data += b"\xff\xe1" + struct.pack(">H", size + 2) + b"\x00" * size
+        app_padding -= size
+    sof = struct.pack(">BHHB", 8, height, width, 3) + b"\x00" * 9
+    return data + b"\xff\xc0" + struct.pack(">H", len(sof) + 2) + sof + b"\xff\xd9"
+
+
+def webp_vp8x(width, height):
+    payload = b"\x00" * 4 + (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+    return b"RIFF" + struct.pack("<I", 4 + 8 + len(payload)) + b"WEBP" + b"VP8X" + struct.pack("<I", len(payload)) + payload
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_probe_file_reads_each_format(tmp_path):
+    assert probe_file(write(tmp_path, "a.png", png(640, 480))) == ImageProbe("PNG", 640, 480)
+    assert probe_file(write(tmp_path, "a.gif", gif(32, 16))) == ImageProbe("GIF", 32, 16)
+    assert probe_file(write(tmp_path, "a.jpg", jpeg(1024, 768))) == ImageProbe("JPEG", 1024, 768)
+    assert probe_file(write(tmp_path, "a.webp", webp_vp8x(800, 600))) == ImageProbe("WEBP", 800, 600)
+
+
+def test_probe_file_reads_past_large_exif_segments(tmp_path):
+    path = write(tmp_path, "exif.jpg", jpeg(300, 200, app_padding=3 * PROBE_BYTES))
+    assert probe_file(path) == ImageProbe("JPEG", 300, 200)
+
+
+def test_probe_file_gives_up_on_headers_past_max_bytes(tmp_path):
+    path = write(tmp_path, "huge-exif.jpg", jpeg(300, 200, app_padding=3 * PROBE_BYTES))
+    assert probe_file(path, max_bytes=PROBE_BYTES) is None
+
+
+def test_probe_file_unknown_truncated_and_missing(tmp_path):
+    assert probe_file(write(tmp_path, "a.txt", b"not an image at all")) is None
+    assert probe_file(write(tmp_path, "short.png", png(10, 10)[:20])) is None
+    assert probe_file(write(tmp_path, "short.jpg", jpeg(10, 10)[:8])) is None
+    assert probe_file(str(tmp_path / "missing.jpg")) is None
+
+
+def test_check_dimensions():
+    assert check_dimensions(ImageProbe("PNG", 640, 480)) == (True, "Valid")
+    assert check_dimensions(ImageProbe("PNG", 100, 480)) == (False, "Too small")
+    assert check_dimensions(ImageProbe("PNG", 4000, 400), max_side=2000) == (False, "Too large")
+    assert check_dimensions(ImageProbe("PNG", 2000, 300)) == (False, "Poor aspect ratio")
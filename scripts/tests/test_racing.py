@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from image_pipeline.racing import race
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=8)
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def answer(value, delay=0.0):
+    def call():
+        time.sleep(delay)
+        return value
+    return call
+
+
+def fail(delay=0.0):
+    def call():
+        time.sleep(delay)
+        raise RuntimeError("source down")
+    return call
+
+
+def test_highest_priority_success_wins_even_if_slower(executor):
+    outcome = race(executor, [answer("first", 0.2), answer("second")], width=2, hedge_delay=5, timeout=5)
+    assert (outcome.index, outcome.value) == (0, "first")
+    assert outcome.launched == 2
+
+
+def test_failures_fall_through_to_the_next_source(executor):
+    calls = [fail(), answer(None), answer(""), answer("fourth")]
+    outcome = race(executor, calls, width=1, hedge_delay=5, timeout=5)
+    assert (outcome.index, outcome.value) == (3, "fourth")
+    assert outcome.launched == 4
+
+
+def test_width_one_runs_sources_one_at_a_time(executor):
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def call(value):
+        def run():
+            with lock:
+                running.append(value)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(value)
+            return value
+        return run
+
+    outcome = race(executor, [call(None), call(None), call("third")], width=1, hedge_delay=5, timeout=5)
+    assert outcome.index == 2
+    assert max(peak) == 1
+
+
+def test_remaining_sources_are_not_launched_after_a_win(executor):
+    started = []
+
+    def call(index):
+        def run():
+            started.append(index)
+            return f"value {index}"
+        return run
+
+    outcome = race(executor, [call(i) for i in range(5)], width=2, hedge_delay=5, timeout=5)
+    assert outcome.index == 0
+    assert outcome.launched == 2
+    time.sleep(0.05)
+    assert sorted(started) == [0, 1]
+
+
+def test_every_source_failing(executor):
+    outcome = race(executor, [fail(), answer(None)], width=2, hedge_delay=5, timeout=5)
+    assert (outcome.index, outcome.value) == (None, None)
+    assert race(executor, [], width=2).index is None
+
+
+def test_slow_source_is_hedged(executor):
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        # First attempt hangs, the hedged duplicate answers at once
+        time.sleep(1.0 if len(attempts) == 1 else 0)
+        return "hedged"
+
+    outcome = race(executor, [flaky], width=1, hedge_delay=0.05, timeout=5)
+    assert outcome.value == "hedged"
+    assert outcome.hedged == 1
+    assert outcome.launched == 2
+    assert outcome.elapsed < 0.5
+
+
+def test_timed_out_source_gives_way(executor):
+    outcome = race(executor, [answer("too slow", 1.0), answer("backup")], width=1, hedge_delay=5, timeout=0.05)
+    assert (outcome.index, outcome.value) == (1, "backup")
+    assert outcome.elapsed < 0.5
@@ -0,0 +1,66 @@
+from io import BytesIO
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_pipeline.renditions import (
+    RENDITION_SIZES,
+    describe,
+    make_renditions,
+    rendition_name,
+    rendition_urls,
+)
+
+
+def encode(size, mode="RGB", image_format="JPEG"):
+    out = BytesIO()
+    Image.new(mode, size, (200, 100, 50, 128)[:len(mode)]).save(out, image_format)
+    return out.getvalue()
+
+
+def test_rendition_name_is_deterministic():
+    assert rendition_name("Pele_portraits_ab12cd34.jpg", 256, "webp") == "Pele_portraits_ab12cd34_256.webp"
+
+
+def test_large_source_gets_every_size_largest_first():
+    renditions = make_renditions(encode((2000, 1000)))
+    assert [r.size for r in renditions[::2]] == list(RENDITION_SIZES)
+    for r in renditions:
+        assert max(r.width, r.height) == r.size
+        assert r.width == 2 * r.height
+
+
+def test_small_source_is_not_upscaled():
+    renditions = make_renditions(encode((300, 200)))
+    # 256 and 128 are scaled down; of the larger sizes only 512 is kept, at native size
+    assert sorted({r.size for r in renditions}, reverse=True) == [512, 256, 128]
+    native = [r for r in renditions if r.size == 512]
+    assert all((r.width, r.height) == (300, 200) for r in native)
+
+
+def test_each_size_is_encoded_as_webp_and_jpeg():
+    renditions = make_renditions(encode((600, 600)))
+    for size in {r.size for r in renditions}:
+        formats = {r.extension: r for r in renditions if r.size == size}
+        assert set(formats) == {"webp", "jpg"}
+        assert formats["webp"].content_type == "image/webp"
+        assert formats["jpg"].content_type == "image/jpeg"
+        assert Image.open(BytesIO(formats["webp"].data)).format == "WEBP"
+        assert Image.open(BytesIO(formats["jpg"].data)).format == "JPEG"
+
+
+def test_alpha_is_kept_in_webp_and_flattened_in_jpeg():
+    renditions = make_renditions(encode((300, 300), mode="RGBA", image_format="PNG"))
+    webp = next(r for r in renditions if r.extension == "webp")
+    jpg = next(r for r in renditions if r.extension == "jpg")
+    assert Image.open(BytesIO(webp.data)).mode == "RGBA"
+    assert Image.open(BytesIO(jpg.data)).mode == "RGB"
+
+
+def test_rendition_urls_maps_size_and_format():
+    renditions = make_renditions(encode((600, 400)))
+    records = [describe(r, blob_url=f"https://blob/{r.size}.{r.extension}") for r in renditions]
+    urls = rendition_urls(records)
+    assert set(urls) == {"1024", "512", "256", "128"}
+    assert urls["256"] == {"webp": "https://blob/256.webp", "jpg": "https://blob/256.jpg"}
@@ -4,25 +4,43 @@ Orb Game - Simple Image Upload to Azure Blob Storage
 This script uploads all historical figure images to Azure Blob Storage using connection string
 """
 
+import argparse
 import json
 import os
 import sys
-import requests
 from urllib.parse import urlparse, quote
-from azure.storage.blob import BlobServiceClient, ContentSettings
 import time
 import logging
 
+from image_pipeline.blob_upload import (
+    AZURITE_CONNECTION_STRING, DEFAULT_MAX_BLOCK_SIZE, DEFAULT_MAX_CONCURRENCY, DEFAULT_UPLOAD_WORKERS,
+    UNCHANGED, BlobIndex, BlobUploader, create_blob_service, ensure_container,
+)
+from image_pipeline.catalog import load_catalog
+from image_pipeline.fetched import get_shared_store
+from image_pipeline.http_session import IMAGE_ACCEPT, create_session
+from image_pipeline.names import legacy_safe_names, safe_name
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class SimpleImageUploader:
-    def __init__(self, connection_string, container_name="historical-figures"):
+    def __init__(self, connection_string, container_name="historical-figures", workers=DEFAULT_UPLOAD_WORKERS,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_block_size=DEFAULT_MAX_BLOCK_SIZE,
+                 create_container=False, force=False):
         self.connection_string = connection_string
         self.container_name = container_name
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.max_block_size = max_block_size
+        self.create_container = create_container
+        self.force = force
+        self.session = create_session(accept=IMAGE_ACCEPT, pool_size=workers)
         self.blob_service_client = None
         self.container_client = None
+        self.uploader = None
+        self.fetched = get_shared_store()
         self.upload_stats = {
             "total_images": 0,
             "successful_uploads": 0,
@@ -35,13 +53,22 @@ class SimpleImageUploader:
         """Connect to Azure Blob Storage using connection string"""
         try:
             # Create blob service client from connection string
-            self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
+            self.blob_service_client = create_blob_service(self.connection_string, max_block_size=self.max_block_size)
             
             # Get container client
             self.container_client = self.blob_service_client.get_container_client(self.container_name)
+            if self.create_container and ensure_container(self.container_client):
+                logger.info(f"📦 Created container: {self.container_name}")
             
             # Test connection
             self.container_client.get_container_properties()
+            
+            # One listing snapshot to skip blobs whose content is unchanged
+            index = None
+            if not self.force:
+                index = BlobIndex(self.container_client)
+                logger.info(f"📋 Indexed {len(index)} existing blobs")
+            self.uploader = BlobUploader(self.container_client, self.workers, self.max_concurrency, index=index)
             logger.info(f"✅ Connected to Azure Blob Storage container: {self.container_name}")
             return True
             
@@ -50,35 +77,44 @@ class SimpleImageUploader:
             return False
     
     def download_image(self, url):
-        """Download image from URL"""
+        """Download image from URL (or reuse bytes an earlier stage fetched)"""
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
+            data, _ = self.fetched.fetch(self.session, url, timeout=30)
+            return data
         except Exception as e:
             logger.warning(f"Failed to download image from {url}: {e}")
             return None
     
     def upload_image_to_blob(self, image_data, blob_name, content_type="image/jpeg"):
-        """Upload image data to blob storage"""
+        """Upload image data to blob storage; returns UPLOADED, UNCHANGED or None on failure"""
         try:
-            # Create blob client
-            blob_client = self.container_client.get_blob_client(blob_name)
-            
-            # Upload with content settings
-            content_settings = ContentSettings(content_type=content_type)
-            blob_client.upload_blob(
-                image_data,
-                overwrite=True,
-                content_settings=content_settings
-            )
+            # Chunked, parallel-block upload with content settings (skipped if unchanged)
+            _, status = self.uploader.upload(blob_name, image_data, content_type=content_type)
             
-            logger.info(f"✅ Uploaded: {blob_name}")
-            return True
+            if status == UNCHANGED:
+                logger.info(f"⏭️ Unchanged: {blob_name}")
+            else:
+                logger.info(f"✅ Uploaded: {blob_name}")
+            return status
             
         except Exception as e:
             logger.error(f"❌ Failed to upload {blob_name}: {e}")
-            return False
+            return None
+    
+    def transfer_image(self, image_url, blob_name, legacy_names=()):
+        """
+        Download one image and upload it (runs on an upload worker); returns
+        (status, error, blob name). A blob already stored under one of
+        `legacy_names` keeps that name.
+        """
+        blob_name = self.uploader.existing_name(blob_name, legacy_names)
+        image_data = self.download_image(image_url)
+        if not image_data:
+            return None, f"Failed to download: {image_url}", blob_name
+        status = self.upload_image_to_blob(image_data, blob_name)
+        if not status:
+            return None, f"Failed to upload: {blob_name}", blob_name
+        return status, None, blob_name
     
     def generate_blob_url(self, blob_name, expiry_hours=8760):  # 1 year
         """Generate SAS URL for blob"""
@@ -108,55 +144,57 @@ class SimpleImageUploader:
             logger.info(f"📊 Processing {len(data['figures'])} historical figures...")
             
             uploaded_images = []
+            jobs = []
             
             for figure in data['figures']:
                 figure_name = figure['figureName']
                 category = figure['category']
                 epoch = figure['epoch']
                 
-                logger.info(f"🔄 Processing {figure_name} ({category}/{epoch})")
+                logger.info(f"🔄 Queueing {figure_name} ({category}/{epoch})")
                 
-                # Process each image type
+                # Queue each image on the upload pool
                 for image_type, images in figure['images'].items():
-                    if not images:
-                        continue
-                    
                     for i, image in enumerate(images):
-                        image_url = image['url']
-                        
-                        # Download image
-                        image_data = self.download_image(image_url)
-                        if not image_data:
-                            self.upload_stats['failed_uploads'] += 1
-                            self.upload_stats['errors'].append(f"Failed to download: {image_url}")
-                            continue
-                        
                         # Generate blob name
-                        safe_figure_name = figure_name.replace(' ', '_').replace('/', '_')
+                        safe_figure_name = safe_name(figure_name)
                         blob_name = f"{safe_figure_name}_{image_type}_{i}.jpg"
+                        legacy_names = [f"{legacy}_{image_type}_{i}.jpg" for legacy in legacy_safe_names(figure_name)]
                         
-                        # Upload to blob storage
-                        if self.upload_image_to_blob(image_data, blob_name):
-                            self.upload_stats['successful_uploads'] += 1
-                            
-                            # Generate public URL
-                            public_url = self.generate_blob_url(blob_name)
-                            
-                            uploaded_images.append({
-                                "figureName": figure_name,
-                                "category": category,
-                                "epoch": epoch,
-                                "imageType": image_type,
-                                "blobName": blob_name,
-                                "publicUrl": public_url,
-                                "source": image.get('source', 'Unknown'),
-                                "licensing": image.get('licensing', 'Unknown')
-                            })
-                        else:
-                            self.upload_stats['failed_uploads'] += 1
+                        future = self.uploader.submit(self.transfer_image, image['url'], blob_name, legacy_names)
+                        jobs.append((figure, image_type, image, future))
                 
                 self.upload_stats['total_images'] += sum(len(images) for images in figure['images'].values())
             
+            # Collect results in input order
+            for figure, image_type, image, future in jobs:
+                status, error, blob_name = future.result()
+                if error:
+                    self.upload_stats['failed_uploads'] += 1
+                    self.upload_stats['errors'].append(error)
+                    continue
+                
+                if status == UNCHANGED:
+                    self.upload_stats['skipped_images'] += 1
+                else:
+                    self.upload_stats['successful_uploads'] += 1
+                
+                # Generate public URL
+                public_url = self.generate_blob_url(blob_name)
+                
+                uploaded_images.append({
+                    "figureName": figure['figureName'],
+                    "category": figure['category'],
+                    "epoch": figure['epoch'],
+                    "imageType": image_type,
+                    "blobName": blob_name,
+                    "publicUrl": public_url,
+                    "source": image.get('source', 'Unknown'),
+                    "licensing": image.get('licensing', 'Unknown')
+                })
+            
+            logger.info(f"📦 Transfer: {self.uploader.summary()}")
+            
             # Save upload results
             with open('uploaded_real_images.json', 'w') as f:
                 json.dump({
@@ -175,49 +213,55 @@ class SimpleImageUploader:
         """Create placeholder images for all historical figures"""
         try:
             # Load historical figures data
-            with open('OrbGameInfluentialPeopleSeeds', 'r') as f:
-                figures_data = json.load(f)
+            figures_data = load_catalog()
             
             logger.info("🎨 Creating placeholder images for all figures...")
             
             placeholder_images = []
             
-            for category, epochs in figures_data.items():
-                for epoch, figures in epochs.items():
-                    for figure in figures:
-                        figure_name = figure['name']
-                        safe_figure_name = figure_name.replace(' ', '_').replace('/', '_')
+            for figure in figures_data:
+                figure_name = figure['name']
+                category = figure['category']
+                epoch = figure['epoch']
+                safe_figure_name = safe_name(figure_name)
+                
+                # Create placeholder for each image type
+                for image_type in ['portraits', 'achievements', 'inventions', 'artifacts']:
+                    blob_name = self.uploader.existing_name(
+                        f"{safe_figure_name}_{image_type}.jpg",
+                        [f"{legacy}_{image_type}.jpg" for legacy in legacy_safe_names(figure_name)]
+                    )
+                    
+                    # Generate placeholder SVG
+                    placeholder_svg = self.generate_placeholder_svg(figure_name, category, image_type)
+                    
+                    # Convert SVG to bytes
+                    placeholder_data = placeholder_svg.encode('utf-8')
+                    
+                    # Upload placeholder
+                    status = self.upload_image_to_blob(placeholder_data, blob_name, "image/svg+xml")
+                    if status:
+                        public_url = self.generate_blob_url(blob_name)
                         
-                        # Create placeholder for each image type
-                        for image_type in ['portraits', 'achievements', 'inventions', 'artifacts']:
-                            blob_name = f"{safe_figure_name}_{image_type}.jpg"
-                            
-                            # Generate placeholder SVG
-                            placeholder_svg = self.generate_placeholder_svg(figure_name, category, image_type)
-                            
-                            # Convert SVG to bytes
-                            placeholder_data = placeholder_svg.encode('utf-8')
-                            
-                            # Upload placeholder
-                            if self.upload_image_to_blob(placeholder_data, blob_name, "image/svg+xml"):
-                                public_url = self.generate_blob_url(blob_name)
-                                
-                                placeholder_images.append({
-                                    "figureName": figure_name,
-                                    "category": category,
-                                    "epoch": epoch,
-                                    "imageType": image_type,
-                                    "blobName": blob_name,
-                                    "publicUrl": public_url,
-                                    "source": "Placeholder",
-                                    "licensing": "Generated"
-                                })
-                                
-                                self.upload_stats['successful_uploads'] += 1
-                            else:
-                                self.upload_stats['failed_uploads'] += 1
-                            
-                            self.upload_stats['total_images'] += 1
+                        placeholder_images.append({
+                            "figureName": figure_name,
+                            "category": category,
+                            "epoch": epoch,
+                            "imageType": image_type,
+                            "blobName": blob_name,
+                            "publicUrl": public_url,
+                            "source": "Placeholder",
+                            "licensing": "Generated"
+                        })
+                        
+                        if status == UNCHANGED:
+                            self.upload_stats['skipped_images'] += 1
+                        else:
+                            self.upload_stats['successful_uploads'] += 1
+                    else:
+                        self.upload_stats['failed_uploads'] += 1
+                    
+                    self.upload_stats['total_images'] += 1
             
             # Save placeholder results
             with open('uploaded_placeholder_images.json', 'w') as f:
@@ -556,8 +600,24 @@ def main():
     """Main function to upload all images to blob storage"""
     logger.info("🚀 Starting Orb Game Image Upload to Azure Blob Storage (Simple)")
     
-    # Get connection string from environment or user input
-    connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+    parser = argparse.ArgumentParser(description="Upload historical figure images to Azure Blob Storage")
+    parser.add_argument("--connection-string", default=os.getenv('AZURE_STORAGE_CONNECTION_STRING'),
+                        help="Storage connection string (default: $AZURE_STORAGE_CONNECTION_STRING)")
+    parser.add_argument("--azurite", action="store_true",
+                        help="Use the local Azurite emulator and create the container if needed")
+    parser.add_argument("--create-container", action="store_true", help="Create the container if it does not exist")
+    parser.add_argument("--workers", type=int, default=DEFAULT_UPLOAD_WORKERS,
+                        help=f"Concurrent image transfers (default: {DEFAULT_UPLOAD_WORKERS})")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"Parallel block uploads per large blob (default: {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--force", action="store_true",
+                        help="Upload every image even if the stored blob has the same content")
+    parser.add_argument("--max-block-size-mb", type=int, default=DEFAULT_MAX_BLOCK_SIZE // (1024 * 1024),
+                        help="Block size for chunked uploads in MB (default: %(default)s)")
+    args = parser.parse_args()
+    
+    # Get connection string from the command line or environment
+    connection_string = AZURITE_CONNECTION_STRING if args.azurite else args.connection_string
     
     if not connection_string:
         logger.error("❌ AZURE_STORAGE_CONNECTION_STRING environment variable not set")
@@ -566,7 +626,14 @@ def main():
         sys.exit(1)
     
     # Initialize uploader
-    uploader = SimpleImageUploader(connection_string)
+    uploader = SimpleImageUploader(
+        connection_string,
+        workers=args.workers,
+        max_concurrency=args.max_concurrency,
+        max_block_size=args.max_block_size_mb * 1024 * 1024,
+        create_container=args.create_container or args.azurite,
+        force=args.force,
+    )
     
     # Connect to blob storage
     if not uploader.connect_to_blob_storage():
@@ -591,6 +658,8 @@ def main():
     logger.info(f"❌ Failed uploads: {uploader.upload_stats['failed_uploads']}")
     logger.info(f"⏭️ Skipped images: {uploader.upload_stats['skipped_images']}")
     logger.info(f"📁 Total images processed: {uploader.upload_stats['total_images']}")
+    logger.info(f"📦 Transfer: {uploader.uploader.summary()}")
+    uploader.uploader.close()
     
     if uploader.upload_stats['errors']:
         logger.warning("⚠️ Errors encountered:")
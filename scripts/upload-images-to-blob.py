@@ -4,26 +4,44 @@ Orb Game - Upload Images to Azure Blob Storage
 This script uploads all historical figure images to Azure Blob Storage
 """
 
+import argparse
 import json
 import os
 import sys
-import requests
 from urllib.parse import urlparse, quote
-from azure.storage.blob import BlobServiceClient, ContentSettings
 from azure.identity import DefaultAzureCredential
 import time
 import logging
 
+from image_pipeline.blob_upload import (
+    DEFAULT_MAX_BLOCK_SIZE, DEFAULT_MAX_CONCURRENCY, DEFAULT_UPLOAD_WORKERS, UNCHANGED, BlobIndex, BlobUploader,
+    create_blob_service,
+)
+from image_pipeline.catalog import load_catalog
+from image_pipeline.fetched import get_shared_store
+from image_pipeline.http_session import IMAGE_ACCEPT, create_session
+from image_pipeline.names import legacy_safe_names, safe_name
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class ImageUploader:
-    def __init__(self, storage_account_name="orbgameimages", container_name="historical-figures"):
+    def __init__(self, storage_account_name="orbgameimages", container_name="historical-figures",
+                 workers=DEFAULT_UPLOAD_WORKERS, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_block_size=DEFAULT_MAX_BLOCK_SIZE, connection_string=None, force=False):
         self.storage_account_name = storage_account_name
         self.container_name = container_name
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.max_block_size = max_block_size
+        self.connection_string = connection_string
+        self.force = force
+        self.session = create_session(accept=IMAGE_ACCEPT, pool_size=workers)
         self.blob_service_client = None
         self.container_client = None
+        self.uploader = None
+        self.fetched = get_shared_store()
         self.upload_stats = {
             "total_images": 0,
             "successful_uploads": 0,
@@ -35,18 +53,30 @@ class ImageUploader:
     def connect_to_blob_storage(self):
         """Connect to Azure Blob Storage using managed identity"""
         try:
-            # Use managed identity for authentication
-            credential = DefaultAzureCredential()
-            
-            # Create blob service client
-            account_url = f"https://{self.storage_account_name}.blob.core.windows.net"
-            self.blob_service_client = BlobServiceClient(account_url=account_url, credential=credential)
+            if self.connection_string:
+                # Explicit connection string (e.g. the Azurite emulator)
+                self.blob_service_client = create_blob_service(self.connection_string, max_block_size=self.max_block_size)
+            else:
+                # Use managed identity for authentication
+                credential = DefaultAzureCredential()
+                
+                # Create blob service client
+                account_url = f"https://{self.storage_account_name}.blob.core.windows.net"
+                self.blob_service_client = create_blob_service(account_url=account_url, credential=credential,
+                                                               max_block_size=self.max_block_size)
             
             # Get container client
             self.container_client = self.blob_service_client.get_container_client(self.container_name)
             
             # Test connection
             self.container_client.get_container_properties()
+            
+            # One listing snapshot to skip blobs whose content is unchanged
+            index = None
+            if not self.force:
+                index = BlobIndex(self.container_client)
+                logger.info(f"📋 Indexed {len(index)} existing blobs")
+            self.uploader = BlobUploader(self.container_client, self.workers, self.max_concurrency, index=index)
             logger.info(f"✅ Connected to Azure Blob Storage: {self.storage_account_name}/{self.container_name}")
             return True
             
@@ -55,35 +85,44 @@ class ImageUploader:
             return False
     
     def download_image(self, url):
-        """Download image from URL"""
+        """Download image from URL (or reuse bytes an earlier stage fetched)"""
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
+            data, _ = self.fetched.fetch(self.session, url, timeout=30)
+            return data
         except Exception as e:
             logger.warning(f"Failed to download image from {url}: {e}")
             return None
     
     def upload_image_to_blob(self, image_data, blob_name, content_type="image/jpeg"):
-        """Upload image data to blob storage"""
+        """Upload image data to blob storage; returns UPLOADED, UNCHANGED or None on failure"""
         try:
-            # Create blob client
-            blob_client = self.container_client.get_blob_client(blob_name)
+            # Chunked, parallel-block upload with content settings (skipped if unchanged)
+            _, status = self.uploader.upload(blob_name, image_data, content_type=content_type)
             
-            # Upload with content settings
-            content_settings = ContentSettings(content_type=content_type)
-            blob_client.upload_blob(
-                image_data,
-                overwrite=True,
-                content_settings=content_settings
-            )
-            
-            logger.info(f"✅ Uploaded: {blob_name}")
-            return True
+            if status == UNCHANGED:
+                logger.info(f"⏭️ Unchanged: {blob_name}")
+            else:
+                logger.info(f"✅ Uploaded: {blob_name}")
+            return status
             
         except Exception as e:
             logger.error(f"❌ Failed to upload {blob_name}: {e}")
-            return False
+            return None
+    
+    def transfer_image(self, image_url, blob_name, legacy_names=()):
+        """
+        Download one image and upload it (runs on an upload worker); returns
+        (status, error, blob name). A blob already stored under one of
+        `legacy_names` keeps that name.
+        """
+        blob_name = self.uploader.existing_name(blob_name, legacy_names)
+        image_data = self.download_image(image_url)
+        if not image_data:
+            return None, f"Failed to download: {image_url}", blob_name
+        status = self.upload_image_to_blob(image_data, blob_name)
+        if not status:
+            return None, f"Failed to upload: {blob_name}", blob_name
+        return status, None, blob_name
     
     def generate_blob_url(self, blob_name, expiry_hours=8760):  # 1 year
         """Generate SAS URL for blob"""
@@ -113,55 +152,57 @@ class ImageUploader:
             logger.info(f"📊 Processing {len(data['figures'])} historical figures...")
             
             uploaded_images = []
+            jobs = []
             
             for figure in data['figures']:
                 figure_name = figure['figureName']
                 category = figure['category']
                 epoch = figure['epoch']
                 
-                logger.info(f"🔄 Processing {figure_name} ({category}/{epoch})")
+                logger.info(f"🔄 Queueing {figure_name} ({category}/{epoch})")
                 
-                # Process each image type
+                # Queue each image on the upload pool
                 for image_type, images in figure['images'].items():
-                    if not images:
-                        continue
-                    
                     for i, image in enumerate(images):
-                        image_url = image['url']
-                        
-                        # Download image
-                        image_data = self.download_image(image_url)
-                        if not image_data:
-                            self.upload_stats['failed_uploads'] += 1
-                            self.upload_stats['errors'].append(f"Failed to download: {image_url}")
-                            continue
-                        
                         # Generate blob name
-                        safe_figure_name = figure_name.replace(' ', '_').replace('/', '_')
+                        safe_figure_name = safe_name(figure_name)
                         blob_name = f"{safe_figure_name}_{image_type}_{i}.jpg"
+                        legacy_names = [f"{legacy}_{image_type}_{i}.jpg" for legacy in legacy_safe_names(figure_name)]
                         
-                        # Upload to blob storage
-                        if self.upload_image_to_blob(image_data, blob_name):
-                            self.upload_stats['successful_uploads'] += 1
-                            
-                            # Generate public URL
-                            public_url = self.generate_blob_url(blob_name)
-                            
-                            uploaded_images.append({
-                                "figureName": figure_name,
-                                "category": category,
-                                "epoch": epoch,
-                                "imageType": image_type,
-                                "blobName": blob_name,
-                                "publicUrl": public_url,
-                                "source": image.get('source', 'Unknown'),
-                                "licensing": image.get('licensing', 'Unknown')
-                            })
-                        else:
-                            self.upload_stats['failed_uploads'] += 1
+                        future = self.uploader.submit(self.transfer_image, image['url'], blob_name, legacy_names)
+                        jobs.append((figure, image_type, image, future))
                 
                 self.upload_stats['total_images'] += sum(len(images) for images in figure['images'].values())
             
+            # Collect results in input order
+            for figure, image_type, image, future in jobs:
+                status, error, blob_name = future.result()
+                if error:
+                    self.upload_stats['failed_uploads'] += 1
+                    self.upload_stats['errors'].append(error)
+                    continue
+                
+                if status == UNCHANGED:
+                    self.upload_stats['skipped_images'] += 1
+                else:
+                    self.upload_stats['successful_uploads'] += 1
+                
+                # Generate public URL
+                public_url = self.generate_blob_url(blob_name)
+                
+                uploaded_images.append({
+                    "figureName": figure['figureName'],
+                    "category": figure['category'],
+                    "epoch": figure['epoch'],
+                    "imageType": image_type,
+                    "blobName": blob_name,
+                    "publicUrl": public_url,
+                    "source": image.get('source', 'Unknown'),
+                    "licensing": image.get('licensing', 'Unknown')
+                })
+            
+            logger.info(f"📦 Transfer: {self.uploader.summary()}")
+            
             # Save upload results
             with open('uploaded_images_results.json', 'w') as f:
                 json.dump({
@@ -180,43 +221,45 @@ class ImageUploader:
         """Create placeholder images for missing figures"""
         try:
             # Load historical figures data
-            with open('OrbGameInfluentialPeopleSeeds', 'r') as f:
-                figures_data = json.load(f)
+            figures_data = load_catalog()
             
             logger.info("🎨 Creating placeholder images for missing figures...")
             
             placeholder_images = []
             
-            for category, epochs in figures_data.items():
-                for epoch, figures in epochs.items():
-                    for figure in figures:
-                        figure_name = figure['name']
-                        safe_figure_name = figure_name.replace(' ', '_').replace('/', '_')
+            for figure in figures_data:
+                figure_name = figure['name']
+                category = figure['category']
+                epoch = figure['epoch']
+                safe_figure_name = safe_name(figure_name)
+                
+                # Create placeholder for each image type
+                for image_type in ['portraits', 'achievements', 'inventions', 'artifacts']:
+                    blob_name = self.uploader.existing_name(
+                        f"{safe_figure_name}_{image_type}.jpg",
+                        [f"{legacy}_{image_type}.jpg" for legacy in legacy_safe_names(figure_name)]
+                    )
+                    
+                    # Generate placeholder SVG
+                    placeholder_svg = self.generate_placeholder_svg(figure_name, category, image_type)
+                    
+                    # Convert SVG to bytes (simplified - in practice you'd use a proper SVG to image converter)
+                    placeholder_data = placeholder_svg.encode('utf-8')
+                    
+                    # Upload placeholder
+                    if self.upload_image_to_blob(placeholder_data, blob_name, "image/svg+xml"):
+                        public_url = self.generate_blob_url(blob_name)
                         
-                        # Create placeholder for each image type
-                        for image_type in ['portraits', 'achievements', 'inventions', 'artifacts']:
-                            blob_name = f"{safe_figure_name}_{image_type}.jpg"
-                            
-                            # Generate placeholder SVG
-                            placeholder_svg = self.generate_placeholder_svg(figure_name, category, image_type)
-                            
-                            # Convert SVG to bytes (simplified - in practice you'd use a proper SVG to image converter)
-                            placeholder_data = placeholder_svg.encode('utf-8')
-                            
-                            # Upload placeholder
-                            if self.upload_image_to_blob(placeholder_data, blob_name, "image/svg+xml"):
-                                public_url = self.generate_blob_url(blob_name)
-                                
-                                placeholder_images.append({
-                                    "figureName": figure_name,
-                                    "category": category,
-                                    "epoch": epoch,
-                                    "imageType": image_type,
-                                    "blobName": blob_name,
-                                    "publicUrl": public_url,
-                                    "source": "Placeholder",
-                                    "licensing": "Generated"
-                                })
+                        placeholder_images.append({
+                            "figureName": figure_name,
+                            "category": category,
+                            "epoch": epoch,
+                            "imageType": image_type,
+                            "blobName": blob_name,
+                            "publicUrl": public_url,
+                            "source": "Placeholder",
+                            "licensing": "Generated"
+                        })
             
             # Save placeholder results
             with open('placeholder_images_results.json', 'w') as f:
@@ -555,10 +598,29 @@ export default UpdatedImageService;
 
 def main():
     """Main function to upload all images to blob storage"""
+    parser = argparse.ArgumentParser(description="Upload historical figure images to Azure Blob Storage")
+    parser.add_argument("--connection-string", default=None,
+                        help="Use a storage connection string instead of managed identity (e.g. Azurite)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_UPLOAD_WORKERS,
+                        help=f"Concurrent image transfers (default: {DEFAULT_UPLOAD_WORKERS})")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"Parallel block uploads per large blob (default: {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--force", action="store_true",
+                        help="Upload every image even if the stored blob has the same content")
+    parser.add_argument("--max-block-size-mb", type=int, default=DEFAULT_MAX_BLOCK_SIZE // (1024 * 1024),
+                        help="Block size for chunked uploads in MB (default: %(default)s)")
+    args = parser.parse_args()
+    
     logger.info("🚀 Starting Orb Game Image Upload to Azure Blob Storage")
     
     # Initialize uploader
-    uploader = ImageUploader()
+    uploader = ImageUploader(
+        workers=args.workers,
+        max_concurrency=args.max_concurrency,
+        max_block_size=args.max_block_size_mb * 1024 * 1024,
+        connection_string=args.connection_string,
+        force=args.force,
+    )
     
     # Connect to blob storage
     if not uploader.connect_to_blob_storage():
@@ -583,6 +645,8 @@ def main():
     logger.info(f"❌ Failed uploads: {uploader.upload_stats['failed_uploads']}")
     logger.info(f"⏭️ Skipped images: {uploader.upload_stats['skipped_images']}")
     logger.info(f"📁 Total images processed: {uploader.upload_stats['total_images']}")
+    logger.info(f"📦 Transfer: {uploader.uploader.summary()}")
+    uploader.uploader.close()
     
     if uploader.upload_stats['errors']:
         logger.warning("⚠️ Errors encountered:")
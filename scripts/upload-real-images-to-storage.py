@@ -4,17 +4,26 @@ Upload Real Images to Azure Blob Storage and Update MongoDB
 Uploads images from the rate-limited fetch results to blob storage
 """
 
+import argparse
 import json
-import requests
-import time
 import logging
 import os
 import sys
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from urllib.parse import urlparse
 import hashlib
 
+from image_pipeline.blob_upload import (
+    COPIED, DEFAULT_MAX_BLOCK_SIZE, DEFAULT_MAX_CONCURRENCY, DEFAULT_UPLOAD_WORKERS, UNCHANGED, BlobIndex,
+    BlobUploader, create_blob_service,
+)
+from image_pipeline.fetched import get_shared_store
+from image_pipeline.http_session import IMAGE_ACCEPT, create_session
+from image_pipeline.names import legacy_safe_names, safe_name
+from image_pipeline.rate_limiter import RateLimitedSession, get_shared_limiter
+from image_pipeline.renditions import describe, make_renditions, rendition_name, rendition_urls
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,31 +35,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+PUBLISH_UPLOAD = "upload"
+PUBLISH_COPY = "copy"
+
+# Public-domain hosts the storage service can fetch from directly in copy mode
+SERVER_COPY_HOSTS = ["upload.wikimedia.org"]
+
 class RealImageUploader:
     """Upload real images to Azure Blob Storage and update MongoDB"""
     
-    def __init__(self):
+    def __init__(self, workers: int = DEFAULT_UPLOAD_WORKERS, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_block_size: int = DEFAULT_MAX_BLOCK_SIZE, connection_string: Optional[str] = None,
+                 force: bool = False, publish_mode: str = PUBLISH_UPLOAD, copy_hosts: Optional[List[str]] = None,
+                 renditions: bool = True, copy_renditions: bool = False):
         self.account_name = "orbgameimages"
         self.container_name = "historical-figures"
         self.blob_service_client = None
         self.container_client = None
+        self.limiter = get_shared_limiter()
+        self.session = RateLimitedSession(create_session(accept=IMAGE_ACCEPT, pool_size=workers), self.limiter)
+        self.fetched = get_shared_store()
+        self.publish_mode = publish_mode
+        self.copy_hosts = set(copy_hosts or SERVER_COPY_HOSTS)
+        self.renditions = renditions
+        # Renditions of a server-side copy need the source downloaded here,
+        # which copy mode exists to avoid: only on explicit request
+        self.copy_renditions = copy_renditions
+        if publish_mode == PUBLISH_COPY and renditions and not copy_renditions:
+            logger.info("🖼️ Server-side copies are published without renditions "
+                        "(they need a download through this machine; use --copy-renditions)")
         
-        # Get storage account key from Key Vault
         try:
-            from azure.identity import DefaultAzureCredential
-            from azure.keyvault.secrets import SecretClient
-            from azure.storage.blob import BlobServiceClient
-            
-            credential = DefaultAzureCredential()
-            key_vault_url = "https://orb-game-kv-eastus2.vault.azure.net/"
-            secret_client = SecretClient(vault_url=key_vault_url, credential=credential)
-            account_key = secret_client.get_secret("azure-storage-account-key").value
-            
-            self.blob_service_client = BlobServiceClient(
-                account_url=f"https://{self.account_name}.blob.core.windows.net",
-                credential=account_key
-            )
+            if connection_string:
+                # Explicit connection string (e.g. the Azurite emulator)
+                self.blob_service_client = create_blob_service(connection_string, max_block_size=max_block_size)
+            else:
+                # Get storage account key from Key Vault
+                from azure.identity import DefaultAzureCredential
+                from azure.keyvault.secrets import SecretClient
+                
+                credential = DefaultAzureCredential()
+                key_vault_url = "https://orb-game-kv-eastus2.vault.azure.net/"
+                secret_client = SecretClient(vault_url=key_vault_url, credential=credential)
+                account_key = secret_client.get_secret("azure-storage-account-key").value
+                
+                self.blob_service_client = create_blob_service(
+                    account_url=f"https://{self.account_name}.blob.core.windows.net",
+                    credential=account_key,
+                    max_block_size=max_block_size
+                )
             self.container_client = self.blob_service_client.get_container_client(self.container_name)
+            
+            # One listing snapshot to skip blobs whose content is unchanged
+            index = None
+            if not force:
+                index = BlobIndex(self.container_client)
+                logger.info(f"📋 Indexed {len(index)} existing blobs")
+            self.uploader = BlobUploader(self.container_client, workers, max_concurrency, self.limiter, index)
             logger.info("✅ Connected to Azure Blob Storage")
             
         except Exception as e:
@@ -58,31 +99,28 @@ class RealImageUploader:
             raise
     
     def download_image(self, url: str) -> Optional[bytes]:
-        """Download image from URL"""
+        """Download image from URL (or reuse bytes an earlier stage fetched)"""
         try:
-            response = requests.get(url, timeout=30, stream=True)
-            response.raise_for_status()
+            data, content_type = self.fetched.fetch(self.session, url, timeout=30)
             
             # Check if it's actually an image
-            content_type = response.headers.get('content-type', '')
             if not content_type.startswith('image/'):
                 logger.warning(f"URL does not return an image: {url} (Content-Type: {content_type})")
                 return None
             
-            return response.content
+            return data
             
         except Exception as e:
             logger.error(f"Failed to download image from {url}: {e}")
             return None
     
-    def generate_blob_name(self, figure_name: str, image_type: str, url: str) -> str:
+    def generate_blob_name(self, figure_name: str, image_type: str, url: str, clean_name: Optional[str] = None) -> str:
         """Generate a unique blob name for the image"""
         # Create a hash of the URL to ensure uniqueness
         url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
         
-        # Clean figure name for filename
-        clean_name = figure_name.replace(' ', '_').replace('-', '_')
-        clean_name = ''.join(c for c in clean_name if c.isalnum() or c == '_')
+        # Clean figure name for filename (accents folded, punctuation -> "_")
+        clean_name = clean_name or safe_name(figure_name)
         
         # Get file extension from URL
         parsed_url = urlparse(url)
@@ -93,26 +131,123 @@ class RealImageUploader:
         
         return f"{clean_name}_{image_type}_{url_hash}{extension}"
     
-    def upload_image_to_blob(self, image_data: bytes, blob_name: str) -> Optional[str]:
-        """Upload image to Azure Blob Storage"""
+    def legacy_blob_names(self, figure_name: str, image_type: str, url: str) -> List[str]:
+        """Names the same image had before figure names were ASCII-folded"""
+        return [self.generate_blob_name(figure_name, image_type, url, legacy) for legacy in legacy_safe_names(figure_name)]
+    
+    def upload_image_to_blob(self, image_data: bytes, blob_name: str,
+                             content_type: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Upload image to Azure Blob Storage; returns (public URL, UPLOADED/UNCHANGED)"""
         try:
-            blob_client = self.container_client.get_blob_client(blob_name)
-            blob_client.upload_blob(image_data, overwrite=True)
+            blob_client, status = self.uploader.upload(blob_name, image_data, content_type=content_type)
             
             # Return the public URL
-            return f"https://{self.account_name}.blob.core.windows.net/{self.container_name}/{blob_name}"
+            return blob_client.url, status
             
         except Exception as e:
             logger.error(f"Failed to upload {blob_name}: {e}")
+            return None, None
+    
+    def copy_image_to_blob(self, url: str, blob_name: str) -> Optional[Dict]:
+        """Publish an image with a server-side copy from its source URL; None if that fails"""
+        try:
+            blob_client, status = self.uploader.copy_from_url(blob_name, url)
+        except Exception as e:
+            logger.warning(f"Server-side copy failed for {blob_name}, transferring through this machine: {e}")
+            return None
+        
+        if status == UNCHANGED:
+            logger.info(f"⏭️ Unchanged {blob_name}")
+        else:
+            logger.info(f"☁️ Copied server-side {blob_name}")
+        return {
+            'original_url': url,
+            'blob_url': blob_client.url,
+            'blob_name': blob_name,
+            'status': status
+        }
+    
+    def publish_renditions(self, image_data: bytes, blob_name: str) -> List[Dict]:
+        """Decode an image once and upload its rendition ladder next to the original blob"""
+        try:
+            renditions = make_renditions(image_data)
+        except Exception as e:
+            logger.warning(f"Could not generate renditions for {blob_name}: {e}")
+            return []
+        
+        published = []
+        for rendition in renditions:
+            name = rendition_name(blob_name, rendition.size, rendition.extension)
+            blob_url, _ = self.upload_image_to_blob(rendition.data, name, rendition.content_type)
+            if blob_url:
+                published.append(describe(rendition, blob_name=name, blob_url=blob_url))
+        logger.info(f"🖼️ {len(published)}/{len(renditions)} renditions for {blob_name}")
+        return published
+    
+    def transfer_image(self, figure_name: str, image_type: str, url: str) -> Optional[Dict]:
+        """Publish one image and its renditions (runs on an upload worker)"""
+        # Generate blob name, keeping an existing blob stored under a pre-safe_name name
+        blob_name = self.uploader.existing_name(
+            self.generate_blob_name(figure_name, image_type, url),
+            self.legacy_blob_names(figure_name, image_type, url)
+        )
+        
+        # Let the storage service fetch public-domain sources itself
+        if self.publish_mode == PUBLISH_COPY and urlparse(url).netloc in self.copy_hosts:
+            copied = self.copy_image_to_blob(url, blob_name)
+            if copied:
+                # Renditions still need the source bytes decoded here
+                image_data = self.download_image(url) if self.renditions and self.copy_renditions else None
+                if image_data:
+                    copied['renditions'] = self.publish_renditions(image_data, blob_name)
+                return copied
+        
+        logger.info(f"Downloading {image_type} image: {url}")
+        
+        # Download image
+        image_data = self.download_image(url)
+        if not image_data:
+            logger.warning(f"Failed to download image: {url}")
+            return None
+        
+        # Upload to blob storage
+        blob_url, status = self.upload_image_to_blob(image_data, blob_name)
+        if not blob_url:
+            logger.error(f"❌ Failed to upload {blob_name}")
             return None
+        
+        if status == UNCHANGED:
+            logger.info(f"⏭️ Unchanged {blob_name}")
+        else:
+            logger.info(f"✅ Uploaded {blob_name}")
+        uploaded = {
+            'original_url': url,
+            'blob_url': blob_url,
+            'blob_name': blob_name,
+            'status': status
+        }
+        if self.renditions:
+            uploaded['renditions'] = self.publish_renditions(image_data, blob_name)
+        return uploaded
+    
+    def queue_figure_images(self, figure_data: Dict) -> List:
+        """Submit every image of a figure to the upload pool"""
+        jobs = []
+        for image_type in ['portraits', 'achievements', 'inventions', 'artifacts']:
+            for url in figure_data['images'].get(image_type, []):
+                future = self.uploader.submit(self.transfer_image, figure_data['figureName'], image_type, url)
+                jobs.append((image_type, future))
+        return jobs
     
-    def process_figure_images(self, figure_data: Dict) -> Dict:
-        """Process all images for a single figure"""
+    def process_figure_images(self, figure_data: Dict, jobs: Optional[List] = None) -> Dict:
+        """Process all images for a single figure (collecting already queued jobs if given)"""
         figure_name = figure_data['figureName']
         category = figure_data['category']
         epoch = figure_data['epoch']
         
         logger.info(f"Processing images for {figure_name} ({category}, {epoch})")
+        if jobs is None:
+            jobs = self.queue_figure_images(figure_data)
         
         uploaded_images = {
             'figureName': figure_name,
@@ -128,45 +263,26 @@ class RealImageUploader:
                 'total_found': 0,
                 'successful_uploads': 0,
                 'failed_uploads': 0,
-                'skipped_uploads': 0
+                'skipped_uploads': 0,
+                'server_copies': 0
             }
         }
         
-        image_types = ['portraits', 'achievements', 'inventions', 'artifacts']
+        uploaded_images['upload_stats']['total_found'] = len(jobs)
         
-        for image_type in image_types:
-            urls = figure_data['images'].get(image_type, [])
-            uploaded_images['upload_stats']['total_found'] += len(urls)
-            
-            for url in urls:
-                logger.info(f"Downloading {image_type} image: {url}")
-                
-                # Download image
-                image_data = self.download_image(url)
-                if not image_data:
-                    logger.warning(f"Failed to download image: {url}")
-                    uploaded_images['upload_stats']['failed_uploads'] += 1
-                    continue
-                
-                # Generate blob name
-                blob_name = self.generate_blob_name(figure_name, image_type, url)
-                
-                # Upload to blob storage
-                blob_url = self.upload_image_to_blob(image_data, blob_name)
-                if blob_url:
-                    uploaded_images['images'][image_type].append({
-                        'original_url': url,
-                        'blob_url': blob_url,
-                        'blob_name': blob_name
-                    })
+        for image_type, future in jobs:
+            uploaded = future.result()
+            if uploaded:
+                uploaded_images['images'][image_type].append(uploaded)
+                if uploaded['status'] == COPIED:
+                    uploaded_images['upload_stats']['server_copies'] += 1
                     uploaded_images['upload_stats']['successful_uploads'] += 1
-                    logger.info(f"✅ Uploaded {blob_name}")
+                elif uploaded['status'] == UNCHANGED:
+                    uploaded_images['upload_stats']['skipped_uploads'] += 1
                 else:
-                    uploaded_images['upload_stats']['failed_uploads'] += 1
-                    logger.error(f"❌ Failed to upload {blob_name}")
-                
-                # Rate limiting for blob uploads
-                time.sleep(0.5)
+                    uploaded_images['upload_stats']['successful_uploads'] += 1
+            else:
+                uploaded_images['upload_stats']['failed_uploads'] += 1
         
         return uploaded_images
     
@@ -179,6 +295,41 @@ class RealImageUploader:
             logger.error(f"Failed to load fetch results from {filename}: {e}")
             return {}
     
+    def store_image_urls(self, uploaded_results: List[Dict], mongo_uri: str) -> Dict:
+        """
+        Record each published image on its figure document: the matching
+        images[] entry (by source url) gets its blobUrl and a renditions map
+        (size -> format -> URL) so the frontend can pick a size
+        """
+        from pymongo import MongoClient
+        from image_pipeline.mongo_bulk import BulkReplacer
+        
+        client = MongoClient(mongo_uri)
+        try:
+            collection = client.orbgame.historical_figure_images
+            with BulkReplacer(collection, verbose=False) as writer:
+                for figure_data in uploaded_results:
+                    for uploaded in (img for images in figure_data['images'].values() for img in images):
+                        fields = {'images.$[image].blobUrl': uploaded['blob_url']}
+                        if uploaded.get('renditions'):
+                            fields['images.$[image].renditions'] = rendition_urls(uploaded['renditions'])
+                        writer.update(
+                            {
+                                'figureName': figure_data['figureName'],
+                                'category': figure_data['category'],
+                                'epoch': figure_data['epoch'],
+                                'images.url': uploaded['original_url'],
+                            },
+                            {'$set': fields},
+                            label=f"{figure_data['figureName']}: {uploaded['blob_name']}",
+                            array_filters=[{'image.url': uploaded['original_url']}]
+                        )
+            logger.info(f"🗄️ MongoDB: {writer.stats['matched']} image entries matched, "
+                        f"{writer.stats['modified']} updated, {writer.stats['failed']} failed")
+            return writer.stats
+        finally:
+            client.close()
+    
     def update_mongodb_image_service(self, uploaded_results: List[Dict]) -> str:
         """Generate updated image service file for MongoDB"""
         image_service_content = '''import { MongoClient } from 'mongodb';
@@ -335,15 +486,27 @@ export default BlobStorageImageService;
                 'total_images_found': 0,
                 'successful_uploads': 0,
                 'failed_uploads': 0,
-                'skipped_uploads': 0
+                'skipped_uploads': 0,
+                'server_copies': 0
             }
         }
         
-        for i, figure_data in enumerate(figures, 1):
+        # Queue every figure up front so the pool stays busy across figures
+        queued = []
+        for figure_data in figures:
+            try:
+                queued.append(self.queue_figure_images(figure_data))
+            except Exception as e:
+                logger.error(f"Error queueing {figure_data['figureName']}: {e}")
+                queued.append(None)
+        
+        for i, (figure_data, jobs) in enumerate(zip(figures, queued), 1):
             logger.info(f"Processing figure {i}/{len(figures)}: {figure_data['figureName']}")
             
             try:
-                uploaded_figure = self.process_figure_images(figure_data)
+                if jobs is None:
+                    raise ValueError("figure could not be queued")
+                uploaded_figure = self.process_figure_images(figure_data, jobs)
                 results['figures'].append(uploaded_figure)
                 results['metadata']['processed'] += 1
                 
@@ -353,16 +516,14 @@ export default BlobStorageImageService;
                 results['summary_stats']['successful_uploads'] += upload_stats['successful_uploads']
                 results['summary_stats']['failed_uploads'] += upload_stats['failed_uploads']
                 results['summary_stats']['skipped_uploads'] += upload_stats['skipped_uploads']
+                results['summary_stats']['server_copies'] += upload_stats['server_copies']
                 
-                if upload_stats['successful_uploads'] > 0:
+                if upload_stats['successful_uploads'] + upload_stats['skipped_uploads'] > 0:
                     results['metadata']['successful'] += 1
                 else:
                     results['metadata']['failed'] += 1
                 
-                logger.info(f"✅ {figure_data['figureName']}: {upload_stats['successful_uploads']} uploaded, {upload_stats['failed_uploads']} failed")
-                
-                # Add delay between figures
-                time.sleep(1)
+                logger.info(f"✅ {figure_data['figureName']}: {upload_stats['successful_uploads']} uploaded, {upload_stats['skipped_uploads']} unchanged, {upload_stats['failed_uploads']} failed")
                 
             except Exception as e:
                 logger.error(f"Error processing {figure_data['figureName']}: {e}")
@@ -373,11 +534,38 @@ export default BlobStorageImageService;
             datetime.fromisoformat(results['metadata']['end_time']) - 
             datetime.fromisoformat(results['metadata']['start_time'])
         ).total_seconds()
+        results['metadata']['transfer'] = dict(self.uploader.stats, mb_per_second=round(self.uploader.throughput(), 2))
+        logger.info(f"📦 Transfer: {self.uploader.summary()}")
         
         return results
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Upload fetched real images to Azure Blob Storage")
+    parser.add_argument("--connection-string", default=None,
+                        help="Use a storage connection string instead of Key Vault (e.g. Azurite)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_UPLOAD_WORKERS,
+                        help=f"Concurrent image transfers (default: {DEFAULT_UPLOAD_WORKERS})")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"Parallel block uploads per large blob (default: {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--publish-mode", choices=[PUBLISH_UPLOAD, PUBLISH_COPY], default=PUBLISH_UPLOAD,
+                        help="upload: transfer through this machine; copy: server-side copy from the "
+                             "source URL for --copy-hosts, falling back to upload on failure")
+    parser.add_argument("--copy-hosts", default=",".join(SERVER_COPY_HOSTS),
+                        help="Comma-separated source hosts eligible for server-side copy (default: %(default)s)")
+    parser.add_argument("--no-renditions", action="store_true",
+                        help="Publish originals only, without the 128-1024px WebP/JPEG rendition ladder")
+    parser.add_argument("--copy-renditions", action="store_true",
+                        help="In copy mode, also download server-side copied images to publish their renditions")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"),
+                        help="Record blob and rendition URLs on the figure documents in this MongoDB "
+                             "(default: $MONGO_URI; skipped when unset)")
+    parser.add_argument("--force", action="store_true",
+                        help="Upload every image even if the stored blob has the same content")
+    parser.add_argument("--max-block-size-mb", type=int, default=DEFAULT_MAX_BLOCK_SIZE // (1024 * 1024),
+                        help="Block size for chunked uploads in MB (default: %(default)s)")
+    args = parser.parse_args()
+    
     logger.info("🚀 Starting Real Image Upload to Azure Blob Storage")
     
     # Find the most recent fetch results file
@@ -392,10 +580,21 @@ def main():
     logger.info(f"Using fetch results from: {fetch_results_file}")
     
     # Initialize uploader
-    uploader = RealImageUploader()
+    uploader = RealImageUploader(
+        workers=args.workers,
+        max_concurrency=args.max_concurrency,
+        max_block_size=args.max_block_size_mb * 1024 * 1024,
+        connection_string=args.connection_string,
+        force=args.force,
+        publish_mode=args.publish_mode,
+        copy_hosts=[host.strip() for host in args.copy_hosts.split(",") if host.strip()],
+        renditions=not args.no_renditions,
+        copy_renditions=args.copy_renditions
+    )
     
     # Process all figures
     results = uploader.process_all_figures(fetch_results_file)
+    uploader.uploader.close()
     
     if results and results['figures']:
         # Save upload results
@@ -405,6 +604,15 @@ def main():
         
         logger.info(f"✅ Upload results saved to {upload_filename}")
         
+        # Let the frontend choose a rendition size from the figure documents
+        if args.mongo_uri:
+            try:
+                uploader.store_image_urls(results['figures'], args.mongo_uri)
+            except Exception as e:
+                logger.error(f"❌ Failed to record image URLs in MongoDB: {e}")
+        else:
+            logger.info("ℹ️ No --mongo-uri/MONGO_URI: rendition URLs are only in the results file")
+        
         # Generate updated image service file
         image_service_content = uploader.update_mongodb_image_service(results['figures'])
         image_service_file = 'backend/historical-figures-image-service-blob-real.js'
@@ -429,6 +637,8 @@ def main():
         print(f"✅ Successful Uploads: {summary['successful_uploads']}")
         print(f"❌ Failed Uploads: {summary['failed_uploads']}")
         print(f"⏭️ Skipped Uploads: {summary['skipped_uploads']}")
+        print(f"☁️ Server-side Copies: {summary['server_copies']}")
+        print(f"📦 Transfer: {uploader.uploader.summary()}")
         print(f"📁 Upload results saved to: {upload_filename}")
         print(f"📁 Image service file: {image_service_file}")
         print("="*60)